@@ -0,0 +1,734 @@
+import time
+import getopt
+import sys
+import os
+import gc
+import io
+import html
+import json
+import random
+import requests
+import tempfile
+import threading
+import subprocess
+import contextlib
+import http.server
+import urllib.parse
+import tracemalloc
+import card_record
+import card_sinks
+import store_directory
+import tcg_player_searcher
+
+# peak RSS isn't available on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+set_names = ["Dominaria United", "Modern Horizons 3", "Bloomburrow", "Duskmourn: House of Horror", "Outlaws of Thunder Junction", "Secret Lair Drop Series"]
+rarities = ["Common", "Uncommon", "Rare", "Mythic", "Special"]
+conditions = ["Near Mint", "Lightly Played", "Moderately Played", "Near Mint Foil", "Lightly Played Foil - Japanese"]
+treatments = ["", " (Extended Art)", " (Borderless) (Ripple Foil)", " (Showcase)"]
+# what the fixture server sends for everything on a list page that isn't the page itself: (path prefix, content type, size in bytes)
+fixture_assets = [["/images/", "image/jpeg", 12000], ["/fonts/", "font/woff2", 40000], ["/third-party/", "application/javascript", 60000]]
+# output formats the export benchmark compares. excel-in-memory is the Excel sink without constant memory mode, the way the workbook used to be written.
+export_formats = ["excel", "excel-in-memory", "csv", "jsonl", "sqlite", "parquet", "arrow"]
+
+def generate_list_page_text(total_skus, skus_per_product = 4):
+    """Generates the raw text fields the list page parser would pull out for each SKU. Every field is a new string, like lxml hands back, so nothing
+    is shared between SKUs unless the card representation shares it.
+
+    Args:
+        total_skus (int): number of SKUs to generate
+        skus_per_product (int): SKUs (conditions) per product. Defaults to 4.
+
+    Returns:
+        generator: (name, set, rarity, quantity, condition_language, price, product_url) per SKU, the way build_card_row takes them
+    """
+
+    for sku in range(total_skus):
+        product_id = 100000 + sku // skus_per_product
+
+        yield ("".join(["Card Name ", str(product_id), treatments[product_id % len(treatments)]]),
+            ("Set: " + set_names[product_id % len(set_names)]).replace("Set: ", ""),
+            ("Rarity: " + rarities[product_id % len(rarities)]).replace("Rarity: ", ""),
+            ("of " + str(sku % 12 + 1)).replace("of ", ""),
+            "".join([conditions[sku % len(conditions)]]),
+            "$" + str(sku % 5000) + "." + str(sku % 90 + 10),
+            "".join(["https://nolandbeyond.tcgplayerpro.com/catalog/magic/", str(product_id)]))
+
+def build_list_rows(page_text):
+    """Builds cards the way it was done before card_record: a list of strings per card, with the treatment regexes run per card.
+
+    Args:
+        page_text (iterable): raw SKU text from generate_list_page_text
+
+    Returns:
+        list: list of card rows
+    """
+
+    cards = []
+
+    for name, set, rarity, quantity, condition_language, price, product_url in page_text:
+        image_url = "https://tcgplayer-cdn.tcgplayer.com/product/" + product_url.split("/")[-1] + "_200w.jpg"
+        cards.append([name, tcg_player_searcher.get_card_treatment(name), tcg_player_searcher.remove_card_treatment_info(name), set, rarity, quantity, condition_language, price, image_url, product_url])
+
+    return cards
+
+def build_card_records(page_text, page_size = tcg_player_searcher.page_size):
+    """Builds cards as CardRecords, splitting treatments a page at a time like the scraper does.
+
+    Args:
+        page_text (iterable): raw SKU text from generate_list_page_text
+        page_size (int): cards per batch. Defaults to page_size.
+
+    Returns:
+        list: list of CardRecord
+    """
+
+    cards = []
+    page = []
+
+    for sku_text in page_text:
+        page.append(tcg_player_searcher.build_card_row(*sku_text))
+
+        if len(page) >= page_size:
+            cards.extend(card_record.split_treatments(page))
+            page = []
+
+    cards.extend(card_record.split_treatments(page))
+
+    return cards
+
+def measure(build_cards, total_skus, repeat = 3):
+    """Times building the cards and reading every field of them back (what the sinks do), then measures how much memory they hold on to. Timings are
+    the best of repeat runs, one run on its own is too noisy to compare.
+
+    Args:
+        build_cards (function): build_list_rows or build_card_records
+        total_skus (int): number of SKUs
+        repeat (int): runs to take the best timing of. Defaults to 3.
+
+    Returns:
+        tuple: (seconds building, seconds reading, bytes retained)
+    """
+
+    page_text = list(generate_list_page_text(total_skus))
+    seconds = None
+    read_seconds = None
+
+    for run in range(repeat):
+        gc.collect()
+        start_time = time.perf_counter()
+        cards = build_cards(page_text)
+        build_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for card in cards:
+            list(card)
+        read_time = time.perf_counter() - start_time
+
+        seconds = build_time if seconds is None else min(seconds, build_time)
+        read_seconds = read_time if read_seconds is None else min(read_seconds, read_time)
+        del cards
+
+    del page_text
+
+    # Raw text is generated as the cards are built so it only counts if the cards keep it
+    gc.collect()
+    tracemalloc.start()
+    cards = build_cards(generate_list_page_text(total_skus))
+    retained_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return seconds, read_seconds, retained_bytes
+
+def benchmark_card_records(total_skus):
+    """Compares list rows against CardRecords for building and holding total_skus cards.
+
+    Args:
+        total_skus (int): number of SKUs
+    """
+
+    print("Building " + str(total_skus) + " cards")
+
+    results = {}
+    for label, build_cards in [["list rows", build_list_rows], ["card records", build_card_records]]:
+        seconds, read_seconds, retained_bytes = measure(build_cards, total_skus)
+        results[label] = (seconds, read_seconds, retained_bytes)
+        print(label + ": " + "{:.3f}".format(seconds) + "s post-processing, " + "{:.3f}".format(read_seconds) + "s reading every field, " + "{:.1f}".format(retained_bytes / 1024 / 1024) +
+            " MB held, " + str(round(retained_bytes / total_skus)) + " bytes per SKU")
+
+    # Time as a ratio of the list rows' time, over 1 is slower
+    print("card records vs list rows: " + "{:.2f}".format(results["card records"][0] / results["list rows"][0]) + "x the post-processing time, " +
+        "{:.2f}".format(results["card records"][1] / results["list rows"][1]) + "x the reading time, " + "{:.0f}".format(100 - 100 * results["card records"][2] / results["list rows"][2]) + "% less memory")
+
+class FixtureStore:
+    """Synthetic store inventory for the fixture server. Set sizes are skewed like a real LGS: a few big sets and a long tail of small ones."""
+
+    def __init__(self, total_skus, skus_per_product = 4, seed = 1):
+        """
+        Args:
+            total_skus (int): number of SKUs in the store
+            skus_per_product (int): SKUs (conditions) per product. Defaults to 4.
+            seed (int): random seed, so the same size always makes the same store
+        """
+
+        rng = random.Random(seed)
+        total_products = max(1, total_skus // skus_per_product)
+        store_set_names = [set_names[index % len(set_names)] + ("" if index < len(set_names) else " " + str(index)) for index in range(max(6, total_products // 250))]
+        set_weights = [1 / (rank + 1) for rank in range(len(store_set_names))]
+
+        self.products = []
+        for product_index in range(total_products):
+            product_id = 200000 + product_index
+            skus = []
+
+            for sku_index in range(skus_per_product):
+                skus.append((conditions[(product_index + sku_index) % len(conditions)], rng.randint(10, 50000), rng.randint(1, 12)))
+
+            self.products.append({
+                "id": product_id,
+                "name": "Card Name " + str(product_id) + treatments[product_id % len(treatments)],
+                "set": rng.choices(store_set_names, set_weights)[0],
+                "rarity": rarities[product_id % len(rarities)],
+                "skus": skus
+            })
+
+        self.products.sort(key = lambda product: (product["set"], product["name"]))
+        self.set_counts = {}
+        for product in self.products:
+            self.set_counts[product["set"]] = self.set_counts.get(product["set"], 0) + 1
+
+        # The server shares the benchmark's process (and GIL), so searches are only worked out once
+        self.search_results = {}
+
+    def search(self, filters):
+        """Returns the products matching the search filters.
+
+        Args:
+            filters (dict): search parameter -> list of values, i.e. {"setName": ["Bloomburrow"]}
+
+        Returns:
+            list: products
+        """
+
+        key = tuple(sorted((parameter, tuple(values)) for parameter, values in filters.items()))
+        if key in self.search_results:
+            return self.search_results[key]
+
+        set_filter = set(filters.get("setName", []))
+        rarity_filter = set(filters.get("rarityName", []))
+
+        self.search_results[key] = [product for product in self.products if (not set_filter or product["set"] in set_filter) and (not rarity_filter or product["rarity"] in rarity_filter)]
+
+        return self.search_results[key]
+
+def render_facet(title, values):
+    """Renders a filter accordion panel the way the storefront does.
+
+    Args:
+        title (string): panel title, i.e. Set Name
+        values (dict): value -> item count
+
+    Returns:
+        string: HTML
+    """
+
+    checkboxes = "".join('<label class="tcg-input-checkbox"><span class="tcg-input-checkbox__label-text"><div><div>' + html.escape(value) + "</div><div>(" + str(count) + ")</div></div></span></label>"
+        for value, count in sorted(values.items()))
+
+    return ('<div class="tcg-accordion-panel"><div class="tcg-accordion-panel-header is-open"><span class="tcg-accordion-panel-header__content">' + title + "</span></div>"
+        '<div class="tcg-accordion-panel-content">' + checkboxes + "</div></div>")
+
+def render_product(product):
+    """Renders a product (and its SKUs) the way the list view does.
+
+    Args:
+        product (dict): product from FixtureStore
+
+    Returns:
+        string: HTML
+    """
+
+    skus = "".join('<li class="sku-list__list-item"><span class="sku-list__condition">' + condition + '</span><span class="sku-list__price">$' + "{:,.2f}".format(price_cents / 100) + "</span>"
+        '<div class="tcg-quantity-selector"><span class="tcg-quantity-selector__max-available">of ' + str(quantity) + "</span></div></li>" for condition, price_cents, quantity in product["skus"])
+
+    return ('<div class="search-results-list__info"><div class="search-results-list__image-container"><img src="/images/' + str(product["id"]) + '_200w.jpg"></div>'
+        '<div class="search-results-list__card-info"><span class="search-results-list__name">' + html.escape(product["name"]) + "</span>"
+        '<div class="search-results-list__set">Set: ' + html.escape(product["set"]) + '</div><div class="search-results-list__rarity">Rarity: ' + product["rarity"] + "</div>"
+        '<a class="search-results-list__details" href="/catalog/magic/' + urllib.parse.quote(product["set"].lower().replace(" ", "-")) + "/" + str(product["id"]) + '">Details</a></div>'
+        '<div class="search-results-list__skus"><ul class="sku-list">' + skus + "</ul></div></div>")
+
+def render_list_page(store, query_string):
+    """Renders a server side list page for a search: Set Name and Rarity facets, the result total, pagination and a page of products.
+
+    Args:
+        store (FixtureStore): store to search
+        query_string (string): search query string, i.e. q=&productLineName=...&pageSize=48&view=list&page=2&setName=Bloomburrow
+
+    Returns:
+        string: HTML
+    """
+
+    parameters = urllib.parse.parse_qs(query_string)
+    filters = {key: values[0].split(tcg_player_searcher.set_name_separator) for key, values in parameters.items() if key in ("setName", "rarityName")}
+    products = store.search(filters)
+    page_size = int(parameters.get("pageSize", ["48"])[0])
+    page_number = int(parameters.get("page", ["1"])[0])
+    total_pages = max(1, -(-len(products) // page_size))
+
+    rarity_counts = {}
+    for product in products:
+        rarity_counts[product["rarity"]] = rarity_counts.get(product["rarity"], 0) + 1
+
+    pagination = "".join('<a class="tcg-standard-button tcg-standard-button--flat">' + str(page) + "</a>" for page in sorted(set([1, page_number, total_pages])))
+    page_products = products[(page_number - 1) * page_size:page_number * page_size]
+
+    # A web font and an analytics script like the real storefront pulls in, neither of which the parsers need
+    head = ("<head><style>@font-face { font-family: storefront; src: url(/fonts/storefront.woff2) format('woff2'); } body { font-family: storefront; }</style>"
+        '<script async src="/third-party/analytics.js"></script></head>')
+
+    return ("<html>" + head + "<body><div class=\"search-filters\">" + render_facet("Set Name", store.set_counts) + render_facet("Rarity", rarity_counts) + "</div>"
+        '<div class="search-results-header"><span class="search-results-header__count">' + "{:,}".format(len(products)) + " results</span></div>"
+        '<div class="search-results-list">' + "".join(render_product(product) for product in page_products) + "</div>"
+        '<div class="tcg-pagination"><div class="tcg-pagination__pages">' + pagination + "</div></div></body></html>")
+
+def start_fixture_server(store):
+    """Starts a local HTTP server with the same list page markup as a TCGPlayer Pro storefront, serving the given store. Runs in a daemon thread.
+
+    Args:
+        store (FixtureStore): store to serve
+
+    Returns:
+        tuple: (server with request_counts, store front URL)
+    """
+
+    request_counts = {}
+    request_counts_lock = threading.Lock()
+
+    class FixtureRequestHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            path = urllib.parse.urlparse(self.path).path
+            kind = "pages"
+            content_type = "text/html; charset=utf-8"
+            body = None
+
+            for prefix, asset_content_type, size in fixture_assets:
+                if path.startswith(prefix):
+                    kind = prefix.strip("/")
+                    content_type = asset_content_type
+                    body = b"\0" * size
+
+            if body is None:
+                body = render_list_page(store, urllib.parse.urlparse(self.path).query).encode("utf-8")
+
+            with request_counts_lock:
+                counts = request_counts.setdefault(kind, [0, 0])
+                counts[0] += 1
+                counts[1] += len(body)
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FixtureRequestHandler)
+    # kind of request (pages, images, fonts, third-party) -> [requests, bytes], so it's easy to see what a browser actually asked for
+    server.request_counts = request_counts
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    return server, "http://127.0.0.1:" + str(server.server_address[1]) + "/"
+
+def get_peak_rss():
+    """Returns the peak resident set size of this process so far.
+
+    Returns:
+        int: bytes, or None where it isn't available (Windows)
+    """
+
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on macOS
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+def format_bytes(size):
+    """Formats a byte count in MB.
+
+    Args:
+        size (int): bytes, or None
+
+    Returns:
+        string: i.e. 123.4 MB, or n/a
+    """
+
+    if size is None:
+        return "n/a"
+
+    return "{:.1f}".format(size / 1024 / 1024) + " MB"
+
+def build_want_list(store, total_wanted = 100, seed = 2):
+    """Builds a want list for the store: mostly cards it has, some with typos and some it doesn't have at all.
+
+    Args:
+        store (FixtureStore): store
+        total_wanted (int): number of wanted cards. Defaults to 100.
+        seed (int): random seed
+
+    Returns:
+        list: list of wanted cards, [quantity, name]
+    """
+
+    rng = random.Random(seed)
+    wanted_cards = []
+
+    for wanted_index in range(total_wanted):
+        name = rng.choice(store.products)["name"]
+
+        if wanted_index % 10 == 8:
+            name = name.replace("Card", "Crad")
+        elif wanted_index % 10 == 9:
+            name = "Missing Card " + str(wanted_index)
+
+        wanted_cards.append([str(rng.randint(1, 4)), name])
+
+    return wanted_cards
+
+def benchmark_store(total_skus):
+    """Runs each stage of a scrape against a synthetic store served by the fixture server: finding the sets, scraping every query, parsing list pages,
+    matching a want list and exporting to Excel. No network access needed.
+
+    Args:
+        total_skus (int): number of SKUs in the store
+    """
+
+    store = FixtureStore(total_skus)
+    server, store_front_url = start_fixture_server(store)
+    tcg_player_searcher.scrape_engine = "http"
+    tcg_player_searcher.request_rate_limiter.requests_per_second = 0
+    driver = tcg_player_searcher.setup_driver()
+    stages = []
+
+    def run_stage(name, stage, items = None):
+        # The scraper prints as it goes, which would drown out the results
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = stage()
+        seconds = time.perf_counter() - start_time
+
+        stages.append([name, seconds, items(result) if items else None, get_peak_rss()])
+
+        return result
+
+    set_counts = run_stage("get_sets", lambda: tcg_player_searcher.get_set_counts(driver, store_front_url), len)
+    queries = tcg_player_searcher.plan_set_queries(set_counts)
+
+    def scrape_queries():
+        cards = []
+        for query in queries:
+            cards += tcg_player_searcher.scrape_store_inventory(driver, store_front_url, query)
+
+        return cards
+
+    cards = run_stage("scrape_store_inventory", scrape_queries, len)
+
+    # Parsing on its own, with pages that are already fetched
+    page_sources = []
+    for page_number in range(1, min(50, -(-len(store.products) // tcg_player_searcher.page_size)) + 1):
+        driver.get(tcg_player_searcher.build_search_url(store_front_url, "", page_number))
+        page_sources.append((driver.page_source, driver.current_url))
+
+    def parse_pages():
+        parsed_cards = 0
+        for page_source, current_url in page_sources:
+            driver.page_source = page_source
+            driver.current_url = current_url
+            parsed_cards += len(tcg_player_searcher.scrape_store_page_contents_list_view(driver, ""))
+
+        return parsed_cards
+
+    run_stage("scrape_store_page_contents_list_view", parse_pages, lambda parsed_cards: parsed_cards)
+
+    wanted_cards = build_want_list(store)
+
+    def match_wanted_cards():
+        wanted_cards_sink = card_sinks.WantedCardsSink(tcg_player_searcher.prepare_wanted_cards(wanted_cards))
+        for card in cards:
+            wanted_cards_sink.write(card)
+        wanted_cards_sink.close()
+
+        return wanted_cards_sink
+
+    wanted_cards_sink = run_stage("matching", match_wanted_cards, lambda sink: len(cards))
+
+    def export_to_excel():
+        with tempfile.TemporaryDirectory() as directory:
+            excel_sink = card_sinks.ExcelCardSink(os.path.join(directory, "benchmark.xlsx"), tcg_player_searcher.cards_header, tcg_player_searcher.wanted_card_matches_header, wanted_cards_sink)
+            for card in cards:
+                excel_sink.write(card)
+            excel_sink.close()
+
+        return len(cards)
+
+    run_stage("excel export", export_to_excel, lambda written_cards: written_cards)
+
+    server.shutdown()
+    server.server_close()
+
+    print("Store with " + str(len(cards)) + " SKUs (" + str(len(store.products)) + " products, " + str(len(set_counts)) + " sets, " + str(len(queries)) + " queries)")
+    for name, seconds, items, peak_rss in stages:
+        throughput = ", " + "{:,.0f}".format(items / seconds) + " cards/sec" if items and name != "get_sets" and seconds > 0 else ""
+        print("  " + name.ljust(38) + "{:8.3f}".format(seconds) + "s" + throughput + ", peak RSS " + format_bytes(peak_rss))
+
+    print("  total".ljust(40) + "{:8.3f}".format(sum(stage[1] for stage in stages)) + "s")
+
+def benchmark_export(total_skus):
+    """Times writing total_skus cards with each of export_formats, with the file size and how much the peak RSS grew past the cards themselves.
+    Each format runs in its own process, so its peak RSS is its own.
+
+    Args:
+        total_skus (int): number of SKUs
+    """
+
+    if len(export_formats) > 1:
+        print("Exporting " + str(total_skus) + " cards")
+
+        for export_format in export_formats:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "-b", "export", "-n", str(total_skus), "-f", export_format])
+
+        return
+
+    export_format = export_formats[0]
+    if export_format in ["parquet", "arrow"] and card_sinks.pyarrow is None:
+        print("  " + export_format.ljust(16) + "skipped, needs pyarrow")
+        return
+
+    cards = build_card_records(generate_list_page_text(total_skus))
+
+    # The Excel sink writes the Wanted Cards and Found Cards worksheets from the matches, so there need to be some. Matching isn't part of the timing.
+    wanted_cards = [["1", card.name_without_treatment] for card in cards[::max(1, total_skus // 100)]]
+    wanted_cards_sink = card_sinks.WantedCardsSink(tcg_player_searcher.prepare_wanted_cards(wanted_cards))
+    for card in cards:
+        wanted_cards_sink.write(card)
+    wanted_cards_sink.close()
+
+    gc.collect()
+    baseline_rss = get_peak_rss()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "benchmark")
+        start_time = time.perf_counter()
+
+        if export_format == "excel-in-memory":
+            sinks = [card_sinks.ExcelCardSink(file_name + ".xlsx", tcg_player_searcher.cards_header, tcg_player_searcher.wanted_card_matches_header, wanted_cards_sink, False)]
+        else:
+            sinks = tcg_player_searcher.setup_card_sinks([export_format], [], file_name)[0][1:]
+            if export_format == "excel":
+                sinks[0].wanted_cards_sink = wanted_cards_sink
+
+        for card in cards:
+            for sink in sinks:
+                sink.write(card)
+
+        for sink in sinks:
+            sink.close()
+
+        seconds = time.perf_counter() - start_time
+        file_size = sum(os.path.getsize(os.path.join(directory, file)) for file in os.listdir(directory))
+
+    peak_rss_growth = get_peak_rss() - baseline_rss if baseline_rss is not None else None
+    print("  " + export_format.ljust(16) + "{:8.3f}".format(seconds) + "s, " + "{:,.0f}".format(len(cards) / seconds) + " cards/sec, file " + format_bytes(file_size) +
+        ", peak RSS +" + format_bytes(peak_rss_growth))
+
+def benchmark_lean(total_skus, total_pages = 10):
+    """Loads the same list pages in Chrome with and without lean mode against the fixture server, and compares what the server was asked for and
+    how long the pages took. Needs Chrome, runs headless.
+
+    Args:
+        total_skus (int): number of SKUs in the store
+        total_pages (int): list pages to load each way. Defaults to 10.
+    """
+
+    store = FixtureStore(total_skus)
+    server, store_front_url = start_fixture_server(store)
+    tcg_player_searcher.scrape_engine = "selenium"
+    tcg_player_searcher.headless = tcg_player_searcher.headless or "--headless=new"
+    tcg_player_searcher.request_rate_limiter.requests_per_second = 0
+    # The fixture's analytics script is served locally, so it needs its own pattern to count as third party
+    tcg_player_searcher.lean_blocked_hosts = tcg_player_searcher.lean_blocked_hosts + ["*/third-party/*"]
+    total_pages = min(total_pages, -(-len(store.products) // tcg_player_searcher.page_size))
+
+    for lean in [False, True]:
+        tcg_player_searcher.lean = lean
+        server.request_counts.clear()
+
+        try:
+            driver = tcg_player_searcher.setup_driver()
+        except Exception as e:
+            print("Couldn't start Chrome: " + str(e))
+            break
+
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cards = sum(len(tcg_player_searcher.scrape_store_page_contents_list_view(driver, tcg_player_searcher.build_search_url(store_front_url, "", page_number))) for page_number in range(1, total_pages + 1))
+        seconds = time.perf_counter() - start_time
+        driver.quit()
+
+        print(("lean" if lean else "normal") + ": " + str(total_pages) + " pages (" + str(cards) + " cards) in " + "{:.3f}".format(seconds) + "s, " + "{:.3f}".format(seconds / total_pages) + "s per page")
+        for kind, (requests, size) in sorted(server.request_counts.items()):
+            print("  " + kind + ": " + str(requests) + " requests, " + "{:.1f}".format(size / 1024) + " KB")
+
+    server.shutdown()
+    server.server_close()
+
+def start_mock_store_api(total_stores, latency_seconds):
+    """Starts a local server that answers like the TCGPlayer API stores endpoints for made up stores Store 1 to Store total_stores: /stores?name=
+    for the store key, /stores/<comma separated store keys> for the store info and /stores/self. Every request takes latency_seconds, like a round
+    trip to the real API would.
+
+    Args:
+        total_stores (int): number of stores the API knows about
+        latency_seconds (float): how long each request takes
+
+    Returns:
+        tuple: (server, API base URL). server.request_count is how many requests it has served.
+    """
+
+    request_count_lock = threading.Lock()
+
+    class MockStoreApiRequestHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency_seconds)
+            with request_count_lock:
+                server.request_count += 1
+
+            url = urllib.parse.urlparse(self.path)
+            results = []
+
+            if url.path == "/stores":
+                store_name = urllib.parse.parse_qs(url.query).get("name", [""])[0]
+                if store_name.startswith("Store ") and store_name[6:].isdigit() and 1 <= int(store_name[6:]) <= total_stores:
+                    results = ["store-key-" + store_name[6:]]
+            elif url.path == "/stores/self":
+                results = ["store-key-1"]
+            elif url.path.startswith("/stores/"):
+                for store_key in url.path[len("/stores/"):].split(","):
+                    if store_key.startswith("store-key-"):
+                        results.append({"storeKey": store_key, "name": "Store " + store_key[10:], "storefrontUrl": "https://store" + store_key[10:] + ".tcgplayerpro.com/"})
+
+            body = ("{\"success\": true, \"errors\": [], \"results\": " + json.dumps(results) + "}").encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MockStoreApiRequestHandler)
+    server.request_count = 0
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    return server, "http://127.0.0.1:" + str(server.server_address[1])
+
+def benchmark_store_directory(total_stores, latency_seconds = 0.05):
+    """Resolves total_stores store names to storefront URLs against the mock store API: one at a time with a fresh request per lookup (the way
+    get_store_id and get_store_info used to), then with StoreDirectory on a cold cache and again on the warm cache.
+
+    Args:
+        total_stores (int): number of store names to resolve
+        latency_seconds (float): how long each API request takes. Defaults to 0.05.
+    """
+
+    server, api_base_url = start_mock_store_api(total_stores, latency_seconds)
+    store_names = ["Store " + str(store_number) for store_number in range(1, total_stores + 1)]
+    stages = []
+
+    def resolve_one_at_a_time():
+        store_front_urls = {}
+        for store_name in store_names:
+            headers = {"accept": "application/json", "Authorization": "bearer benchmark"}
+            response = requests.get(api_base_url + "/stores?name=" + store_name, headers = headers)
+            if tcg_player_searcher.is_json(response.text):
+                store_key = json.loads(response.text)["results"][0]
+                response = requests.get(api_base_url + "/stores/" + store_key, headers = headers)
+                if tcg_player_searcher.is_json(response.text):
+                    store_front_urls[store_name] = json.loads(response.text)["results"][0]["storefrontUrl"]
+
+        return store_front_urls
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache_location = os.path.join(directory, "store_directory.db")
+
+        def resolve_with_store_directory():
+            directory_client = store_directory.StoreDirectory(api_base_url, "benchmark", cache_location)
+            resolved_stores = directory_client.resolve_store_names(store_names)
+            directory_client.close()
+            return resolved_stores
+
+        for name, resolve in [["one at a time", resolve_one_at_a_time], ["batch, cold cache", resolve_with_store_directory], ["batch, warm cache", resolve_with_store_directory]]:
+            server.request_count = 0
+            start_time = time.perf_counter()
+            resolved = len(resolve())
+            stages.append([name, time.perf_counter() - start_time, server.request_count, resolved])
+
+    server.shutdown()
+    server.server_close()
+
+    print(str(total_stores) + " store names, " + "{:.0f}".format(latency_seconds * 1000) + " ms per API request")
+    for name, seconds, request_count, resolved in stages:
+        print("  " + name.ljust(20) + "{:8.3f}".format(seconds) + "s, " + str(request_count) + " API requests, " + str(resolved) + " resolved")
+
+# name -> (benchmark, SKU counts to run it with by default)
+benchmarks = {"card-records": (benchmark_card_records, [100000]), "store": (benchmark_store, [1000, 10000, 100000]), "export": (benchmark_export, [100000]), "lean": (benchmark_lean, [1000]),
+    "store-directory": (benchmark_store_directory, [50])}
+
+def main(argv):
+    global export_formats
+
+    benchmark_names = list(benchmarks)
+    sku_counts = None
+
+    try:
+        opts, args = getopt.getopt(argv, "b:n:f:", ["benchmark=", "skus=", "formats="])
+    except getopt.GetoptError:
+        print("benchmark.py -b <benchmark> -n <skus> -f <formats>")
+        print("benchmark can be: " + ", ".join(benchmarks) + ". Runs all of them if not set. lean needs Chrome.")
+        print("skus is a comma separated list of how many cards to benchmark with. Defaults to 100000 for card-records and export, 1000,10000,100000 for store and 1000 for lean. For store-directory it's how many store names to resolve, defaults to 50")
+        print("formats is a comma separated list of output formats for the export benchmark. Defaults to " + ",".join(export_formats))
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-b", "--benchmark"):
+            benchmark_names = arg.split(",")
+        elif opt in ("-n", "--skus"):
+            sku_counts = [int(sku_count) for sku_count in arg.split(",")]
+        elif opt in ("-f", "--formats"):
+            export_formats = arg.split(",")
+
+    for benchmark_name in benchmark_names:
+        benchmark, default_sku_counts = benchmarks[benchmark_name]
+        benchmark_sku_counts = sku_counts or default_sku_counts
+
+        for total_skus in benchmark_sku_counts:
+            # Peak RSS only ever goes up, so each size gets its own process to have its own peak
+            if len(benchmark_sku_counts) > 1:
+                subprocess.run([sys.executable, os.path.abspath(__file__), "-b", benchmark_name, "-n", str(total_skus)])
+            else:
+                benchmark(total_skus)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
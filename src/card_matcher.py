@@ -0,0 +1,299 @@
+import math
+import re
+import unicodedata
+from card_record import parse_quantity
+
+# how close (Dice coefficient of name n-grams, 0 to 1) a name has to be to count as a typo of another one. Names that differ by a whole letter at the
+# end of a word (Scalding Tar vs Scalding Tarn) come in under 0.9, so they don't count.
+fuzzy_match_threshold = 0.9
+# names shorter than this (after normalizing) only ever match exactly, too easy to get false hits otherwise
+fuzzy_match_minimum_length = 5
+ngram_size = 3
+
+def normalize_card_name(name):
+    """Normalizes a card name (with the treatment already removed) so the same card matches however it's written: case, accents, punctuation,
+    extra whitespace and the "A-" prefix on Alchemy rebalanced cards are all ignored.
+
+    Args:
+        name (string): card name, i.e. A-Orcish Bowmasters or Agadeem's Awakening
+
+    Returns:
+        string: normalized name, i.e. orcish bowmasters or agadeem s awakening
+    """
+
+    if not name:
+        return ""
+
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii").lower().strip()
+    name = re.sub(r"^a-", "", name)
+
+    return re.sub(r"[^a-z0-9]+", " ", name).strip()
+
+def get_card_name_keys(name):
+    """Returns every normalized name a card can be looked up by. Double faced cards (Front // Back) can be looked up by either face.
+
+    Args:
+        name (string): card name, with the treatment already removed
+
+    Returns:
+        list: normalized names, front face first
+    """
+
+    keys = []
+
+    for face in name.split("//"):
+        key = normalize_card_name(face)
+        if key and key not in keys:
+            keys.append(key)
+
+    return keys
+
+def get_numbers(key):
+    """Returns the numbers in a normalized name, i.e. the 2 in "Sol Ring 2" or the year in a promo name. A typo can't change a number, names with
+    different numbers are different cards.
+
+    Args:
+        key (string): normalized name
+
+    Returns:
+        list: numbers, in order
+    """
+
+    return [token for token in key.split() if token.isdigit()]
+
+def get_ngrams(key):
+    """Returns the set of character n-grams in a normalized name, padded so the start and end of the name count too.
+
+    Args:
+        key (string): normalized name
+
+    Returns:
+        set: n-grams
+    """
+
+    padded = " " + key + " "
+
+    return set(padded[i:i + ngram_size] for i in range(len(padded) - ngram_size + 1))
+
+class CardNameIndex:
+    """Index of items (i.e. wanted cards) by normalized card name. Exact lookups are a single hash lookup on items_by_key, and typo tolerant lookups go
+    through an n-gram index over the distinct names, so neither one scans the items."""
+
+    def __init__(self):
+        self.items_by_key = {}
+        self.keys_by_ngram = {}
+        self.ngrams_by_key = {}
+
+    def add(self, name, item):
+        """Adds an item under every key its name can be looked up by.
+
+        Args:
+            name (string): card name, with the treatment already removed
+            item (any): item to return from lookups
+        """
+
+        for key in get_card_name_keys(name):
+            items = self.items_by_key.get(key)
+
+            if items is None:
+                items = self.items_by_key[key] = []
+                ngrams = self.ngrams_by_key[key] = get_ngrams(key)
+
+                for ngram in ngrams:
+                    self.keys_by_ngram.setdefault(ngram, []).append(key)
+
+            items.append(item)
+
+    def get_closest_key(self, name):
+        """Finds the indexed name closest to the given one by n-gram similarity. Names with different numbers in them never match.
+
+        Args:
+            name (string): card name, with the treatment already removed
+
+        Returns:
+            tuple: (normalized name, similarity) or (None, 0) if nothing is close enough
+        """
+
+        keys = get_card_name_keys(name)
+        if not keys or len(keys[0]) < fuzzy_match_minimum_length:
+            return None, 0
+
+        ngrams = get_ngrams(keys[0])
+        numbers = get_numbers(keys[0])
+
+        # Anything close enough has to share at least minimum_shared of the name's n-grams, so it has to share one of any len - minimum_shared + 1
+        # of them. Checking the rarest ones only looks at a handful of short lists, and most names share none of them, so they're done right there.
+        minimum_shared = math.ceil(fuzzy_match_threshold * len(ngrams) / (2 - fuzzy_match_threshold) - 1e-9)
+        rarest_ngrams = sorted(ngrams, key = lambda ngram: len(self.keys_by_ngram.get(ngram, ())))[:len(ngrams) - minimum_shared + 1]
+        candidate_keys = set()
+
+        for ngram in rarest_ngrams:
+            candidate_keys.update(self.keys_by_ngram.get(ngram, ()))
+
+        best_key = None
+        best_similarity = 0
+
+        for key in candidate_keys:
+            key_ngrams = self.ngrams_by_key[key]
+            similarity = 2 * len(ngrams & key_ngrams) / (len(ngrams) + len(key_ngrams))
+
+            if similarity > best_similarity and len(key) >= fuzzy_match_minimum_length and get_numbers(key) == numbers:
+                best_key = key
+                best_similarity = similarity
+
+        if best_similarity < fuzzy_match_threshold:
+            return None, 0
+
+        return best_key, best_similarity
+
+def treatment_matches(wanted_treatment, treatment):
+    """Checks if a card's treatment covers every treatment asked for, i.e. wanting "Extended Art" matches "Extended Art,Ripple Foil".
+
+    Args:
+        wanted_treatment (string): comma delimited treatments that were asked for, empty for any
+        treatment (string): comma delimited treatments of the card
+
+    Returns:
+        bool: True if it matches
+    """
+
+    if not wanted_treatment:
+        return True
+
+    treatments = set(part.strip().lower() for part in treatment.split(","))
+
+    return all(part.strip().lower() in treatments for part in wanted_treatment.split(","))
+
+class WantedCardMatcher:
+    """Matches inventory cards against the wanted cards as they're scraped. The wanted cards are indexed once by normalized name, so each card costs one hash
+    lookup (plus an n-gram lookup if that misses). Both are only worked out once per distinct name, every SKU of a card after the first is a single
+    dict lookup. Typo matches only count for wanted cards that didn't match anything exactly."""
+
+    def __init__(self, wanted_cards):
+        """
+        Args:
+            wanted_cards (list): list of wanted cards as [quantity, name, name without treatment, treatment]
+        """
+
+        self.wanted_cards = wanted_cards
+        self.wanted_index = CardNameIndex()
+        self.exact_cards = [[] for wanted_card in wanted_cards]
+        self.fuzzy_cards = [[] for wanted_card in wanted_cards]
+        self.fuzzy_similarity = [0 for wanted_card in wanted_cards]
+        # name without treatment -> (wanted indexes it matches exactly, wanted indexes it's a typo match for, similarity)
+        self.name_matches = {}
+
+        for wanted_index, wanted_card in enumerate(wanted_cards):
+            self.wanted_index.add(wanted_card[2], wanted_index)
+
+    def add(self, card):
+        """Checks a single inventory card against the wanted cards.
+
+        Args:
+            card (list): card with the cards_header fields
+        """
+
+        name_without_treatment = card[2]
+        name_match = self.name_matches.get(name_without_treatment)
+
+        if name_match is None:
+            name_match = self.name_matches[name_without_treatment] = self.match_name(name_without_treatment)
+
+        exact_wanted_indexes, fuzzy_wanted_indexes, similarity = name_match
+
+        for wanted_index in exact_wanted_indexes:
+            if treatment_matches(self.wanted_cards[wanted_index][3], card[1]):
+                self.exact_cards[wanted_index].append(card)
+
+        # Typo in the want list (or the store's listing). Only the closest name is kept per wanted card.
+        for wanted_index in fuzzy_wanted_indexes:
+            if similarity > self.fuzzy_similarity[wanted_index]:
+                self.fuzzy_similarity[wanted_index] = similarity
+                self.fuzzy_cards[wanted_index] = []
+
+            if similarity == self.fuzzy_similarity[wanted_index] and treatment_matches(self.wanted_cards[wanted_index][3], card[1]):
+                self.fuzzy_cards[wanted_index].append(card)
+
+    def match_name(self, name_without_treatment):
+        """Works out which wanted cards a name matches, exactly or as a typo. Typo matches are only looked for if there's no exact match.
+
+        Args:
+            name_without_treatment (string): card name, with the treatment already removed
+
+        Returns:
+            tuple: (wanted indexes matched exactly, wanted indexes matched as a typo, similarity of the typo match)
+        """
+
+        # A double faced card can match the same wanted card by both faces, but it's still only one card
+        exact_wanted_indexes = []
+
+        for key in get_card_name_keys(name_without_treatment):
+            for wanted_index in self.wanted_index.items_by_key.get(key, ()):
+                if wanted_index not in exact_wanted_indexes:
+                    exact_wanted_indexes.append(wanted_index)
+
+        if exact_wanted_indexes:
+            return exact_wanted_indexes, (), 0
+
+        key, similarity = self.wanted_index.get_closest_key(name_without_treatment)
+        if key is None:
+            return (), (), 0
+
+        return (), self.wanted_index.items_by_key[key], similarity
+
+    def get_matched_cards(self, wanted_index):
+        """Returns the inventory cards matched to a wanted card, exact matches if there are any, otherwise typo matches.
+
+        Args:
+            wanted_index (int): index of the wanted card
+
+        Returns:
+            tuple: (list of cards, "exact", "fuzzy" or "")
+        """
+
+        if self.exact_cards[wanted_index]:
+            return self.exact_cards[wanted_index], "exact"
+
+        if self.fuzzy_cards[wanted_index]:
+            return self.fuzzy_cards[wanted_index], "fuzzy"
+
+        return [], ""
+
+    def get_found_cards(self):
+        """Returns every inventory card matched to a wanted card, in want list order, without duplicates, along with how it matched so typo
+        matches can be told apart from the real thing.
+
+        Returns:
+            list: list of [card, "exact" or "fuzzy"]
+        """
+
+        found_cards = []
+        seen = set()
+
+        for wanted_index in range(len(self.wanted_cards)):
+            cards, match = self.get_matched_cards(wanted_index)
+
+            for card in cards:
+                if id(card) not in seen:
+                    seen.add(id(card))
+                    found_cards.append([card, match])
+
+        return found_cards
+
+    def get_wanted_card_matches(self):
+        """Compares each wanted card's quantity against what's available.
+
+        Returns:
+            list: list of [quantity, name, matched name, available quantity, fulfilled, match] per wanted card
+        """
+
+        wanted_card_matches = []
+
+        for wanted_index, wanted_card in enumerate(self.wanted_cards):
+            cards, match = self.get_matched_cards(wanted_index)
+            available_quantity = sum(parse_quantity(card[5]) for card in cards)
+            matched_name = cards[0][2].strip() if cards else ""
+
+            wanted_card_matches.append([wanted_card[0], wanted_card[1], matched_name, available_quantity, available_quantity >= parse_quantity(wanted_card[0]), match])
+
+        return wanted_card_matches
@@ -0,0 +1,224 @@
+import functools
+import operator
+import re
+import sys
+
+# for some reason, grabbing the SRC of the image on the list page is absurdly slow, so the URL is built from the product id found in the product URL
+# format follows: https://tcgplayer-cdn.tcgplayer.com/product/{id}_200w.jpg
+image_url_prefix = "https://tcgplayer-cdn.tcgplayer.com/product/"
+image_url_suffix = "_200w.jpg"
+treatment_pattern = re.compile(r"\((.*?)\)")
+treatment_removal_pattern = re.compile(r"[\(\[].*?[\)\]]")
+
+class CardRecord:
+    """A single card (one per SKU). Typed and compact: quantity and price (in cents) are ints, the product id is parsed out of the product URL, the image URL
+    is built on demand instead of stored, and set, rarity and condition are interned so every card in a set shares the same strings.
+
+    It still reads like the old card row, so anything indexing or iterating a card (sinks, the checkpoint) gets the cards_header fields in order:
+    "Name", "Treatment", "Name Without Treatment", "Set", "Rarity", "Quantity", "Condition/Language", "Price", "Image URL", "Product URL"."""
+
+    __slots__ = ["name", "treatment", "name_without_treatment", "set", "rarity", "quantity", "condition_language", "price_cents", "product_id", "product_url"]
+
+    def __init__(self, name, set, rarity, quantity, condition_language, price_cents, product_url, treatment = None, name_without_treatment = None):
+        """
+        Args:
+            name (string): full name of the card including treatment. Example: Barrowgoyf (Extended Art) (Ripple Foil)
+            set (string): set name
+            rarity (string): rarity
+            quantity (int): quantity available
+            condition_language (string): condition and language of the SKU, i.e. Heavily Played Foil - English
+            price_cents (int): price of the SKU in cents, None if unknown
+            product_url (string): product detail URL
+            treatment (string): comma delimited treatments. Left as None to be filled in by split_treatments.
+            name_without_treatment (string): name with the treatment removed. Left as None to be filled in by split_treatments.
+        """
+
+        self.name = name
+        self.treatment = treatment
+        self.name_without_treatment = name_without_treatment
+        self.set = sys.intern(set)
+        self.rarity = sys.intern(rarity)
+        self.quantity = quantity
+        self.condition_language = sys.intern(condition_language)
+        self.price_cents = price_cents
+        self.product_url = product_url
+        self.product_id = get_product_id(product_url)
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds a record back up from a card row, i.e. one saved to the checkpoint database.
+
+        Args:
+            row (list): card with the cards_header fields
+
+        Returns:
+            CardRecord: the card
+        """
+
+        return cls(row[0], row[3] or "", row[4] or "", parse_quantity(row[5]), row[6] or "", parse_price_cents(row[7]), row[9], row[1], row[2])
+
+    @property
+    def price(self):
+        """string: price the way the list page shows it, i.e. $1,234.56, or empty string if unknown"""
+
+        return format_price(self.price_cents)
+
+    @property
+    def image_url(self):
+        """string: image URL built from the product id, i.e. https://tcgplayer-cdn.tcgplayer.com/product/282745_200w.jpg, or empty string if no product URL"""
+
+        if not self.product_url:
+            return ""
+
+        return image_url_prefix + self.product_url.split("/")[-1] + image_url_suffix
+
+    def to_row(self):
+        """Returns the card as a row.
+
+        Returns:
+            list: card with the cards_header fields
+        """
+
+        return [self.name, self.treatment, self.name_without_treatment, self.set, self.rarity, self.quantity, self.condition_language, self.price, self.image_url, self.product_url]
+
+    def __iter__(self):
+        # Straight off of the fields, so writing a card out doesn't build a row first
+        yield self.name
+        yield self.treatment
+        yield self.name_without_treatment
+        yield self.set
+        yield self.rarity
+        yield self.quantity
+        yield self.condition_language
+        yield format_price(self.price_cents)
+        yield self.image_url
+        yield self.product_url
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __getitem__(self, index):
+        # Every index goes straight to its field, only slices build a row
+        if isinstance(index, slice):
+            return self.to_row()[index]
+
+        return field_getters[index](self)
+
+    def __eq__(self, other):
+        if isinstance(other, CardRecord):
+            return self.to_row() == other.to_row()
+
+        return NotImplemented
+
+    def __repr__(self):
+        return "CardRecord(" + repr(self.to_row()) + ")"
+
+# how to get each cards_header field off of a CardRecord, by index
+field_getters = (operator.attrgetter("name"), operator.attrgetter("treatment"), operator.attrgetter("name_without_treatment"), operator.attrgetter("set"),
+    operator.attrgetter("rarity"), operator.attrgetter("quantity"), operator.attrgetter("condition_language"), CardRecord.price.fget, CardRecord.image_url.fget,
+    operator.attrgetter("product_url"))
+
+@functools.lru_cache(maxsize = 65536)
+def format_price(price_cents):
+    """Formats a price in cents the way the list page shows it. Cached, since a store has far fewer distinct prices than SKUs and every sink asks.
+
+    Args:
+        price_cents (int): price in cents, None if unknown
+
+    Returns:
+        string: price, i.e. $1,234.56, or empty string if unknown
+    """
+
+    if price_cents is None:
+        return ""
+
+    return "${:,.2f}".format(price_cents / 100)
+
+def get_product_id(product_url):
+    """Returns the product id at the end of a product URL.
+
+    Args:
+        product_url (string): product detail URL, i.e. https://nolandbeyond.tcgplayerpro.com/catalog/magic/dominaria-united/282745
+
+    Returns:
+        int: product id, or None if the URL doesn't end in one
+    """
+
+    if product_url:
+        last_part = product_url.rstrip("/").rpartition("/")[2]
+        if last_part.isdigit():
+            return int(last_part)
+
+    return None
+
+def parse_price_cents(price):
+    """Parses a price the way the list page shows it, i.e. $1,234.56, into cents.
+
+    Args:
+        price (string): price
+
+    Returns:
+        int: price in cents, or None if it isn't a price
+    """
+
+    if price is None or price == "":
+        return None
+
+    # Almost always a string straight off of the page, float ignores the whitespace on its own
+    try:
+        return int(round(float(price.replace("$", "").replace(",", "")) * 100))
+    except (AttributeError, ValueError):
+        pass
+
+    try:
+        return int(round(float(str(price).replace("$", "").replace(",", "").strip()) * 100))
+    except ValueError:
+        return None
+
+def parse_quantity(quantity):
+    """Parses a scraped quantity, i.e. "4", into an int.
+
+    Args:
+        quantity (string or int): quantity
+
+    Returns:
+        int: quantity, 0 if it isn't a number
+    """
+
+    try:
+        return int(quantity)
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        return int(str(quantity).replace(",", "").strip())
+    except ValueError:
+        return 0
+
+def split_treatments(cards):
+    """Fills in the treatment and name without treatment for a batch of cards (typically a page) in one go. Every SKU of a product has the same name,
+    so each distinct name is only split once, and the treatments are removed from all of the names with a single regex pass over the batch.
+
+    Args:
+        cards (list): list of CardRecord
+
+    Returns:
+        list: the same cards, for convenience
+    """
+
+    names = list(dict.fromkeys(card.name for card in cards if card.treatment is None and card.name))
+    splits = {}
+
+    if names:
+        # Names never have line breaks (the text is whitespace collapsed), so they can be joined up and split back apart
+        names_without_treatment = treatment_removal_pattern.sub("", "\n".join(names)).split("\n")
+
+        for name, name_without_treatment in zip(names, names_without_treatment):
+            treatment = ",".join(treatment_pattern.findall(name)) if "(" in name else ""
+            splits[name] = (treatment, name_without_treatment)
+
+    for card in cards:
+        if card.treatment is None:
+            card.treatment, card.name_without_treatment = splits.get(card.name, ("", card.name))
+
+    return cards
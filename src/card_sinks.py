@@ -0,0 +1,328 @@
+import csv
+import json
+import re
+import sqlite3
+import xlsxwriter
+import card_matcher
+import inventory_history
+
+# pyarrow is only needed for the parquet and arrow output formats
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# columns for the parquet and arrow output formats, typed instead of the strings the other formats write: quantity, price (in cents) and product id are ints
+arrow_columns = [["name", "string"], ["treatment", "string"], ["name_without_treatment", "string"], ["set", "string"], ["rarity", "string"], ["quantity", "int64"],
+    ["condition_language", "string"], ["price_cents", "int64"], ["product_id", "int64"], ["image_url", "string"], ["product_url", "string"]]
+
+class CsvCardSink:
+    """Writes cards to a CSV file as they arrive."""
+
+    def __init__(self, file_location, header):
+        """
+        Args:
+            file_location (string): CSV file to write
+            header (list): column names, i.e. cards_header
+        """
+
+        self.file = open(file_location, "w", newline = "", encoding = "utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(header)
+
+    def write(self, card):
+        """Writes a single card.
+
+        Args:
+            card (list): card, with fields in header order
+        """
+
+        self.writer.writerow(card)
+
+    def close(self):
+        """Closes the file."""
+
+        self.file.close()
+
+class JsonlCardSink:
+    """Writes cards to a JSON lines file (one JSON object per card) as they arrive."""
+
+    def __init__(self, file_location, header):
+        """
+        Args:
+            file_location (string): JSON lines file to write
+            header (list): field names, i.e. cards_header
+        """
+
+        self.file = open(file_location, "w", encoding = "utf-8")
+        self.header = header
+
+    def write(self, card):
+        """Writes a single card.
+
+        Args:
+            card (list): card, with fields in header order
+        """
+
+        self.file.write(json.dumps(dict(zip(self.header, card))) + "\n")
+
+    def close(self):
+        """Closes the file."""
+
+        self.file.close()
+
+class SqliteCardSink:
+    """Writes cards to a "cards" table in a SQLite database, committing in batches."""
+
+    def __init__(self, file_location, header, batch_size = 1000):
+        """
+        Args:
+            file_location (string): SQLite database to write. The cards table is replaced if it's already there.
+            header (list): column names, i.e. cards_header. Turned into snake case column names.
+            batch_size (int): cards per insert. Defaults to 1000.
+        """
+
+        self.connection = sqlite3.connect(file_location)
+        self.columns = [re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") for name in header]
+        self.batch_size = batch_size
+        self.batch = []
+
+        with self.connection:
+            self.connection.execute("drop table if exists cards")
+            self.connection.execute("create table cards (" + ", ".join('"' + column + '" text' for column in self.columns) + ")")
+
+    def write(self, card):
+        """Queues up a single card, inserting once a batch is full.
+
+        Args:
+            card (list): card, with fields in header order
+        """
+
+        self.batch.append(card)
+
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Inserts the queued up cards."""
+
+        with self.connection:
+            self.connection.executemany("insert into cards values (" + ", ".join("?" for column in self.columns) + ")", self.batch)
+
+        self.batch = []
+
+    def close(self):
+        """Inserts anything left over and closes the database."""
+
+        self.flush()
+        self.connection.close()
+
+class ArrowCardSink:
+    """Writes cards to a Parquet or Arrow IPC (Feather) file in record batches, one column list per field, so only a batch is ever held and the
+    columns come out typed. Needs pyarrow."""
+
+    def __init__(self, file_location, file_format = "parquet", batch_size = 10000):
+        """
+        Args:
+            file_location (string): file to write
+            file_format (string): "parquet" or "arrow". Defaults to parquet.
+            batch_size (int): cards per record batch (and Parquet row group). Defaults to 10000.
+        """
+
+        if pyarrow is None:
+            raise ImportError("The " + file_format + " output format needs pyarrow, pip install pyarrow")
+
+        self.schema = pyarrow.schema([(column, getattr(pyarrow, column_type)()) for column, column_type in arrow_columns])
+        self.batch_size = batch_size
+        self.columns = [[] for column in arrow_columns]
+
+        if file_format == "arrow":
+            self.writer = pyarrow.ipc.new_file(file_location, self.schema)
+        else:
+            self.writer = pyarrow.parquet.ParquetWriter(file_location, self.schema)
+
+    def write(self, card):
+        """Queues up a single card, writing a record batch once a batch is full.
+
+        Args:
+            card (CardRecord): card
+        """
+
+        columns = self.columns
+        columns[0].append(card.name)
+        columns[1].append(card.treatment)
+        columns[2].append(card.name_without_treatment)
+        columns[3].append(card.set)
+        columns[4].append(card.rarity)
+        columns[5].append(card.quantity)
+        columns[6].append(card.condition_language)
+        columns[7].append(card.price_cents)
+        columns[8].append(card.product_id)
+        columns[9].append(card.image_url)
+        columns[10].append(card.product_url)
+
+        if len(columns[0]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the queued up cards as a record batch."""
+
+        if not self.columns[0]:
+            return
+
+        self.writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(values, type = field.type) for values, field in zip(self.columns, self.schema)], schema = self.schema))
+        self.columns = [[] for column in arrow_columns]
+
+    def close(self):
+        """Writes anything left over and closes the file."""
+
+        self.flush()
+        self.writer.close()
+
+class HistoryCardSink:
+    """Records the cards as a snapshot of the store in the inventory history database (see inventory_history.InventoryHistory), staging them in batches.
+    The snapshot is only compared against the store's history once every card is in, when the sink is closed."""
+
+    def __init__(self, database_location, store_front_url, batch_size = 1000):
+        """
+        Args:
+            database_location (string): history database to write to, shared by every store and run
+            store_front_url (string): base URL for the store via TCGPlayer Pro
+            batch_size (int): cards per insert. Defaults to 1000.
+        """
+
+        self.history = inventory_history.InventoryHistory(database_location)
+        self.snapshot_id = self.history.start_snapshot(store_front_url)
+        self.batch_size = batch_size
+        self.batch = []
+        self.observation_count = 0
+
+    def write(self, card):
+        """Queues up a single card, staging it once a batch is full.
+
+        Args:
+            card (CardRecord): card
+        """
+
+        self.batch.append(card)
+
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Stages the queued up cards."""
+
+        self.history.add_cards(self.batch)
+        self.batch = []
+
+    def close(self):
+        """Stages anything left over, saves the snapshot and closes the database."""
+
+        self.flush()
+        self.observation_count = self.history.finish_snapshot(self.snapshot_id)
+        self.history.close()
+
+    def abort(self):
+        """Throws the snapshot away instead of saving it and closes the database. For when not every card made it, see InventoryHistory.discard_snapshot."""
+
+        self.batch = []
+        self.history.discard_snapshot(self.snapshot_id)
+        self.history.close()
+
+class WantedCardsSink:
+    """Matches cards against the wanted cards as they arrive (see card_matcher.WantedCardMatcher) and only keeps the matches, so the whole inventory never
+    has to be held to find them."""
+
+    def __init__(self, wanted_cards):
+        """
+        Args:
+            wanted_cards (list): list of wanted cards as [quantity, name, name without treatment, treatment]
+        """
+
+        self.matcher = card_matcher.WantedCardMatcher(wanted_cards)
+        self.found_cards = []
+        self.wanted_card_matches = []
+
+    def write(self, card):
+        """Keeps the card if it's wanted.
+
+        Args:
+            card (list): card with the cards_header fields
+        """
+
+        self.matcher.add(card)
+
+    def close(self):
+        """Works out the found cards and how each wanted card's quantity compares to what's available. Both stay around for whoever needs them."""
+
+        self.found_cards = self.matcher.get_found_cards()
+        self.wanted_card_matches = self.matcher.get_wanted_card_matches()
+
+class ExcelCardSink:
+    """Writes the Store Inventory worksheet as cards arrive, then the Wanted Cards and Found Cards worksheets when closed. The Wanted Cards worksheet
+    shows what each wanted card matched and if there's enough of it, and both it and Found Cards say whether a match was exact or only a typo match.
+
+    Rows are written in order on every worksheet, so by default the workbook is written in xlsxwriter's constant memory mode: each row goes out to a
+    temp file as soon as the next one starts instead of the whole workbook being held until it's saved."""
+
+    def __init__(self, file_location, header, wanted_cards_header, wanted_cards_sink, constant_memory = True):
+        """
+        Args:
+            file_location (string): Excel file to write
+            header (list): column names for the Store Inventory and Found Cards worksheets, i.e. cards_header
+            wanted_cards_header (list): column names for the Wanted Cards worksheet, matching WantedCardMatcher.get_wanted_card_matches
+            wanted_cards_sink (WantedCardsSink): sink the found cards and wanted card matches come from. Needs to be getting the same cards as this one,
+                and be closed before this one.
+            constant_memory (bool): True to stream rows out as they're written. Defaults to True.
+        """
+
+        self.workbook = xlsxwriter.Workbook(file_location, {"strings_to_urls": False, "constant_memory": constant_memory})
+        self.header_format = self.workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        self.header = header
+        self.wanted_cards_header = wanted_cards_header
+        self.wanted_cards_sink = wanted_cards_sink
+
+        # Worksheets have to be added in the order they show up
+        self.inventory_worksheet = self.add_worksheet("Store Inventory", header)
+        self.wanted_cards_worksheet = self.add_worksheet("Wanted Cards", wanted_cards_header)
+        self.found_cards_worksheet = self.add_worksheet("Found Cards", header + ["Match"])
+        self.row = 1
+
+    def add_worksheet(self, name, header):
+        """Adds a worksheet with a header row formatted the way the pandas export used to do it.
+
+        Args:
+            name (string): worksheet name
+            header (list): column names
+
+        Returns:
+            worksheet: the new worksheet
+        """
+
+        worksheet = self.workbook.add_worksheet(name)
+        worksheet.write_row(0, 0, header, self.header_format)
+
+        return worksheet
+
+    def write(self, card):
+        """Writes a single card to the Store Inventory worksheet.
+
+        Args:
+            card (list): card, with fields in header order
+        """
+
+        self.inventory_worksheet.write_row(self.row, 0, card)
+        self.row += 1
+
+    def close(self):
+        """Writes the Wanted Cards and Found Cards worksheets and saves the workbook."""
+
+        for row, wanted_card_match in enumerate(self.wanted_cards_sink.wanted_card_matches, 1):
+            self.wanted_cards_worksheet.write_row(row, 0, wanted_card_match)
+
+        for row, (found_card, match) in enumerate(self.wanted_cards_sink.found_cards, 1):
+            self.found_cards_worksheet.write_row(row, 0, list(found_card) + [match])
+
+        self.workbook.close()
@@ -0,0 +1,174 @@
+import itertools
+from card_record import parse_quantity
+
+# every store up to this many gets every combination of stores tried, past it a local search (dropping and adding stores) is used instead
+exhaustive_store_limit = 8
+
+def get_offers(matched_cards_by_store):
+    """Puts every store's matches for each wanted card together, exact matches first and cheapest first within those. A typo match might not be the
+    card that's wanted, so it's only ever bought once the exact matches run out. Cards without a price or quantity are left out.
+
+    Args:
+        matched_cards_by_store (dict): store -> list with the matched cards (CardRecord) and how they matched for each wanted card, in want list order
+            (see card_matcher.WantedCardMatcher.get_matched_cards)
+
+    Returns:
+        list: list of offers per wanted card, each offer being (price in cents, store, card, "exact" or "fuzzy")
+    """
+
+    offers = []
+
+    for store, matched_cards in matched_cards_by_store.items():
+        for wanted_index, (cards, match) in enumerate(matched_cards):
+            while len(offers) <= wanted_index:
+                offers.append([])
+
+            offers[wanted_index].extend((card.price_cents, store, card, match) for card in cards if card.price_cents is not None and card.quantity > 0)
+
+    for wanted_offers in offers:
+        wanted_offers.sort(key = lambda offer: (offer[3] != "exact", offer[0]))
+
+    return offers
+
+def fill_wanted_cards(wanted_quantities, offers, stores):
+    """Buys each wanted card as cheaply as possible from the given stores, going through the offers in order so exact matches are bought before typo
+    matches. A SKU wanted on more than one line of the want list is only sold once.
+
+    Args:
+        wanted_quantities (list): quantity wanted for each wanted card
+        offers (list): offers per wanted card from get_offers
+        stores (set): stores that can be bought from
+
+    Returns:
+        tuple: (list of purchases as [wanted index, store, card, quantity, match], quantity that couldn't be filled, cost in cents)
+    """
+
+    purchases = []
+    missing_quantity = 0
+    cost = 0
+    sold = {}
+
+    for wanted_index, wanted_quantity in enumerate(wanted_quantities):
+        remaining = wanted_quantity
+
+        for price_cents, store, card, match in offers[wanted_index] if wanted_index < len(offers) else ():
+            if remaining <= 0:
+                break
+
+            if store not in stores:
+                continue
+
+            available = card.quantity - sold.get(id(card), 0)
+            if available <= 0:
+                continue
+
+            quantity = min(remaining, available)
+            sold[id(card)] = sold.get(id(card), 0) + quantity
+            purchases.append([wanted_index, store, card, quantity, match])
+            cost += price_cents * quantity
+            remaining -= quantity
+
+        missing_quantity += max(0, remaining)
+
+    return purchases, missing_quantity, cost
+
+def score_stores(wanted_quantities, offers, stores, trip_penalty_cents):
+    """Fills the want list from the given stores and scores it. Filling more of the list always wins, cost (cards plus trips) only breaks ties.
+
+    Args:
+        wanted_quantities (list): quantity wanted for each wanted card
+        offers (list): offers per wanted card from get_offers
+        stores (set): stores that can be bought from
+        trip_penalty_cents (int): cost of having to go to a store at all, in cents
+
+    Returns:
+        tuple: ((quantity that couldn't be filled, total cost in cents), purchases, stores actually bought from)
+    """
+
+    purchases, missing_quantity, cost = fill_wanted_cards(wanted_quantities, offers, stores)
+    used_stores = set(purchase[1] for purchase in purchases)
+
+    return (missing_quantity, cost + trip_penalty_cents * len(used_stores)), purchases, used_stores
+
+def search_stores(wanted_quantities, offers, stores, trip_penalty_cents, start_stores):
+    """Local search over which stores to buy from: keeps dropping or adding a single store while that makes things cheaper.
+
+    Args:
+        wanted_quantities (list): quantity wanted for each wanted card
+        offers (list): offers per wanted card from get_offers
+        stores (list): every store that has something wanted
+        trip_penalty_cents (int): cost of having to go to a store at all, in cents
+        start_stores (set): stores to start from
+
+    Returns:
+        tuple: best (score, purchases, used stores) found, see score_stores
+    """
+
+    best = score_stores(wanted_quantities, offers, set(start_stores), trip_penalty_cents)
+    improved = True
+
+    while improved:
+        improved = False
+
+        for store in stores:
+            candidate_stores = best[2] - {store} if store in best[2] else best[2] | {store}
+            candidate = score_stores(wanted_quantities, offers, candidate_stores, trip_penalty_cents)
+
+            if candidate[0] < best[0]:
+                best = candidate
+                improved = True
+
+    return best
+
+def plan_cheapest_fulfillment(wanted_cards, offers, trip_penalty_cents = 0):
+    """Works out the cheapest way to fill the want list across stores. With no trip penalty, that's just the cheapest SKUs wherever they are. With one,
+    every combination of stores is tried for up to exhaustive_store_limit stores, and past that a local search from a couple of starting points is used.
+    Only cards that matched something are in the offers, so this stays fast no matter how big the store inventories are.
+
+    Args:
+        wanted_cards (list): list of wanted cards, [quantity, name, ...]
+        offers (list): offers per wanted card from get_offers
+        trip_penalty_cents (int): cost of having to go to a store at all, in cents. Defaults to 0.
+
+    Returns:
+        dict: plan with "purchases" ([wanted index, store, card, quantity, match]), "missing" ([wanted index, quantity] for what couldn't be filled), "stores",
+            "card_cost", "trip_cost" and "total_cost" (cents)
+    """
+
+    wanted_quantities = [max(0, parse_quantity(wanted_card[0])) for wanted_card in wanted_cards]
+    stores = sorted(set(offer[1] for wanted_offers in offers for offer in wanted_offers))
+
+    if not trip_penalty_cents:
+        best = score_stores(wanted_quantities, offers, set(stores), trip_penalty_cents)
+    elif len(stores) <= exhaustive_store_limit:
+        best = None
+
+        for store_count in range(1, len(stores) + 1):
+            for candidate_stores in itertools.combinations(stores, store_count):
+                candidate = score_stores(wanted_quantities, offers, set(candidate_stores), trip_penalty_cents)
+
+                if best is None or candidate[0] < best[0]:
+                    best = candidate
+
+        if best is None:
+            best = score_stores(wanted_quantities, offers, set(), trip_penalty_cents)
+    else:
+        # From everywhere (drops stores that aren't worth the trip) and from nowhere (adds the stores that are)
+        best = min(search_stores(wanted_quantities, offers, stores, trip_penalty_cents, stores),
+            search_stores(wanted_quantities, offers, stores, trip_penalty_cents, []), key = lambda result: result[0])
+
+    score, purchases, used_stores = best
+    filled_quantities = [0 for wanted_quantity in wanted_quantities]
+    for wanted_index, store, card, quantity, match in purchases:
+        filled_quantities[wanted_index] += quantity
+
+    card_cost = sum(card.price_cents * quantity for wanted_index, store, card, quantity, match in purchases)
+
+    return {
+        "purchases": purchases,
+        "missing": [[wanted_index, wanted_quantity - filled_quantities[wanted_index]] for wanted_index, wanted_quantity in enumerate(wanted_quantities) if filled_quantities[wanted_index] < wanted_quantity],
+        "stores": sorted(used_stores),
+        "card_cost": card_cost,
+        "trip_cost": trip_penalty_cents * len(used_stores),
+        "total_cost": card_cost + trip_penalty_cents * len(used_stores)
+    }
@@ -0,0 +1,394 @@
+import csv
+import getopt
+import sqlite3
+import sys
+import threading
+import time
+
+# where snapshots are kept, every store in the same database
+history_database_location = "tcg_player_inventory_history.db"
+sku_columns = ["product_id", "condition_language", "name", "treatment", "name_without_treatment", "set_name", "rarity", "product_url"]
+price_history_header = ["Observed At", "Snapshot", "Store", "Product ID", "Name", "Set", "Condition/Language", "Quantity", "Price"]
+changes_header = ["Observed At", "Snapshot", "Store", "Product ID", "Name", "Set", "Condition/Language", "Previous Quantity", "Quantity", "Previous Price", "Price"]
+diff_header = ["Change", "Store", "Product ID", "Name", "Set", "Condition/Language", "Quantity Before", "Quantity After", "Price Before", "Price After"]
+snapshots_header = ["Snapshot", "Store", "Taken At", "Cards", "Observations"]
+
+class InventoryHistory:
+    """Local SQLite history of every store's inventory across runs. A SKU is a product id (from the product URL) plus condition/language, and its
+    history is append only: a snapshot only adds an observation for a SKU when its quantity or price changed since the last one (a SKU that's gone
+    is observed with quantity 0), so months of nightly snapshots are mostly just the first one. Each observation keeps what it changed from, so
+    restocks and price drops are a single indexed range scan. Shared between worker threads."""
+
+    def __init__(self, database_location = None):
+        """
+        Args:
+            database_location (string): file location of the SQLite database. Defaults to history_database_location. Created if it doesn't exist.
+        """
+
+        # Stores scraped at the same time each have their own connection (and their own staged cards), so give the writes room to take turns
+        self.connection = sqlite3.connect(database_location or history_database_location, check_same_thread = False, timeout = 60)
+        self.lock = threading.Lock()
+
+        with self.lock, self.connection:
+            self.connection.execute("create table if not exists stores (store_id integer primary key, store_front_url text unique not null)")
+            self.connection.execute("create table if not exists snapshots (snapshot_id integer primary key, store_id integer not null, taken_at real not null, card_count integer)")
+            self.connection.execute("create table if not exists skus (sku_id integer primary key, store_id integer not null, product_id integer not null, condition_language text not null, "
+                "name text, treatment text, name_without_treatment text, set_name text, rarity text, product_url text, last_quantity integer, last_price_cents integer, "
+                "unique (store_id, product_id, condition_language))")
+            self.connection.execute("create table if not exists observations (sku_id integer not null, snapshot_id integer not null, observed_at real not null, "
+                "quantity integer not null, price_cents integer, previous_quantity integer, previous_price_cents integer)")
+            self.connection.execute("create index if not exists snapshots_store on snapshots (store_id, taken_at)")
+            self.connection.execute("create index if not exists skus_name on skus (name_without_treatment collate nocase)")
+            self.connection.execute("create index if not exists skus_product on skus (product_id)")
+            self.connection.execute("create unique index if not exists observations_sku on observations (sku_id, snapshot_id)")
+            self.connection.execute("create index if not exists observations_time on observations (observed_at)")
+            self.connection.execute("create index if not exists observations_snapshot on observations (snapshot_id)")
+
+    def get_store_id(self, store_front_url, create = False):
+        """Returns the id of a store. Needs to be called with the lock held.
+
+        Args:
+            store_front_url (string): base URL for the store via TCGPlayer Pro
+            create (bool): True to add the store if it isn't there yet
+
+        Returns:
+            int: store id, or None if the store isn't there
+        """
+
+        if create:
+            self.connection.execute("insert or ignore into stores (store_front_url) values (?)", (store_front_url,))
+
+        row = self.connection.execute("select store_id from stores where store_front_url = ?", (store_front_url,)).fetchone()
+
+        return row[0] if row else None
+
+    def start_snapshot(self, store_front_url, taken_at = None):
+        """Starts a snapshot of a store. Cards get added with add_cards and the snapshot is saved with finish_snapshot.
+
+        Args:
+            store_front_url (string): base URL for the store via TCGPlayer Pro
+            taken_at (float): when the snapshot was taken. Defaults to now.
+
+        Returns:
+            int: snapshot id
+        """
+
+        with self.lock, self.connection:
+            store_id = self.get_store_id(store_front_url, True)
+            snapshot_id = self.connection.execute("insert into snapshots (store_id, taken_at) values (?, ?)", (store_id, taken_at or time.time())).lastrowid
+
+            # Cards are staged here until the snapshot is finished, then compared against the SKUs' last observations all at once in SQL
+            self.connection.execute("create temp table if not exists snapshot_cards (product_id integer not null, condition_language text not null, name text, treatment text, "
+                "name_without_treatment text, set_name text, rarity text, product_url text, quantity integer not null, price_cents integer, primary key (product_id, condition_language))")
+            self.connection.execute("delete from snapshot_cards")
+
+        return snapshot_id
+
+    def add_cards(self, cards):
+        """Stages cards for the snapshot in progress. Cards without a product id can't be tracked and are left out.
+
+        Args:
+            cards (list): list of cards (CardRecord)
+        """
+
+        with self.lock, self.connection:
+            self.connection.executemany("insert or replace into snapshot_cards values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((card.product_id, card.condition_language, card.name, card.treatment, card.name_without_treatment, card.set, card.rarity, card.product_url, card.quantity, card.price_cents)
+                    for card in cards if card.product_id is not None))
+
+    def finish_snapshot(self, snapshot_id):
+        """Saves the snapshot in progress: new SKUs are added, SKUs whose quantity or price changed get an observation, and SKUs that weren't seen get
+        a quantity 0 observation. Only SKUs in sets that were in the snapshot count as gone, so a set that failed to scrape doesn't look sold out.
+
+        Args:
+            snapshot_id (int): snapshot id from start_snapshot
+
+        Returns:
+            int: number of observations added
+        """
+
+        with self.lock, self.connection:
+            store_id, taken_at = self.connection.execute("select store_id, taken_at from snapshots where snapshot_id = ?", (snapshot_id,)).fetchone()
+            first_snapshot = self.connection.execute("select count(*) from snapshots where store_id = ? and snapshot_id < ?", (store_id, snapshot_id)).fetchone()[0] == 0
+
+            self.connection.execute("insert or ignore into skus (store_id, " + ", ".join(sku_columns) + ") select ?, " + ", ".join(sku_columns) + " from snapshot_cards", (store_id,))
+
+            # A SKU that's new after the store's first snapshot was stocked from nothing. On the first snapshot there's nothing to compare against.
+            changed = self.connection.execute("insert into observations (sku_id, snapshot_id, observed_at, quantity, price_cents, previous_quantity, previous_price_cents) "
+                "select skus.sku_id, ?, ?, snapshot_cards.quantity, snapshot_cards.price_cents, "
+                "case when skus.last_quantity is null and ? then null else coalesce(skus.last_quantity, 0) end, skus.last_price_cents from snapshot_cards "
+                "join skus on skus.store_id = ? and skus.product_id = snapshot_cards.product_id and skus.condition_language = snapshot_cards.condition_language "
+                "where skus.last_quantity is null or skus.last_quantity != snapshot_cards.quantity or skus.last_price_cents is not snapshot_cards.price_cents",
+                (snapshot_id, taken_at, first_snapshot, store_id)).rowcount
+
+            gone = self.connection.execute("insert into observations (sku_id, snapshot_id, observed_at, quantity, price_cents, previous_quantity, previous_price_cents) "
+                "select sku_id, ?, ?, 0, last_price_cents, last_quantity, last_price_cents from skus where store_id = ? and last_quantity > 0 "
+                "and set_name in (select distinct set_name from snapshot_cards) "
+                "and not exists (select 1 from snapshot_cards where snapshot_cards.product_id = skus.product_id and snapshot_cards.condition_language = skus.condition_language)",
+                (snapshot_id, taken_at, store_id)).rowcount
+
+            # The SKUs' latest state, so the next snapshot doesn't have to go looking through the observations for it
+            self.connection.execute("update skus set (last_quantity, last_price_cents) = (select quantity, price_cents from observations where observations.snapshot_id = ? "
+                "and observations.sku_id = skus.sku_id) where sku_id in (select sku_id from observations where snapshot_id = ?)", (snapshot_id, snapshot_id))
+            self.connection.execute("update snapshots set card_count = (select count(*) from snapshot_cards) where snapshot_id = ?", (snapshot_id,))
+            self.connection.execute("delete from snapshot_cards")
+
+        return changed + gone
+
+    def discard_snapshot(self, snapshot_id):
+        """Throws away the snapshot in progress and the cards staged for it, i.e. when the scrape failed partway. Half an inventory saved as a snapshot
+        would look like everything else sold out.
+
+        Args:
+            snapshot_id (int): snapshot id from start_snapshot
+        """
+
+        with self.lock, self.connection:
+            self.connection.execute("delete from snapshot_cards")
+            self.connection.execute("delete from snapshots where snapshot_id = ?", (snapshot_id,))
+
+    def query(self, sql, parameters = ()):
+        """Runs a query.
+
+        Args:
+            sql (string): query
+            parameters (tuple): query parameters
+
+        Returns:
+            list: rows
+        """
+
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def get_snapshots(self, store_front_url = None):
+        """Lists the snapshots.
+
+        Args:
+            store_front_url (string): only snapshots of this store. Defaults to every store.
+
+        Returns:
+            list: rows with the snapshots_header fields, oldest first
+        """
+
+        return self.query("select snapshots.snapshot_id, stores.store_front_url, snapshots.taken_at, snapshots.card_count, "
+            "(select count(*) from observations where observations.snapshot_id = snapshots.snapshot_id) from snapshots join stores on stores.store_id = snapshots.store_id "
+            "where ? is null or stores.store_front_url = ? order by snapshots.snapshot_id", (store_front_url, store_front_url))
+
+    def get_price_history(self, card, store_front_url = None):
+        """Returns every change in quantity and price for a card.
+
+        Args:
+            card (string): product id, or card name (without treatment, any case)
+            store_front_url (string): only this store. Defaults to every store.
+
+        Returns:
+            list: rows with the price_history_header fields, by SKU and then oldest first
+        """
+
+        sku_filter = "skus.product_id = ?" if str(card).isdigit() else "skus.name_without_treatment = ? collate nocase"
+
+        return self.query("select observations.observed_at, observations.snapshot_id, stores.store_front_url, skus.product_id, skus.name, skus.set_name, skus.condition_language, "
+            "observations.quantity, observations.price_cents from skus join stores on stores.store_id = skus.store_id join observations on observations.sku_id = skus.sku_id "
+            "where " + sku_filter + " and (? is null or stores.store_front_url = ?) order by skus.sku_id, observations.snapshot_id",
+            (int(card) if str(card).isdigit() else card, store_front_url, store_front_url))
+
+    def get_changes(self, change, since, store_front_url = None):
+        """Returns the restocks (quantity went up) or price drops since a point in time.
+
+        Args:
+            change (string): "restocks" or "price-drops"
+            since (float): start time
+            store_front_url (string): only this store. Defaults to every store.
+
+        Returns:
+            list: rows with the changes_header fields, newest first
+        """
+
+        change_filter = "observations.quantity > observations.previous_quantity" if change == "restocks" else "observations.price_cents < observations.previous_price_cents and observations.quantity > 0"
+
+        return self.query("select observations.observed_at, observations.snapshot_id, stores.store_front_url, skus.product_id, skus.name, skus.set_name, skus.condition_language, "
+            "observations.previous_quantity, observations.quantity, observations.previous_price_cents, observations.price_cents from observations "
+            "join skus on skus.sku_id = observations.sku_id join stores on stores.store_id = skus.store_id "
+            "where observations.observed_at >= ? and " + change_filter + " and (? is null or stores.store_front_url = ?) order by observations.observed_at desc, skus.name",
+            (since, store_front_url, store_front_url))
+
+    def get_diff(self, from_snapshot_id, to_snapshot_id):
+        """Compares a store's inventory as of two of its snapshots, SKU by SKU.
+
+        Args:
+            from_snapshot_id (int): earlier snapshot
+            to_snapshot_id (int): later snapshot of the same store
+
+        Returns:
+            list: rows with the diff_header fields, change being Added, Removed, Repriced or Quantity
+        """
+
+        store_ids = dict(self.query("select snapshot_id, store_id from snapshots where snapshot_id in (?, ?)", (from_snapshot_id, to_snapshot_id)))
+        for snapshot_id in (from_snapshot_id, to_snapshot_id):
+            if snapshot_id not in store_ids:
+                raise ValueError("There's no snapshot " + str(snapshot_id))
+
+        if store_ids[from_snapshot_id] != store_ids[to_snapshot_id]:
+            raise ValueError("Snapshots " + str(from_snapshot_id) + " and " + str(to_snapshot_id) + " aren't both snapshots of the same store")
+
+        # A SKU's state as of a snapshot is its latest observation at or before it, one seek on observations_sku. Only SKUs observed in between can differ.
+        state_as_of = "(select {0} from observations where observations.sku_id = skus.sku_id and observations.snapshot_id <= ? order by observations.snapshot_id desc limit 1)"
+
+        return self.query("select case when before_quantity = 0 then 'Added' when after_quantity = 0 then 'Removed' when before_price_cents is not after_price_cents then 'Repriced' "
+            "else 'Quantity' end, store_front_url, product_id, name, set_name, condition_language, before_quantity, after_quantity, before_price_cents, after_price_cents "
+            "from (select stores.store_front_url, skus.product_id, skus.name, skus.set_name, skus.condition_language, "
+            "coalesce(" + state_as_of.format("quantity") + ", 0) as before_quantity, " + state_as_of.format("price_cents") + " as before_price_cents, "
+            "coalesce(" + state_as_of.format("quantity") + ", 0) as after_quantity, " + state_as_of.format("price_cents") + " as after_price_cents "
+            "from skus join stores on stores.store_id = skus.store_id where skus.store_id = ? "
+            "and skus.sku_id in (select sku_id from observations where snapshot_id > ? and snapshot_id <= ?)) "
+            "where before_quantity != after_quantity or (after_quantity > 0 and before_price_cents is not after_price_cents) order by set_name, name",
+            (from_snapshot_id, from_snapshot_id, to_snapshot_id, to_snapshot_id, store_ids[from_snapshot_id], min(from_snapshot_id, to_snapshot_id), max(from_snapshot_id, to_snapshot_id)))
+
+    def close(self):
+        """Closes the database connection."""
+
+        with self.lock:
+            self.connection.close()
+
+def format_time(timestamp):
+    """Formats a time for output, i.e. 2024-08-01 02:15.
+
+    Args:
+        timestamp (float): time
+
+    Returns:
+        string: local date and time
+    """
+
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+def format_price(price_cents):
+    """Formats a price the way the list page shows it, i.e. $1,234.56.
+
+    Args:
+        price_cents (int): price in cents, None if unknown
+
+    Returns:
+        string: price, or empty string if unknown
+    """
+
+    return "" if price_cents is None else "${:,.2f}".format(price_cents / 100)
+
+def parse_since(since):
+    """Parses when to look back to: a date (YYYY-MM-DD) or a number of days ago.
+
+    Args:
+        since (string): date or days
+
+    Returns:
+        float: time
+    """
+
+    try:
+        return time.time() - float(since) * 24 * 60 * 60
+    except ValueError:
+        return time.mktime(time.strptime(since, "%Y-%m-%d"))
+
+def print_rows(header, rows, output_file_location = None):
+    """Prints rows as tab separated columns, or writes them to a CSV file.
+
+    Args:
+        header (list): column names
+        rows (list): rows
+        output_file_location (string): CSV file to write instead of printing
+    """
+
+    if output_file_location:
+        with open(output_file_location, "w", newline = "", encoding = "utf-8") as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return
+
+    print("\t".join(header))
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+
+def main(argv):
+    database_location = history_database_location
+    store_front_url = None
+    since = "7"
+    output_file_location = None
+    command = None
+    command_argument = None
+
+    try:
+        opts, args = getopt.getopt(argv, "d:", ["database=", "store-url=", "since=", "output=", "snapshots", "price-history=", "restocks", "price-drops", "diff="])
+    except getopt.GetoptError:
+        print("inventory_history.py -d <database> --snapshots --price-history <card> --restocks --price-drops --diff <snapshot>,<snapshot> --store-url <store-url> --since <since> --output <output>")
+        print("database is the history database written with --output-formats history. Defaults to " + history_database_location)
+        print("snapshots lists every snapshot, price-history shows every quantity and price change for a card (product id or name), restocks and price-drops list what restocked or dropped in price since since, and diff compares a store between two snapshots")
+        print("store-url only looks at one store. since is a date (YYYY-MM-DD) or a number of days ago, defaults to 7. output writes a CSV instead of printing")
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-d", "--database"):
+            database_location = arg
+        if opt == "--store-url":
+            store_front_url = arg if arg.endswith("/") else arg + "/"
+        if opt == "--since":
+            since = arg
+        if opt == "--output":
+            output_file_location = arg
+        if opt in ("--snapshots", "--restocks", "--price-drops"):
+            command = opt[2:]
+        if opt in ("--price-history", "--diff"):
+            command, command_argument = opt[2:], arg
+
+    if command is None:
+        print("Please provide --snapshots, --price-history, --restocks, --price-drops or --diff. Exiting.")
+        sys.exit(2)
+
+    snapshot_ids = []
+    if command == "diff":
+        try:
+            snapshot_ids = [int(snapshot_id) for snapshot_id in command_argument.split(",")]
+        except ValueError:
+            snapshot_ids = []
+
+        if len(snapshot_ids) != 2:
+            print("diff takes two snapshots, i.e. --diff 12,19. Exiting.")
+            sys.exit(2)
+
+    try:
+        since = parse_since(since)
+    except ValueError:
+        print("since has to be a date (YYYY-MM-DD) or a number of days, not " + since + ". Exiting.")
+        sys.exit(2)
+
+    history = InventoryHistory(database_location)
+    start = time.perf_counter()
+
+    if command == "snapshots":
+        header = snapshots_header
+        rows = [[row[0], row[1], format_time(row[2]), row[3], row[4]] for row in history.get_snapshots(store_front_url)]
+    elif command == "price-history":
+        header = price_history_header
+        rows = [[format_time(row[0])] + list(row[1:8]) + [format_price(row[8])] for row in history.get_price_history(command_argument, store_front_url)]
+    elif command in ("restocks", "price-drops"):
+        header = changes_header
+        rows = [[format_time(row[0])] + list(row[1:9]) + [format_price(row[9]), format_price(row[10])] for row in history.get_changes(command, since, store_front_url)]
+    else:
+        header = diff_header
+
+        try:
+            rows = [list(row[:8]) + [format_price(row[8]), format_price(row[9])] for row in history.get_diff(snapshot_ids[0], snapshot_ids[1])]
+        except ValueError as e:
+            history.close()
+            print(str(e) + ". Exiting.")
+            sys.exit(1)
+
+    elapsed_time = time.perf_counter() - start
+    history.close()
+
+    print_rows(header, rows, output_file_location)
+    print(str(len(rows)) + " rows in " + "{:.1f}".format(elapsed_time * 1000) + " ms", file = sys.stderr)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,164 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+class PageCache:
+    """On disk cache of raw list page HTML, so a store can be parsed, matched and exported again without loading a single page (see the replay scrape
+    engine). Pages are content addressed: each distinct page is gzipped once under objects/ by its SHA-256, and an SQLite index keeps which URL had
+    which content when. A page that comes back unchanged just has its time bumped, so rescraping a store mostly costs index rows.
+    Shared between worker threads."""
+
+    def __init__(self, cache_directory, max_bytes = 0, max_age_seconds = 0):
+        """
+        Args:
+            cache_directory (string): directory for the cache. Created if it doesn't exist.
+            max_bytes (int): most compressed bytes to keep, the least recently fetched pages go first. 0 for no limit.
+            max_age_seconds (float): pages fetched longer ago than this are dropped. 0 for no limit.
+        """
+
+        self.cache_directory = cache_directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.join(cache_directory, "objects"), exist_ok = True)
+        self.connection = sqlite3.connect(os.path.join(cache_directory, "index.db"), check_same_thread = False)
+
+        with self.lock, self.connection:
+            self.connection.execute("create table if not exists pages (url text not null, fetched_at real not null, content_hash text not null)")
+            self.connection.execute("create table if not exists objects (content_hash text primary key, size integer not null)")
+            self.connection.execute("create index if not exists pages_url on pages (url, fetched_at)")
+            self.connection.execute("create index if not exists pages_content_hash on pages (content_hash)")
+
+    def get_object_location(self, content_hash):
+        """Returns where a page's compressed content lives.
+
+        Args:
+            content_hash (string): SHA-256 of the page
+
+        Returns:
+            string: file location, fanned out by the first 2 characters so no directory gets huge
+        """
+
+        return os.path.join(self.cache_directory, "objects", content_hash[:2], content_hash + ".html.gz")
+
+    def put(self, url, page_source):
+        """Saves a page. Content that's already in the cache isn't written again.
+
+        Args:
+            url (string): URL the page was loaded from
+            page_source (string): HTML of the page
+        """
+
+        if not page_source:
+            return
+
+        content = page_source.encode("utf-8")
+        content_hash = hashlib.sha256(content).hexdigest()
+        fetched_at = time.time()
+
+        with self.lock:
+            latest = self.connection.execute("select rowid, content_hash from pages where url = ? order by fetched_at desc limit 1", (url,)).fetchone()
+            if latest and latest[1] == content_hash:
+                with self.connection:
+                    self.connection.execute("update pages set fetched_at = ? where rowid = ?", (fetched_at, latest[0]))
+                return
+
+            stored = self.connection.execute("select 1 from objects where content_hash = ?", (content_hash,)).fetchone()
+
+        if not stored:
+            object_location = self.get_object_location(content_hash)
+            os.makedirs(os.path.dirname(object_location), exist_ok = True)
+
+            # Written to the side and moved into place so a crash can't leave half a page behind
+            compressed_content = gzip.compress(content, compresslevel = 6)
+            temporary_location = object_location + "." + str(threading.get_ident()) + ".tmp"
+            with open(temporary_location, "wb") as object_file:
+                object_file.write(compressed_content)
+            os.replace(temporary_location, object_location)
+
+        with self.lock, self.connection:
+            if not stored:
+                self.connection.execute("insert or ignore into objects (content_hash, size) values (?, ?)", (content_hash, len(compressed_content)))
+            self.connection.execute("insert into pages (url, fetched_at, content_hash) values (?, ?, ?)", (url, fetched_at, content_hash))
+
+    def get(self, url):
+        """Returns the latest saved copy of a page.
+
+        Args:
+            url (string): URL the page was loaded from
+
+        Returns:
+            string: HTML of the page, or None if it isn't cached
+        """
+
+        with self.lock:
+            row = self.connection.execute("select content_hash from pages where url = ? order by fetched_at desc limit 1", (url,)).fetchone()
+
+        if not row:
+            return None
+
+        try:
+            with open(self.get_object_location(row[0]), "rb") as object_file:
+                return gzip.decompress(object_file.read()).decode("utf-8")
+        except (OSError, EOFError) as e:
+            print("Could not read cached page for " + url + ": " + str(e))
+            return None
+
+    def evict(self):
+        """Drops pages older than max_age_seconds, then the least recently fetched pages until the cache is under max_bytes, then any content
+        no page points to anymore.
+
+        Returns:
+            int: number of page contents removed
+        """
+
+        with self.lock, self.connection:
+            if self.max_age_seconds > 0:
+                self.connection.execute("delete from pages where fetched_at < ?", (time.time() - self.max_age_seconds,))
+
+            if self.max_bytes > 0:
+                total_bytes = self.connection.execute("select coalesce(sum(size), 0) from objects where content_hash in (select content_hash from pages)").fetchone()[0]
+
+                if total_bytes > self.max_bytes:
+                    # Content goes by the last time any URL had it
+                    for content_hash, size in self.connection.execute("select pages.content_hash, objects.size from pages join objects on objects.content_hash = pages.content_hash "
+                        "group by pages.content_hash order by max(pages.fetched_at)").fetchall():
+                        if total_bytes <= self.max_bytes:
+                            break
+
+                        self.connection.execute("delete from pages where content_hash = ?", (content_hash,))
+                        total_bytes -= size
+
+            unused_hashes = [row[0] for row in self.connection.execute("select content_hash from objects where content_hash not in (select content_hash from pages)")]
+            self.connection.executemany("delete from objects where content_hash = ?", [(content_hash,) for content_hash in unused_hashes])
+
+        for content_hash in unused_hashes:
+            try:
+                os.remove(self.get_object_location(content_hash))
+            except OSError:
+                pass
+
+        return len(unused_hashes)
+
+    def get_stats(self):
+        """Returns how much is in the cache.
+
+        Returns:
+            dict: number of URLs, page versions, distinct contents and compressed bytes
+        """
+
+        with self.lock:
+            urls, versions = self.connection.execute("select count(distinct url), count(*) from pages").fetchone()
+            contents, size = self.connection.execute("select count(*), coalesce(sum(size), 0) from objects").fetchone()
+
+        return {"urls": urls, "versions": versions, "contents": contents, "bytes": size}
+
+    def close(self):
+        """Closes the index."""
+
+        with self.lock:
+            self.connection.close()
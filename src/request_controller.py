@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+from scrape_metrics import metrics
+
+class RequestController:
+    """Decides how hard to push each store, from how its page loads are going. Shared between worker threads.
+
+    Circuit breaker: after failure_threshold page loads in a row fail for a store, every request to it waits out a cooldown instead of piling on more
+    failures. The cooldown doubles (up to max_cooldown_seconds) each time the first request after it fails too, and resets on a success.
+
+    AIMD: when adaptive, the store's own rate limiter speeds up by rate_increase requests per second for every second's worth of good page loads, up to
+    max_requests_per_second, and is cut by rate_decrease whenever the store throttles us, a page load fails or a page takes longer than slow_page_seconds.
+    Cuts happen at most once per slow_page_seconds, so a burst of failures from requests that were already in flight only counts once."""
+
+    def __init__(self, failure_threshold = 5, cooldown_seconds = 30, max_cooldown_seconds = 300, adaptive = False, max_requests_per_second = 0,
+        min_requests_per_second = 0.1, rate_increase = 0.1, rate_decrease = 0.5, slow_page_seconds = 10):
+        """
+        Args:
+            failure_threshold (int): page loads in a row that have to fail before the store's circuit opens. Defaults to 5.
+            cooldown_seconds (float): how long an open circuit holds requests to the store. Defaults to 30.
+            max_cooldown_seconds (float): longest the cooldown can double up to. Defaults to 300.
+            adaptive (bool): True to adjust the rate limiters with AIMD. Defaults to False.
+            max_requests_per_second (float): fastest AIMD will go. Defaults to 0, which keeps whatever rate the limiter started at as the ceiling.
+            min_requests_per_second (float): slowest AIMD will go. Defaults to 0.1.
+            rate_increase (float): requests per second added per second's worth of good page loads. Defaults to 0.1.
+            rate_decrease (float): what the rate is multiplied by when the store pushes back. Defaults to 0.5.
+            slow_page_seconds (float): a page load slower than this counts as the store pushing back. Defaults to 10.
+        """
+
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.adaptive = adaptive
+        self.max_requests_per_second = max_requests_per_second
+        self.min_requests_per_second = min_requests_per_second
+        self.rate_increase = rate_increase
+        self.rate_decrease = rate_decrease
+        self.slow_page_seconds = slow_page_seconds
+        self.lock = threading.Lock()
+        self.stores = {}
+
+    def get_store_state(self, store):
+        """Returns the breaker and AIMD state for a store, creating it the first time. Needs to be called with the lock held.
+
+        Args:
+            store (string): store key, i.e. its host
+
+        Returns:
+            dict: state for the store
+        """
+
+        state = self.stores.get(store)
+        if state is None:
+            state = self.stores[store] = {"consecutive_failures": 0, "open_until": 0, "cooldown_seconds": self.cooldown_seconds, "good_loads": 0, "last_decrease": 0, "ceiling": None}
+
+        return state
+
+    def wait_for_store(self, store):
+        """Blocks while the store's circuit is open.
+
+        Args:
+            store (string): store key, i.e. its host
+        """
+
+        with self.lock:
+            wait_time = self.get_store_state(store)["open_until"] - time.monotonic()
+
+        if wait_time > 0:
+            with metrics.timer("circuit_open_wait"):
+                time.sleep(wait_time)
+
+    def record_success(self, store, seconds, rate_limiter):
+        """Records a page load that worked. Closes the store's circuit, and with AIMD, speeds the rate limiter up (or slows it down if the page was slow).
+
+        Args:
+            store (string): store key, i.e. its host
+            seconds (float): how long the page load took
+            rate_limiter (TokenBucketRateLimiter): the store's own limiter, None if it doesn't have one
+        """
+
+        with self.lock:
+            state = self.get_store_state(store)
+            state["consecutive_failures"] = 0
+            state["cooldown_seconds"] = self.cooldown_seconds
+
+            if not self.adaptive or rate_limiter is None or rate_limiter.requests_per_second <= 0:
+                return
+
+            if seconds > self.slow_page_seconds:
+                self.decrease_rate(state, rate_limiter)
+                return
+
+            if state["ceiling"] is None:
+                state["ceiling"] = self.max_requests_per_second or rate_limiter.requests_per_second
+
+            # One increase per second's worth of requests at the current rate, so the rate climbs linearly over time rather than per request
+            state["good_loads"] += 1
+            if state["good_loads"] >= rate_limiter.requests_per_second:
+                state["good_loads"] = 0
+                rate_limiter.requests_per_second = min(state["ceiling"], rate_limiter.requests_per_second + self.rate_increase)
+
+    def record_failure(self, store, throttled, rate_limiter):
+        """Records a page load that failed. Opens the store's circuit once enough fail in a row, and with AIMD, slows the rate limiter down.
+
+        Args:
+            store (string): store key, i.e. its host
+            throttled (bool): True if the store said to slow down (i.e. HTTP 429 or 503)
+            rate_limiter (TokenBucketRateLimiter): the store's own limiter, None if it doesn't have one
+        """
+
+        with self.lock:
+            state = self.get_store_state(store)
+            state["consecutive_failures"] += 1
+
+            if self.adaptive and rate_limiter is not None and rate_limiter.requests_per_second > 0:
+                if state["ceiling"] is None:
+                    state["ceiling"] = self.max_requests_per_second or rate_limiter.requests_per_second
+
+                self.decrease_rate(state, rate_limiter)
+
+            # Throttling on its own just slows us down, it takes failures in a row to stop altogether
+            if state["consecutive_failures"] < self.failure_threshold:
+                return
+
+            now = time.monotonic()
+            if state["open_until"] > now:
+                return
+
+            metrics.increment("circuit_breaker.opened")
+            print("Circuit open for " + store + " after " + str(state["consecutive_failures"]) + " failed page loads" + (" (throttled)" if throttled else "") +
+                ", pausing it for " + str(state["cooldown_seconds"]) + " seconds")
+
+            state["open_until"] = now + state["cooldown_seconds"]
+            state["cooldown_seconds"] = min(self.max_cooldown_seconds, state["cooldown_seconds"] * 2)
+
+    def decrease_rate(self, state, rate_limiter):
+        """Cuts the rate limiter by rate_decrease, if it hasn't just been cut. Needs to be called with the lock held.
+
+        Args:
+            state (dict): state for the store
+            rate_limiter (TokenBucketRateLimiter): limiter pacing the store
+        """
+
+        now = time.monotonic()
+        if now - state["last_decrease"] < self.slow_page_seconds:
+            return
+
+        state["last_decrease"] = now
+        state["good_loads"] = 0
+        rate_limiter.requests_per_second = max(self.min_requests_per_second, rate_limiter.requests_per_second * self.rate_decrease)
+        metrics.increment("rate.decreases")
+        print("Slowing down to " + "{:.2f}".format(rate_limiter.requests_per_second) + " requests per second")
+
+def get_backoff_seconds(attempt, base_seconds = 1, max_seconds = 30):
+    """Returns how long to wait before retrying, doubling each attempt with full jitter so workers that failed together don't retry together.
+
+    Args:
+        attempt (int): retry number, starting at 0
+        base_seconds (float): backoff for the first retry. Defaults to 1.
+        max_seconds (float): longest backoff. Defaults to 30.
+
+    Returns:
+        float: seconds to wait
+    """
+
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
@@ -0,0 +1,219 @@
+import json
+import sqlite3
+import threading
+import time
+
+card_columns = ["name", "treatment", "name_without_treatment", "set_name", "rarity", "quantity", "condition_language", "price", "image_url", "product_url"]
+
+def get_query_key(query):
+    """Returns a stable key for a query so the same query can be found again on a later run.
+
+    Args:
+        query (dict): query, as a dictionary of search parameter -> list of values
+
+    Returns:
+        string: key for the query
+    """
+
+    return json.dumps(query, sort_keys = True)
+
+class ScrapeCheckpoint:
+    """Local SQLite store that every completed query (set, or group of sets) is committed to as soon as it finishes, so a crashed Chrome or a reboot
+    only loses the queries that were in flight. A run keeps its query plan too, so resuming doesn't even need to look the sets up again.
+    Shared between worker threads."""
+
+    def __init__(self, database_location):
+        """
+        Args:
+            database_location (string): file location of the SQLite database. Created if it doesn't exist.
+        """
+
+        # Stores scraped at the same time each have their own checkpoint on the same database, so give the writes room to take turns
+        self.connection = sqlite3.connect(database_location, check_same_thread = False, timeout = 60)
+        self.lock = threading.Lock()
+        self.run_id = None
+        self.previous_run_id = None
+
+        with self.lock, self.connection:
+            self.connection.execute("create table if not exists scrape_runs (run_id integer primary key autoincrement, store_front_url text not null, started_at real not null, finished_at real, query_plan text)")
+            self.connection.execute("create table if not exists run_queries (run_id integer not null, query_key text not null, completed_at real not null, fingerprint text, primary key (run_id, query_key))")
+            self.connection.execute("create table if not exists run_cards (run_id integer not null, query_key text not null, " + ", ".join(column + " text" for column in card_columns) + ")")
+            self.connection.execute("create index if not exists run_cards_query on run_cards (run_id, query_key)")
+            self.connection.execute("create index if not exists run_cards_sku on run_cards (run_id, product_url, condition_language)")
+            self.connection.execute("create index if not exists scrape_runs_store on scrape_runs (store_front_url, finished_at)")
+
+            # Databases from before fingerprints were kept
+            if "fingerprint" not in [row[1] for row in self.connection.execute("pragma table_info(run_queries)")]:
+                self.connection.execute("alter table run_queries add column fingerprint text")
+
+    def start_run(self, store_front_url, resume = False):
+        """Starts a new run for the store, or picks the last unfinished one back up if resume is set and there is one.
+
+        Args:
+            store_front_url (string): base URL for the store via TCGPlayer Pro
+            resume (bool): True to continue the last unfinished run for the store
+
+        Returns:
+            bool: True if an unfinished run was resumed, False if a new run was started
+        """
+
+        with self.lock, self.connection:
+            # Last finished run is what incremental scrapes compare against
+            row = self.connection.execute("select run_id from scrape_runs where store_front_url = ? and finished_at is not null order by run_id desc limit 1", (store_front_url,)).fetchone()
+            self.previous_run_id = row[0] if row else None
+
+            if resume:
+                row = self.connection.execute("select run_id from scrape_runs where store_front_url = ? and finished_at is null order by run_id desc limit 1", (store_front_url,)).fetchone()
+                if row:
+                    self.run_id = row[0]
+                    return True
+
+            self.run_id = self.connection.execute("insert into scrape_runs (store_front_url, started_at) values (?, ?)", (store_front_url, time.time())).lastrowid
+
+        return False
+
+    def get_query_plan(self, run_id = None):
+        """Returns the query plan saved for the current run (or another run).
+
+        Args:
+            run_id (int): run to get the plan of. Defaults to the current run.
+
+        Returns:
+            list: list of queries, or None if no plan was saved yet
+        """
+
+        if run_id is None:
+            run_id = self.run_id
+
+        with self.lock:
+            row = self.connection.execute("select query_plan from scrape_runs where run_id = ?", (run_id,)).fetchone()
+
+        if row and row[0]:
+            return json.loads(row[0])
+
+        return None
+
+    def save_query_plan(self, queries):
+        """Saves the query plan for the current run so a resume can skip straight to the unfinished queries.
+
+        Args:
+            queries (list): list of queries
+        """
+
+        with self.lock, self.connection:
+            self.connection.execute("update scrape_runs set query_plan = ? where run_id = ?", (json.dumps(queries), self.run_id))
+
+    def is_query_completed(self, query):
+        """Checks if the query was already completed in the current run.
+
+        Args:
+            query (dict): query
+
+        Returns:
+            bool: True if completed
+        """
+
+        with self.lock:
+            row = self.connection.execute("select 1 from run_queries where run_id = ? and query_key = ?", (self.run_id, get_query_key(query))).fetchone()
+
+        return row is not None
+
+    def load_query_cards(self, query, run_id = None):
+        """Loads the cards saved for a completed query in the current run (or another run).
+
+        Args:
+            query (dict): query
+            run_id (int): run to load from. Defaults to the current run.
+
+        Returns:
+            list: list of cards, in the order they were scraped
+        """
+
+        if run_id is None:
+            run_id = self.run_id
+
+        with self.lock:
+            rows = self.connection.execute("select " + ", ".join(card_columns) + " from run_cards where run_id = ? and query_key = ? order by rowid", (run_id, get_query_key(query))).fetchall()
+
+        return [list(row) for row in rows]
+
+    def get_previous_fingerprint(self, query):
+        """Returns the fingerprint the query had in the last finished run for the store.
+
+        Args:
+            query (dict): query
+
+        Returns:
+            string: fingerprint, or None if the query wasn't in the last run
+        """
+
+        if self.previous_run_id is None:
+            return None
+
+        with self.lock:
+            row = self.connection.execute("select fingerprint from run_queries where run_id = ? and query_key = ?", (self.previous_run_id, get_query_key(query))).fetchone()
+
+        return row[0] if row else None
+
+    def save_query_cards(self, query, cards, fingerprint = None):
+        """Commits the cards for a completed query in one transaction and marks the query as completed.
+
+        Args:
+            query (dict): query
+            cards (list): list of cards scraped for the query
+            fingerprint (string): fingerprint of the query (see get_query_fingerprint), so the next incremental run can tell if it changed
+        """
+
+        query_key = get_query_key(query)
+
+        with self.lock, self.connection:
+            self.connection.execute("delete from run_cards where run_id = ? and query_key = ?", (self.run_id, query_key))
+            self.connection.executemany("insert into run_cards (run_id, query_key, " + ", ".join(card_columns) + ") values (?, ?, " + ", ".join("?" for column in card_columns) + ")",
+                ([self.run_id, query_key] + list(card) for card in cards))
+            self.connection.execute("insert or replace into run_queries (run_id, query_key, completed_at, fingerprint) values (?, ?, ?, ?)", (self.run_id, query_key, time.time(), fingerprint))
+
+    def finish_run(self):
+        """Marks the current run as finished and clears out older runs for the same store. The last finished run before this one is kept, so this run
+        can still be compared against it (see diff_against_previous_run)."""
+
+        with self.lock, self.connection:
+            store_front_url = self.connection.execute("select store_front_url from scrape_runs where run_id = ?", (self.run_id,)).fetchone()[0]
+            self.connection.execute("update scrape_runs set finished_at = ? where run_id = ?", (time.time(), self.run_id))
+
+            keep_run_ids = [self.run_id, self.previous_run_id]
+            old_run_ids = [row[0] for row in self.connection.execute("select run_id from scrape_runs where store_front_url = ? and run_id < ?", (store_front_url, self.run_id)) if row[0] not in keep_run_ids]
+            for old_run_id in old_run_ids:
+                self.connection.execute("delete from run_cards where run_id = ?", (old_run_id,))
+                self.connection.execute("delete from run_queries where run_id = ?", (old_run_id,))
+                self.connection.execute("delete from scrape_runs where run_id = ?", (old_run_id,))
+
+    def diff_against_previous_run(self):
+        """Compares the current run against the last finished run SKU by SKU (product URL plus condition/language), in the database so neither
+        inventory has to be loaded.
+
+        Returns:
+            generator: changes as [change, card fields..., previous quantity, previous price], change being Added, Removed or Repriced
+        """
+
+        if self.previous_run_id is None:
+            return
+
+        current_columns = ", ".join("current." + column for column in card_columns)
+        previous_columns = ", ".join("previous." + column for column in card_columns)
+        sku_match = "{0}.product_url = {1}.product_url and {0}.condition_language = {1}.condition_language"
+
+        with self.lock:
+            rows = self.connection.execute("select case when previous.rowid is null then 'Added' else 'Repriced' end, " + current_columns + ", previous.quantity, previous.price "
+                "from run_cards current left join run_cards previous on previous.run_id = ? and " + sku_match.format("previous", "current") + " "
+                "where current.run_id = ? and (previous.rowid is null or previous.price != current.price) order by current.rowid", (self.previous_run_id, self.run_id)).fetchall()
+            rows += self.connection.execute("select 'Removed', " + previous_columns + ", previous.quantity, previous.price from run_cards previous "
+                "where previous.run_id = ? and not exists (select 1 from run_cards current where current.run_id = ? and " + sku_match.format("current", "previous") + ") order by previous.rowid",
+                (self.previous_run_id, self.run_id)).fetchall()
+
+        for row in rows:
+            yield ["" if value is None else value for value in row]
+
+    def close(self):
+        """Closes the database connection."""
+
+        self.connection.close()
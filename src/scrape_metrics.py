@@ -0,0 +1,279 @@
+import cProfile
+import contextlib
+import heapq
+import json
+import pstats
+import threading
+import time
+
+# slowest timings kept per stage (i.e. the 10 slowest sets), so the outliers in a multi-hour scrape are easy to find
+slow_outlier_count = 10
+# set by --profile, every worker thread gets its own cProfile.Profile since cProfile only sees the thread it was enabled on
+profiling = False
+
+class ScrapeMetrics:
+    """Timings per stage (navigation, wait, parse, match, write, page, set, ...) and counters (WebDriver commands, retries, failures) for a scrape.
+    Shared between worker threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.slow_outliers = {}
+        self.events = []
+        self.profiles = []
+
+    def record(self, stage, seconds, label = None, cards = None, store = None):
+        """Records how long a stage took.
+
+        Args:
+            stage (string): stage, i.e. parse
+            seconds (float): how long it took
+            label (string): what it was for, i.e. the set name or page URL. Labeled timings are kept as events and slow outliers.
+            cards (int): cards the stage handled, if it makes sense for the stage
+            store (string): store key (its host) the stage was for, kept on the event so a store's events can be told apart
+        """
+
+        with self.lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "cards": 0}
+
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            if cards:
+                stats["cards"] += cards
+
+            if label is None:
+                return
+
+            self.events.append({"stage": stage, "label": label, "seconds": seconds, "cards": cards, "store": store, "at": time.time()})
+
+            # Min heap, so the fastest of the slow ones is the one to drop
+            outliers = self.slow_outliers.setdefault(stage, [])
+            if len(outliers) < slow_outlier_count:
+                heapq.heappush(outliers, (seconds, label))
+            elif seconds > outliers[0][0]:
+                heapq.heapreplace(outliers, (seconds, label))
+
+    def clear_events(self, store = None):
+        """Drops the labeled timings kept so far. Stage totals, counters and slow outliers stay, they don't grow with the number of pages.
+
+        Args:
+            store (string): store key to only drop that store's events. Defaults to None, which drops every event.
+        """
+
+        with self.lock:
+            self.events = [event for event in self.events if store is not None and event["store"] != store]
+
+    @contextlib.contextmanager
+    def timer(self, stage, label = None, store = None):
+        """Times the block it wraps as a stage. Cards can be set on what it yields, i.e. timing["cards"] = len(cards).
+
+        Args:
+            stage (string): stage, i.e. navigation
+            label (string): what it was for, see record
+            store (string): store key the stage was for, see record
+        """
+
+        timing = {"cards": None}
+        start_time = time.perf_counter()
+
+        try:
+            yield timing
+        finally:
+            self.record(stage, time.perf_counter() - start_time, label, timing["cards"], store)
+
+    def increment(self, counter, amount = 1):
+        """Adds to a counter.
+
+        Args:
+            counter (string): counter, i.e. webdriver_commands.findElement
+            amount (int): how much to add. Defaults to 1.
+        """
+
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def get_slow_outliers(self, stage):
+        """Returns the slowest labeled timings for a stage.
+
+        Args:
+            stage (string): stage
+
+        Returns:
+            list: list of (seconds, label), slowest first
+        """
+
+        with self.lock:
+            return sorted(self.slow_outliers.get(stage, []), reverse = True)
+
+    def write_jsonl(self, file_location):
+        """Writes the metrics as JSON lines: one line per stage, counter and event, each with a "type".
+
+        Args:
+            file_location (string): file to write
+        """
+
+        with self.lock, open(file_location, "w", encoding = "utf-8") as metrics_file:
+            for stage, stats in self.stages.items():
+                metrics_file.write(json.dumps(dict({"type": "stage", "stage": stage}, **stats)) + "\n")
+
+            for counter, value in self.counters.items():
+                metrics_file.write(json.dumps({"type": "counter", "counter": counter, "value": value}) + "\n")
+
+            for event in self.events:
+                metrics_file.write(json.dumps(dict({"type": "event"}, **event)) + "\n")
+
+    def write_prometheus(self, file_location):
+        """Writes the metrics in the Prometheus text exposition format, i.e. for the node exporter's textfile collector.
+
+        Args:
+            file_location (string): file to write
+        """
+
+        lines = []
+
+        with self.lock:
+            for name, metric_type, help_text, field in [["tcg_scraper_stage_seconds_total", "counter", "Time spent in each stage", "seconds"],
+                ["tcg_scraper_stage_runs_total", "counter", "Times each stage ran", "count"],
+                ["tcg_scraper_stage_max_seconds", "gauge", "Slowest single run of each stage", "max_seconds"],
+                ["tcg_scraper_stage_cards_total", "counter", "Cards handled by each stage", "cards"]]:
+                lines.append("# HELP " + name + " " + help_text)
+                lines.append("# TYPE " + name + " " + metric_type)
+
+                for stage, stats in sorted(self.stages.items()):
+                    lines.append(name + '{stage="' + escape_label(stage) + '"} ' + str(stats[field]))
+
+            # Counters named like group.name become one metric per group with name as a label, i.e. webdriver_commands.findElement
+            groups = {}
+            for counter, value in sorted(self.counters.items()):
+                group, separator, name = counter.partition(".")
+                groups.setdefault(group, []).append((name, value))
+
+            for group, values in groups.items():
+                metric_name = "tcg_scraper_" + group + "_total"
+                lines.append("# TYPE " + metric_name + " counter")
+
+                for name, value in values:
+                    lines.append(metric_name + ('{name="' + escape_label(name) + '"}' if name else "") + " " + str(value))
+
+            lines.append("# TYPE tcg_scraper_started_at_seconds gauge")
+            lines.append("tcg_scraper_started_at_seconds " + str(self.started_at))
+
+        with open(file_location, "w", encoding = "utf-8") as metrics_file:
+            metrics_file.write("\n".join(lines) + "\n")
+
+    def print_summary(self):
+        """Prints time per stage, the counters and the slowest sets and pages."""
+
+        with self.lock:
+            stages = sorted(self.stages.items(), key = lambda item: item[1]["seconds"], reverse = True)
+            counters = sorted(self.counters.items())
+
+        for stage, stats in stages:
+            print("Stage " + stage + ": " + "{:.3f}".format(stats["seconds"]) + "s over " + str(stats["count"]) + " runs, slowest " + "{:.3f}".format(stats["max_seconds"]) + "s")
+
+        for counter, value in counters:
+            print(counter + ": " + str(value))
+
+        for stage in ["set", "page"]:
+            for seconds, label in self.get_slow_outliers(stage)[:5]:
+                print("Slow " + stage + ": " + "{:.3f}".format(seconds) + "s " + label)
+
+def escape_label(value):
+    """Escapes a Prometheus label value.
+
+    Args:
+        value (string): label value
+
+    Returns:
+        string: escaped value
+    """
+
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def instrument_driver(driver):
+    """Counts every WebDriver command the driver sends (find_element, .text, execute_script, get, CDP calls, ...) by command name. Every command, including
+    the ones WebElements send, goes through the driver's execute, so that's what gets wrapped.
+
+    Args:
+        driver (selenium driver): driver to count commands for
+
+    Returns:
+        selenium driver: the same driver
+    """
+
+    execute = driver.execute
+
+    def counted_execute(driver_command, params = None):
+        metrics.increment("webdriver_commands." + str(driver_command))
+        return execute(driver_command, params)
+
+    driver.execute = counted_execute
+
+    return driver
+
+def profile_thread(target):
+    """Wraps a thread's target so it runs under its own cProfile.Profile when profiling is on. The profiles are merged in write_profile.
+
+    Args:
+        target (function): thread target
+
+    Returns:
+        function: wrapped target
+    """
+
+    def profiled_target(*args, **kwargs):
+        if not profiling:
+            return target(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        with metrics.lock:
+            metrics.profiles.append(profile)
+
+        return profile.runcall(target, *args, **kwargs)
+
+    return profiled_target
+
+def start_profiling():
+    """Turns profiling on: starts profiling the calling (main) thread, and worker threads started through profile_thread from here on.
+
+    Returns:
+        cProfile.Profile: the calling thread's profile, to disable once the run is done
+    """
+
+    global profiling
+
+    profiling = True
+    profile = cProfile.Profile()
+
+    with metrics.lock:
+        metrics.profiles.append(profile)
+
+    profile.enable()
+
+    return profile
+
+def write_profile(file_location, top = 30):
+    """Merges every profile (main thread and workers), saves it for snakeviz/pstats and prints the hot spots.
+
+    Args:
+        file_location (string): file to save the merged profile to
+        top (int): number of functions to print. Defaults to 30.
+    """
+
+    with metrics.lock:
+        profiles = [profile for profile in metrics.profiles if profile.getstats()]
+
+    if not profiles:
+        return
+
+    stats = pstats.Stats(*profiles)
+    stats.dump_stats(file_location)
+    stats.sort_stats("cumulative").print_stats(top)
+    stats.sort_stats("tottime").print_stats(top)
+
+metrics = ScrapeMetrics()
@@ -0,0 +1,271 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+import requests
+from urllib3.util.retry import Retry
+
+class StoreDirectory:
+    """Looks up stores through the TCGPlayer API: store name -> store key -> store info (with the storefront URL). Every lookup goes over one pooled
+    requests.Session with a timeout and retries, and what's found is kept in an SQLite cache for cache_seconds, so resolving the same stores again
+    doesn't go to the API at all. A list of store names is resolved in one call, with the name lookups running at the same time and the store info for
+    all of them fetched together. Shared between worker threads."""
+
+    def __init__(self, api_base_url, api_key, cache_location = "tcg_player_store_directory.db", cache_seconds = 86400, timeout = 10, workers = 8, max_retries = 3):
+        """
+        Args:
+            api_base_url (string): base URL for the TCGPlayer API, i.e. TCG_PLAYER_API_BASE_URL
+            api_key (string): bearer token for the TCGPlayer API, i.e. TCG_PLAYER_API_KEY
+            cache_location (string): SQLite file to cache store keys and info in. Empty for no cache. Defaults to tcg_player_store_directory.db.
+            cache_seconds (float): how long a cached store key or store info is good for. Defaults to 86400 (a day).
+            timeout (float): seconds to wait on the API before giving up on a request. Defaults to 10.
+            workers (int): most name lookups to have in flight at the same time. Defaults to 8.
+            max_retries (int): times a request that couldn't connect or got a 429/5xx back is retried, with backoff. Defaults to 3.
+        """
+
+        self.api_base_url = api_base_url.rstrip("/")
+        self.cache_seconds = cache_seconds
+        self.timeout = timeout
+        self.workers = workers
+        self.lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections = 1, pool_maxsize = workers,
+            max_retries = Retry(total = max_retries, backoff_factor = 0.5, status_forcelist = [429, 500, 502, 503, 504], respect_retry_after_header = True))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"accept": "application/json", "Authorization": "bearer " + api_key})
+
+        self.connection = None
+        if cache_location:
+            self.connection = sqlite3.connect(cache_location, check_same_thread = False)
+
+            with self.lock, self.connection:
+                self.connection.execute("create table if not exists store_names (store_name text primary key, store_key text not null, fetched_at real not null)")
+                self.connection.execute("create table if not exists stores (store_key text primary key, info text not null, fetched_at real not null)")
+
+    def get_results(self, path, params = None):
+        """Makes a GET request to the API and returns the results from it. The body is only parsed once.
+
+        Args:
+            path (string): path under the API base URL, i.e. /stores/self
+            params (dict): query string parameters
+
+        Returns:
+            list: results from the response, or None if the request failed or didn't come back as JSON
+        """
+
+        try:
+            response = self.session.get(self.api_base_url + path, params = params, timeout = self.timeout)
+        except requests.RequestException as e:
+            print("Store lookup failed for " + path + ": " + str(e))
+            return None
+
+        if response.status_code != 200:
+            print("Store lookup failed for " + path + ": HTTP " + str(response.status_code))
+            return None
+
+        try:
+            resp_json = response.json()
+        except ValueError:
+            return None
+
+        if not isinstance(resp_json, dict) or not isinstance(resp_json.get("results"), list):
+            return None
+
+        return resp_json["results"]
+
+    def get_cached(self, table, key_column, value_column, keys):
+        """Returns the cached values for keys that haven't expired.
+
+        Args:
+            table (string): cache table, store_names or stores
+            key_column (string): column the keys are in
+            value_column (string): column the values are in
+            keys (list): keys to look up
+
+        Returns:
+            dict: key -> value, only for the keys that were cached
+        """
+
+        if self.connection is None or not keys:
+            return {}
+
+        cached = {}
+        fetched_after = time.time() - self.cache_seconds
+
+        with self.lock:
+            # Chunked to stay under SQLite's limit on parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                cached.update(self.connection.execute("select " + key_column + ", " + value_column + " from " + table + " where fetched_at >= ? and " + key_column + " in (" +
+                    ",".join("?" * len(chunk)) + ")", [fetched_after] + chunk).fetchall())
+
+        return cached
+
+    def put_cached(self, table, key_column, value_column, values):
+        """Caches values as of now.
+
+        Args:
+            table (string): cache table, store_names or stores
+            key_column (string): column the keys are in
+            value_column (string): column the values are in
+            values (dict): key -> value
+        """
+
+        if self.connection is None or not values:
+            return
+
+        fetched_at = time.time()
+
+        with self.lock, self.connection:
+            self.connection.executemany("insert or replace into " + table + " (" + key_column + ", " + value_column + ", fetched_at) values (?, ?, ?)",
+                [(key, value, fetched_at) for key, value in values.items()])
+
+    def get_my_store_key(self):
+        """Returns the store key for the store the API key belongs to. Not cached, since it's one request and depends on the API key.
+
+        Returns:
+            string: store key, or "" if it couldn't be found
+        """
+
+        results = self.get_results("/stores/self")
+        return results[0] if results else ""
+
+    def get_store_keys(self, store_names):
+        """Returns the store keys for store names, looking up the ones that aren't cached at the same time.
+
+        Args:
+            store_names (list): official TCGPlayer store names
+
+        Returns:
+            dict: store name -> store key, only for the stores that were found
+        """
+
+        store_names = list(dict.fromkeys(store_names))
+        store_keys = self.get_cached("store_names", "store_name", "store_key", store_names)
+        missing_names = [store_name for store_name in store_names if store_name not in store_keys]
+
+        if not missing_names:
+            return store_keys
+
+        found_keys = {}
+        found_keys_lock = threading.Lock()
+        names_queue = queue.Queue()
+        for store_name in missing_names:
+            names_queue.put(store_name)
+
+        def lookup_worker():
+            while True:
+                try:
+                    store_name = names_queue.get_nowait()
+                except queue.Empty:
+                    return
+
+                results = self.get_results("/stores", {"name": store_name})
+                if results:
+                    with found_keys_lock:
+                        found_keys[store_name] = results[0]
+
+        workers = []
+        for _ in range(min(self.workers, len(missing_names))):
+            worker = threading.Thread(target = lookup_worker)
+            worker.start()
+            workers.append(worker)
+
+        for worker in workers:
+            worker.join()
+
+        self.put_cached("store_names", "store_name", "store_key", found_keys)
+        store_keys.update(found_keys)
+
+        return store_keys
+
+    def get_store_infos(self, store_keys, batch_size = 50):
+        """Returns the store info for store keys. The ones that aren't cached are fetched batch_size at a time, since the stores endpoint takes a comma
+        separated list of store keys.
+
+        Args:
+            store_keys (list): store keys from TCGPlayer
+            batch_size (int): most store keys to ask for in one request. Defaults to 50.
+
+        Returns:
+            dict: store key -> store info, only for the stores that were found
+        """
+
+        store_keys = list(dict.fromkeys(store_keys))
+        store_infos = {store_key: json.loads(info) for store_key, info in self.get_cached("stores", "store_key", "info", store_keys).items()}
+        missing_keys = [store_key for store_key in store_keys if store_key not in store_infos]
+
+        found_infos = {}
+        for start in range(0, len(missing_keys), batch_size):
+            batch = missing_keys[start:start + batch_size]
+            results = self.get_results("/stores/" + ",".join(batch)) or []
+
+            if len(batch) == 1 and results:
+                found_infos[batch[0]] = results[0]
+                continue
+
+            for result in results:
+                if isinstance(result, dict) and result.get("storeKey") in batch:
+                    found_infos[result["storeKey"]] = result
+
+        self.put_cached("stores", "store_key", "info", {store_key: json.dumps(info) for store_key, info in found_infos.items()})
+        store_infos.update(found_infos)
+
+        return store_infos
+
+    def get_store_key(self, store_name):
+        """Returns the store key for a store name.
+
+        Args:
+            store_name (string): official TCGPlayer store name
+
+        Returns:
+            string: store key, or "" if it couldn't be found
+        """
+
+        return self.get_store_keys([store_name]).get(store_name, "")
+
+    def get_store_info(self, store_key):
+        """Returns the store info for a store key.
+
+        Args:
+            store_key (string): store key from TCGPlayer
+
+        Returns:
+            dict: store info from the stores endpoint, or "" if it couldn't be found
+        """
+
+        return self.get_store_infos([store_key]).get(store_key, "")
+
+    def resolve_store_names(self, store_names):
+        """Resolves store names to their storefront URLs in one go: every name lookup at the same time, then the store info for all of them together.
+
+        Args:
+            store_names (list): official TCGPlayer store names
+
+        Returns:
+            dict: store name -> [store key, storefront URL]. Stores that couldn't be found (or have no storefront URL) aren't in it.
+        """
+
+        store_keys = self.get_store_keys(store_names)
+        store_infos = self.get_store_infos(list(store_keys.values()))
+
+        resolved_stores = {}
+        for store_name, store_key in store_keys.items():
+            store_front_url = (store_infos.get(store_key) or {}).get("storefrontUrl")
+            if store_front_url:
+                resolved_stores[store_name] = [store_key, store_front_url]
+
+        return resolved_stores
+
+    def close(self):
+        """Closes the session and the cache."""
+
+        self.session.close()
+
+        if self.connection is not None:
+            with self.lock:
+                self.connection.close()
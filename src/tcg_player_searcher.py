@@ -1,24 +1,123 @@
 import time
 import requests
 import json
-import pandas as pd
 import getopt
 import re
 import sys
 import os
 import urllib.parse
+import hashlib
+import threading
+import queue
+import lxml.html
+import scrape_checkpoint
+import card_sinks
+import card_matcher
+import card_record
+import fulfillment_optimizer
+import scrape_metrics
+import page_cache as page_cache_module
+import request_controller as request_controller_module
+import store_directory as store_directory_module
+from scrape_metrics import metrics
 from dotenv import load_dotenv
 from selenium.webdriver import Chrome, ChromeOptions
 from selenium.webdriver import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
 import time
 
 headless = ""
-sleep_time_between_pages = 2
+# how long to wait for a page to be ready (results rendered and settled) before scraping whatever is there
+page_ready_timeout = 10
+page_ready_poll_frequency = 0.1
+# "lxml" parses a single page_source snapshot per page, "webdriver" walks the DOM element by element (slower, but handy when debugging selectors),
+# "json" skips the DOM and builds cards from the storefront's own search API responses captured through Chrome's performance log
+parsing_engine = "lxml"
+parsing_engines = ["lxml", "webdriver", "json"]
+# which captured responses count as search results for the json parsing engine, and how long to wait for one before falling back to the DOM.
+# The path has to end at the search endpoint (search, search/request or search/products), so suggestions, autocomplete and analytics calls that
+# just have "/search" somewhere in their URL don't count.
+search_response_url_pattern = re.compile(r"^https?://[^/?#]+/(?:[^?#]*/)?search(?:/request|/products)?/?(?:[?#]|$)", re.IGNORECASE)
+search_response_timeout = 15
+# --lean has Chrome skip what the parsers never look at (images, fonts, media, analytics and tracking scripts) by blocking those URLs through DevTools.
+# Stylesheets and the storefront's own scripts and API calls are left alone since the list page is rendered client side.
+lean = False
+lean_blocked_extensions = ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "woff", "woff2", "ttf", "otf", "eot", "mp4", "webm"]
+lean_blocked_hosts = ["*tcgplayer-cdn.tcgplayer.com/product/*", "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*", "*facebook.net*",
+    "*facebook.com/tr*", "*hotjar.com*", "*segment.io*", "*segment.com*", "*nr-data.net*", "*newrelic.com*", "*clarity.ms*", "*bat.bing.com*", "*tiktok.com*", "*sentry.io*"]
+# "selenium" drives Chrome, "http" fetches the same list pages with a pooled requests.Session and no browser at all
+scrape_engine = "selenium"
+scrape_engines = ["selenium", "http", "replay"]
+# longest a single page load can take (Chrome's page load timeout, or the HTTP request timeout) before it counts as failed and gets retried
+page_load_timeout = 30
+http_user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
+http_session = None
+# raw list pages are saved here as they're scraped (see page_cache.PageCache) so they can be reparsed later with the replay scrape engine. Empty to not keep them.
+page_cache_location = ""
+default_page_cache_location = "tcg_player_page_cache"
+page_cache_max_bytes = 2 * 1024 * 1024 * 1024
+page_cache_max_age_seconds = 30 * 24 * 60 * 60
+page_cache = None
+# set by a long running process (see tcg_player_service) to hand out warm drivers instead of starting new ones, see setup_driver and release_driver
+driver_pool = None
+# how long the Set Name facet counts for a store are reused before being looked up again. 0 looks them up every run, which is all a single run needs.
+set_counts_cache_seconds = 0
+set_counts_cache = {}
+set_counts_cache_lock = threading.Lock()
+# TCGPlayer won't page past roughly 10k products (208 pages of 48), so no single query can be allowed to go over this
+page_size = 48
+query_result_cap = 9984
+# facets (title in the filter panel, search parameter) used to split up a query that would go over the cap, tried in order
+split_facets = [["Rarity", "rarityName"], ["Condition", "condition"], ["Printing", "printing"], ["Language", "language"]]
+# expected vs scraped product counts for every query that was run, see record_query_report
+query_reports = []
+query_reports_lock = threading.Lock()
+# small sets (per the Set Name facet counts) get packed together into one query so a set with 1 card doesn't cost a whole page load of its own
+pack_small_sets = True
+max_sets_per_query = 40
+set_name_separator = "|"
+# every completed query is committed here as it finishes so a crashed run can be picked back up with --resume
+checkpoint_database_location = "tcg_player_scrape_checkpoint.db"
+# incremental scrapes skip any query whose fingerprint (result total + hash of page 1) matches the last finished run, reusing that run's cards
+incremental = False
+inventory_changes_file_location = "tcg_player_inventory_changes.csv"
+# where scraped cards get written as they come in, see setup_card_sinks
+output_formats = ["excel"]
+available_output_formats = ["excel", "csv", "jsonl", "sqlite", "parquet", "arrow", "history"]
+# file extension for each output format that writes a file of its own
+output_format_extensions = {"excel": ".xlsx", "csv": ".csv", "jsonl": ".jsonl", "sqlite": ".db", "parquet": ".parquet", "arrow": ".arrow"}
+# the history output format adds every run to this database instead of writing a file of its own, see inventory_history.py for querying it
+history_database_location = "tcg_player_inventory_history.db"
+# path (without extension) the output files are written to. {store}, {date} and {time} get filled in, see get_output_file_name
+output_file_name = "tcg_player_inventory_for_store"
+# store names are looked up through the TCGPlayer API (see store_directory.StoreDirectory) and what's found is cached here for a while
+store_directory_cache_location = "tcg_player_store_directory.db"
+store_directory_cache_seconds = 24 * 60 * 60
+store_directory = None
+# number of Chrome drivers (or HTTP clients) scraping sets at the same time
+pool_size = 1
+# global politeness limit across every driver, so more drivers doesn't mean more requests per second
+requests_per_second = 1
+request_burst = 1
 cards_header = ["Name", "Treatment", "Name Without Treatment", "Set", "Rarity", "Quantity", "Condition/Language", "Price", "Image URL", "Product URL"]
 wanted_cards_header = ["Quantity", "Name"]
+wanted_card_matches_header = ["Quantity", "Name", "Matched Name", "Available Quantity", "Fulfilled", "Match"]
+inventory_changes_header = ["Change"] + cards_header + ["Previous Quantity", "Previous Price"]
 found_cards_header = ["Name"]
+# with more than one store, the cheapest way to fill the want list across them is written here. The trip penalty (in cents) is what going to one more
+# store is worth, so a card a few cents cheaper across town doesn't win out over one at a store you're already going to
+fulfillment_plan_file_location = "tcg_player_fulfillment_plan.csv"
+fulfillment_plan_header = ["Store", "Wanted Name", "Quantity", "Name", "Set", "Condition/Language", "Price", "Line Total", "Product URL", "Match"]
+trip_penalty_cents = 0
+# where the stage timings and counters from scrape_metrics get written at the end of the run, if anywhere
+metrics_file_location = ""
+metrics_format = "jsonl"
+metrics_formats = ["jsonl", "prometheus"]
+# --profile runs everything under cProfile and saves the merged profile here
+profile_file_location = "tcg_player_scrape.prof"
 
 def is_json(myjson):
   """Checks to see if the given string is valid JSON
@@ -35,29 +134,33 @@ def is_json(myjson):
     return False
   return True
 
-def get_my_store_id():
-    """Returns store id from your store. This is no longer used by the script, but is here if for some reason you want to use it. You'll need an API key defined in a constants.py file. 
+def get_store_directory():
+    """Sets up the store directory used to look up stores through the TCGPlayer API, with TCG_PLAYER_API_BASE_URL and TCG_PLAYER_API_KEY from the
+    environment (or a .env file).
 
     Returns:
-        JSON: store id
+        StoreDirectory: pooled, cached store directory
     """
 
-    url = os.getenv("TCG_PLAYER_API_BASE_URL") + "/stores/self"
-    
-    headers = {"accept": "application/json", "Authorization": "bearer " + os.getenv("TCG_PLAYER_API_KEY")}
-    
-    response = requests.get(url, headers=headers)
+    global store_directory
 
-    if (is_json(response.text)):
-        resp_json = json.loads(response.text)     
+    if store_directory is None:
+        store_directory = store_directory_module.StoreDirectory(os.getenv("TCG_PLAYER_API_BASE_URL", ""), os.getenv("TCG_PLAYER_API_KEY", ""),
+            store_directory_cache_location, store_directory_cache_seconds)
 
-        if "results" in resp_json and len(resp_json["results"]) > 0:  
-            return resp_json["results"][0]
-    
-    return ""
+    return store_directory
+
+def get_my_store_id():
+    """Returns store id from your store. This is no longer used by the script, but is here if for some reason you want to use it. You'll need an API key defined in a .env file (see get_store_directory).
+
+    Returns:
+        JSON: store id
+    """
+
+    return get_store_directory().get_my_store_key()
 
 def get_store_id(store_name):
-    """Returns store id from the TCGPlayer API. This is no longer used by the script, but is here if for some reason you want to use it. You'll need an API key defined in a constants.py file. 
+    """Returns store id from the TCGPlayer API. You'll need an API key defined in a .env file (see get_store_directory).
 
     Args:
         store_name (string): store_name
@@ -66,487 +169,2386 @@ def get_store_id(store_name):
         JSON: store id
     """
 
-    url = os.getenv("TCG_PLAYER_API_BASE_URL") + "/stores?name=" + store_name
-    
-    headers = {"accept": "application/json", "Authorization": "bearer " + os.getenv("TCG_PLAYER_API_KEY")}
-    
-    response = requests.get(url, headers=headers)
+    return get_store_directory().get_store_key(store_name)
+
+def get_store_info(store_key):
+    """Returns store info from the TCGPlayer API. You'll need an API key defined in a .env file (see get_store_directory).
 
-    if (is_json(response.text)):
-        resp_json = json.loads(response.text)        
+    Args:
+        store_key (string): store_key (from TCGPlayer) representing the store.
 
-        if "results" in resp_json and len(resp_json["results"]) > 0:  
-            return resp_json["results"][0]
-    
-    return ""
+    Returns:
+        JSON: store info from the /stores/ endpoint.
+    """
+
+    return get_store_directory().get_store_info(store_key)
+
+class TokenBucketRateLimiter:
+    """Token bucket that paces page loads so all drivers together stay under requests_per_second, with up to burst requests allowed back to back.
+    This is the only thing that decides how polite we are, page readiness is detected separately. Shared between worker threads."""
+
+    def __init__(self, requests_per_second, burst = 1):
+        """
+        Args:
+            requests_per_second (float): rate the bucket refills at, i.e. the maximum sustained page loads per second across all drivers. 0 or less disables the limit.
+            burst (int): size of the bucket, i.e. how many requests can go out back to back after being idle. Defaults to 1.
+        """
+
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.tokens = burst
+        self.last_refill_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Takes a token, blocking until one is available. Tokens can go negative, which reserves the caller a spot in line so waiting threads go in order."""
+
+        if self.requests_per_second <= 0:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill_time) * self.requests_per_second)
+            self.last_refill_time = now
+            self.tokens -= 1
+            wait_time = -self.tokens / self.requests_per_second if self.tokens < 0 else 0
+
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+request_rate_limiter = TokenBucketRateLimiter(requests_per_second, request_burst)
+# page loads that fail (timed out, connection dropped, throttled, server error) are retried this many times with jittered backoff before the set fails.
+# An empty page before the result total says the query is done gets reloaded this many times too, instead of being taken as the end of the query.
+max_page_retries = 3
+retry_backoff_seconds = 1
+# HTTP statuses that mean the store wants us to slow down
+throttled_status_codes = [429, 503]
+# circuit breaker per store, and AIMD on the rate limiters with --adaptive-rate (see request_controller.RequestController)
+adaptive_rate = False
+max_requests_per_second = 0
+request_controller = request_controller_module.RequestController()
+# optional extra limit per store (host -> TokenBucketRateLimiter) on top of the global one, see set_store_rate_limit and get_store_rate_limiter
+store_rate_limiters = {}
+store_rate_limiters_lock = threading.Lock()
+
+def get_store_key(url):
+    """Returns what identifies the store a URL belongs to, its host.
+
+    Args:
+        url (string): any URL on the store, i.e. a list page URL
+
+    Returns:
+        string: host, i.e. nolandbeyond.tcgplayerpro.com
+    """
+
+    return urllib.parse.urlparse(url).netloc.lower()
+
+def set_store_rate_limit(store_front_url, store_requests_per_second, store_request_burst = 1):
+    """Limits page loads for a single store, on top of the global request_rate_limiter. Handy when scraping several stores at once.
+
+    Args:
+        store_front_url (string): base URL for the store via TCGPlayer Pro
+        store_requests_per_second (float): maximum sustained page loads per second for the store. 0 or less removes the store's limit.
+        store_request_burst (int): page loads that can go out back to back. Defaults to 1.
+    """
+
+    with store_rate_limiters_lock:
+        if store_requests_per_second > 0:
+            store_rate_limiters[get_store_key(store_front_url)] = TokenBucketRateLimiter(store_requests_per_second, store_request_burst)
+        else:
+            store_rate_limiters.pop(get_store_key(store_front_url), None)
+
+def get_store_rate_limiter(store):
+    """Returns the store's own rate limiter, if it has one. With adaptive_rate every store gets one, starting at requests_per_second, the first time
+    it's asked for. AIMD only ever adjusts these, so a store that pushes back only slows down its own page loads and the global request_rate_limiter
+    stays a fixed cap over every store.
+
+    Args:
+        store (string): store key, i.e. its host
+
+    Returns:
+        TokenBucketRateLimiter: the store's limiter, None if it doesn't have one
+    """
+
+    with store_rate_limiters_lock:
+        store_rate_limiter = store_rate_limiters.get(store)
+
+        if store_rate_limiter is None and adaptive_rate and requests_per_second > 0:
+            store_rate_limiter = store_rate_limiters[store] = TokenBucketRateLimiter(requests_per_second, request_burst)
+
+    return store_rate_limiter
+
+def is_throttled(exception):
+    """Returns True if a failed page load was the store telling us to slow down.
+
+    Args:
+        exception (Exception): what the page load raised
+
+    Returns:
+        bool: True if throttled
+    """
+
+    response = getattr(exception, "response", None)
+
+    return response is not None and getattr(response, "status_code", None) in throttled_status_codes
+
+def get_retry_after_seconds(exception):
+    """Returns how long the store asked us to wait before trying again (the Retry-After header), if it did.
+
+    Args:
+        exception (Exception): what the page load raised
+
+    Returns:
+        float: seconds to wait, 0 if the store didn't say
+    """
+
+    response = getattr(exception, "response", None)
+
+    try:
+        return float(response.headers.get("Retry-After", 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0
+
+def load_page(driver, url):
+    """Loads the URL in the driver once the store's circuit is closed and the rate limiters allow it. A page load that fails is retried up to
+    max_page_retries times with jittered backoff, and raises if it never works. All page loads should go through here.
+
+    Args:
+        driver (selenium driver or HttpPageClient): active selenium driver, or HTTP client when scrape_engine is "http"
+        url (string): URL to load
+    """
+
+    store = get_store_key(url)
+    store_rate_limiter = get_store_rate_limiter(store)
+
+    for attempt in range(max_page_retries + 1):
+        request_controller.wait_for_store(store)
+
+        with metrics.timer("rate_limit_wait"):
+            request_rate_limiter.wait()
+
+            if store_rate_limiter:
+                store_rate_limiter.wait()
+
+        # Drop whatever the previous page left in the performance log so we only pick up this page's search response
+        if parsing_engine == "json" and is_browser(driver):
+            driver.get_log("performance")
+
+        start_time = time.perf_counter()
+
+        try:
+            with metrics.timer("navigation"):
+                driver.get(url)
+        except (requests.RequestException, WebDriverException) as e:
+            throttled = is_throttled(e)
+            request_controller.record_failure(store, throttled, store_rate_limiter)
+
+            if attempt >= max_page_retries:
+                metrics.increment("failed_pages")
+                raise
+
+            metrics.increment("retries.throttled" if throttled else "retries.page_load")
+            backoff_seconds = max(request_controller_module.get_backoff_seconds(attempt, retry_backoff_seconds), get_retry_after_seconds(e))
+            print("Page load failed (" + str(e).strip().split("\n")[0] + "), retrying in " + "{:.1f}".format(backoff_seconds) + " seconds: " + url)
+            time.sleep(backoff_seconds)
+            continue
+
+        request_controller.record_success(store, time.perf_counter() - start_time, store_rate_limiter)
+        break
+
+    driver.requested_url = url
+
+    # So a driver pool can recycle drivers that have been around for a while, see DriverPool in tcg_player_service
+    driver.pages_loaded = getattr(driver, "pages_loaded", 0) + 1
+
+class HttpPageClient:
+    """Stand-in for the Selenium driver when scrape_engine is "http". Only does the parts of the driver the lxml parsing needs (get, page_source, current_url)
+    so the rest of the scraper doesn't care which one it has. Every client shares one pooled requests.Session, so connections are reused across workers."""
+
+    def __init__(self, session):
+        """
+        Args:
+            session (requests.Session): pooled session shared by all clients
+        """
+
+        self.session = session
+        self.page_source = ""
+        self.current_url = ""
+
+    def get(self, url):
+        """Fetches the URL and keeps the response body around as page_source, same as driver.get would.
+
+        Args:
+            url (string): URL to fetch
+        """
+
+        metrics.increment("http_requests")
+        response = self.session.get(url, timeout = page_load_timeout)
+        response.raise_for_status()
+
+        self.page_source = response.text
+        self.current_url = response.url
+
+    def quit(self):
+        """Nothing to shut down per client, the session is shared. Here so the client can be quit like a driver."""
+
+        pass
+
+class ReplayPageClient(HttpPageClient):
+    """Stand-in for the Selenium driver when scrape_engine is "replay". Pages come out of the page cache instead of the store, so a store that was
+    already scraped can be parsed, matched and exported again (i.e. after a selector fix) with no browser and no network at all."""
+
+    def __init__(self, cache):
+        """
+        Args:
+            cache (PageCache): page cache the store was scraped into
+        """
+
+        super().__init__(None)
+        self.cache = cache
+
+    def get(self, url):
+        """Loads the cached copy of the URL as page_source. A page that isn't cached comes back empty, same as a page with no results.
+
+        Args:
+            url (string): URL to load
+        """
+
+        page_source = self.cache.get(url)
+        if page_source is None:
+            metrics.increment("page_cache.misses")
+            print("Not in the page cache: " + url)
+
+        self.page_source = page_source or ""
+        self.current_url = url
+
+def setup_http_session():
+    """Sets up the shared requests.Session used by the http scrape engine, with a connection pool big enough for every worker to have a request in flight.
+
+    Returns:
+        requests.Session: pooled session
+    """
+
+    global http_session
+
+    if http_session is None:
+        http_session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections = 4, pool_maxsize = max(pool_size, 10))
+        http_session.mount("http://", adapter)
+        http_session.mount("https://", adapter)
+        http_session.headers.update({"User-Agent": http_user_agent, "Accept": "text/html,application/xhtml+xml"})
+
+    return http_session
+
+def get_page_source(driver):
+    """Returns the HTML of the page loaded in the driver, saving it to the page cache if there is one.
+
+    Args:
+        driver (selenium driver or HttpPageClient): driver with a page loaded
+
+    Returns:
+        string: HTML of the page
+    """
+
+    page_source = driver.page_source
+
+    # Keyed by the URL that was asked for, since that's what a replay will ask for
+    if page_cache is not None and not isinstance(driver, ReplayPageClient):
+        page_cache.put(getattr(driver, "requested_url", None) or driver.current_url, page_source)
+
+    return page_source
+
+def is_browser(driver):
+    """Returns True if the driver is a real browser (Selenium), False if it's an HttpPageClient.
+
+    Args:
+        driver (selenium driver or HttpPageClient): driver to check
+
+    Returns:
+        bool: True if it's a browser
+    """
+
+    return not isinstance(driver, HttpPageClient)
+
+def parse_total_pages(page_source):
+    """Reads the number of pages from the last pagination button in the page source. Returns 1 if there's no pagination.
+
+    Args:
+        page_source (string): HTML of the list page
+
+    Returns:
+        int: total pages
+    """
+
+    try:
+        document = lxml.html.fromstring(page_source)
+        last_page = find_first(document, "//*[" + css_class_xpath("tcg-pagination") + "]//*[" + css_class_xpath("tcg-pagination__pages") + "]/*[" + css_class_xpath("tcg-standard-button--flat") + "][not(following-sibling::*)]")
+        if last_page is not None:
+            return int(get_element_text(last_page))
+    except Exception as e:
+        pass
+
+    return 1
+
+def parse_total_results(page_source):
+    """Reads the total number of results for the search out of the page source, i.e. "1,234 results".
+
+    Args:
+        page_source (string): HTML of the list page
+
+    Returns:
+        int: total results, or None if the page doesn't say
+    """
+
+    try:
+        document = lxml.html.fromstring(page_source)
+
+        # Look in the results header first, then anywhere on the page
+        candidates = document.xpath("//*[contains(@class, 'result') and contains(@class, 'count')]") + [document]
+        for candidate in candidates:
+            match = re.search(r"(\d[\d,]*)\s+results?\b", get_element_text(candidate), re.IGNORECASE)
+            if match:
+                return int(match.group(1).replace(",", ""))
+    except Exception as e:
+        pass
+
+    return None
+
+def get_total_results(driver):
+    """Returns the total number of results for the search currently loaded in the driver.
+
+    Args:
+        driver (selenium driver or HttpPageClient): driver with the first page loaded
+
+    Returns:
+        int: total results, or None if the page doesn't say
+    """
+
+    return parse_total_results(get_page_source(driver))
+
+def get_total_pages(driver):
+    """Returns the number of pages for the search currently loaded in the driver.
+
+    Args:
+        driver (selenium driver or HttpPageClient): driver with the first page loaded
+
+    Returns:
+        int: total pages
+    """
+
+    if parsing_engine != "webdriver" or not is_browser(driver):
+        return parse_total_pages(get_page_source(driver))
+
+    try:
+        last_page = driver.find_element(By.CSS_SELECTOR, ".tcg-pagination .tcg-pagination__pages .tcg-standard-button--flat:nth-last-child(1)")
+        total_pages = 1
+        if last_page:
+            total_pages = int(last_page.text)
+    except Exception as e:
+        total_pages = 1
+
+    return total_pages
+
+def normalize_query(query):
+    """Turns a query into a dictionary of search parameter -> list of values. A query can be a set name, a list of set names to search together
+    (see plan_set_queries) or already be a dictionary of filters, i.e. {"setName": ["Foundations"], "rarityName": ["Rare"]}.
+
+    Args:
+        query (string, list or dict): query
+
+    Returns:
+        dict: search parameter -> list of values
+    """
+
+    if not query:
+        return {}
+
+    if isinstance(query, dict):
+        return {key: (value if isinstance(value, list) else [value]) for key, value in query.items() if value}
+
+    if isinstance(query, list):
+        return {"setName": query}
+
+    return {"setName": [query]}
+
+def describe_query(query):
+    """Returns a readable label for a query, for printing.
+
+    Args:
+        query (string, list or dict): query
+
+    Returns:
+        string: label, i.e. "Foundations, Modern Horizons 3 / rarityName: Rare"
+    """
+
+    parts = []
+
+    for key, values in normalize_query(query).items():
+        if key == "setName":
+            parts.append(", ".join(values))
+        else:
+            parts.append(key + ": " + ", ".join(values))
+
+    return " / ".join(parts) if parts else "(all)"
+
+def build_search_url(store_front_url, query, page_number = None):
+    """Builds the list view search URL for M:TG products, optionally filtered by one or more sets (and other facets).
+
+    Args:
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+        query (string, list or dict): set name, list of set names to search together, or dictionary of filters (see normalize_query). Empty for no filter.
+        page_number (int): 1 based page number. None to leave it off.
+
+    Returns:
+        string: search URL
+    """
+
+    # We'll want to restrict to the product search, particularly only for MTG cards
+    # /search/products?q=&productLineName=Magic:+The+Gathering&pageSize=48
+    url = store_front_url + "search/products?q=&productLineName=Magic:+The+Gathering&pageSize=" + str(page_size) + "&view=list"
+
+    if page_number:
+        url = url + "&page=" + str(page_number)
+
+    filters = normalize_query(query)
+    if filters:
+        filter_qs = {key: set_name_separator.join(values) for key, values in filters.items()}
+        url = url + "&" + urllib.parse.urlencode(filter_qs)
+
+    return url
+
+def scrape_store_inventory(driver, store_front_url, set_name):
+    """Goes through the store and scrapes all of the MTG inventory via the list page since it gives us more data than the grid view. Returns a list of cards.
+    See scrape_query for how the pages are worked out.
+
+    Args:
+        driver (selenium driver or HttpPageClient): active selenium driver, or HTTP client when scrape_engine is "http"
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+        set_name (string, list or dict): name of the set from the Set Name filter, a list of set names to search together (see plan_set_queries), or a dictionary of filters (see normalize_query). Needed as TCGPlayer limits us to around 10k cards when going through pagination, so sets allow us to get under that.
+
+    Returns:
+        list: list of cards (CardRecord) with the following fields: "Name", "Treatment", "Name Without Treatment", "Set", "Rarity", "Quantity", "Condition/Language", "Price", "Image URL", "Product URL"
+    """
+
+    cards, fingerprint = scrape_query(driver, store_front_url, set_name)
+
+    return cards
+
+def get_query_fingerprint(total_results, first_page_cards):
+    """Fingerprints a query from its result total and a hash of its first page, so an incremental scrape can tell if it changed since the last run
+    without scraping the rest of it.
+
+    Args:
+        total_results (int): result total for the query, None if unknown
+        first_page_cards (list): cards on page 1 of the query
+
+    Returns:
+        string: fingerprint
+    """
+
+    first_page_hash = hashlib.sha1(json.dumps([list(card) for card in first_page_cards]).encode("utf-8")).hexdigest()
+
+    return str(total_results) + ":" + first_page_hash
+
+def scrape_query(driver, store_front_url, set_name, previous_fingerprint = None):
+    """Scrapes every page of a query. The pages to fetch are worked out from the result total on page 1. If the query has more results than TCGPlayer
+    will page through, it gets split up by another facet (see split_facets) and each piece is scraped instead. If the fingerprint of page 1 matches
+    previous_fingerprint, it stops there since nothing changed.
+
+    Args:
+        driver (selenium driver or HttpPageClient): active selenium driver, or HTTP client when scrape_engine is "http"
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+        set_name (string, list or dict): name of the set from the Set Name filter, a list of set names to search together (see plan_set_queries), or a dictionary of filters (see normalize_query).
+        previous_fingerprint (string): fingerprint of the query from the last run, if doing an incremental scrape
+
+    Returns:
+        tuple: (list of cards, or None if the fingerprint matched previous_fingerprint; fingerprint of the query)
+    """
+
+    query = normalize_query(set_name)
+
+    # Do an initial page load to get the result total
+    url = build_search_url(store_front_url, query, 1)
+    load_page(driver, url)
+
+    # The json engine already has page 1's cards and the result total from the search response, no need to touch the DOM
+    first_page_cards = None
+    first_page_source = None
+    total_results = None
+    if parsing_engine == "json" and is_browser(driver):
+        search_response = wait_for_search_response(driver)
+
+        if search_response is not None:
+            with metrics.timer("parse"):
+                first_page_cards = build_cards_from_search_response(search_response, store_front_url)
+            total_results = get_search_response_total_results(search_response)
+            save_rendered_page(driver)
+
+    if first_page_cards is None and parsing_engine == "webdriver" and is_browser(driver):
+        wait_for_page_ready(driver)
+        total_results = get_total_results(driver)
+
+        # Setting URL empty for page 1, since we're already on it. Save an unnecessary call.
+        first_page_cards = scrape_store_page_contents_list_view(driver, "")
+    elif first_page_cards is None:
+        if is_browser(driver):
+            wait_for_page_ready(driver)
+
+        # The result total and the cards both come out of the same copy of the page, so it's only fetched (and cached) once
+        with metrics.timer("page", url, get_store_key(url)) as timing:
+            with metrics.timer("navigation"):
+                first_page_source = get_page_source(driver)
+
+            with metrics.timer("parse"):
+                total_results = parse_total_results(first_page_source)
+                first_page_cards = parse_store_page_source_list_view(first_page_source, driver.current_url)
+
+            timing["cards"] = len(first_page_cards)
+
+        if not first_page_cards:
+            metrics.increment("empty_pages")
+
+    fingerprint = get_query_fingerprint(total_results, first_page_cards)
+    if previous_fingerprint is not None and fingerprint == previous_fingerprint:
+        return None, fingerprint
+
+    # Looks like TCGPlayer may limit how many pages with pageSize=48 somebody can go. Looks like the stopper is something like 208. Which is nearly 10k cards.
+    # Tried 36 as the number per page, and the top limit is around 277 pages which is also right near 10k cards. 
+    # Tried 24 as the number per page, and my hunch was it'd stop at double the 48 pageSize (416). And this was true, too. So, looks like TCGPlayer doesn't want you to go more
+    # than 10k products deep.
+    # So, that's why we're scraping by set, and splitting further when even that isn't enough
+    if total_results is not None and total_results > query_result_cap:
+        split_queries = split_query(driver, query)
+
+        if split_queries:
+            print("Query " + describe_query(query) + " has " + str(total_results) + " results, over the cap. Splitting it into " + str(len(split_queries)) + " queries.")
+
+            all_cards = []
+            for split in split_queries:
+                all_cards += scrape_store_inventory(driver, store_front_url, split)
+
+            return all_cards, fingerprint
+
+        print("Query " + describe_query(query) + " has " + str(total_results) + " results and can't be split any further. Only the first " + str(query_result_cap) + " will be scraped.")
+
+    if total_results is not None:
+        total_pages = min(-(-total_results // page_size), query_result_cap // page_size)
+    else:
+        # No result total on the page, fall back to the pagination buttons
+        total_pages = parse_total_pages(first_page_source) if first_page_source is not None else get_total_pages(driver)
+
+    all_cards = []
+    for page_number in range(total_pages):
+        if page_number == 0:
+            cards = first_page_cards
+        else:
+            paginated_url = build_search_url(store_front_url, query, page_number + 1)
+            cards = scrape_store_page_contents_list_view(driver, paginated_url)
+
+        # The result total says there's more, so an empty page is more likely one that didn't load right than the end of the query.
+        # Reload it, and if it's still empty, skip it rather than cutting the rest of the query off.
+        if len(cards) == 0 and total_results is not None:
+            cards = retry_empty_page(driver, build_search_url(store_front_url, query, page_number + 1))
+
+            if len(cards) == 0:
+                metrics.increment("empty_pages_skipped")
+                print("Page " + str(page_number + 1) + " of " + str(total_pages) + " for " + describe_query(query) + " is still empty, skipping it")
+                continue
+
+        # Might hit the end of the line of cards
+        if len(cards) == 0:
+            break
+
+        for card in cards:
+            all_cards.append(card)
+
+    record_query_report(query, total_results, all_cards, store_front_url)
+
+    return all_cards, fingerprint
+
+def retry_empty_page(driver, url):
+    """Reloads a page that came back empty, up to max_page_retries times with jittered backoff.
+
+    Args:
+        driver (selenium driver or HttpPageClient): active selenium driver, or HTTP client when scrape_engine is "http"
+        url (string): list page URL
+
+    Returns:
+        list: list of cards (CardRecord), empty if the page never had any
+    """
+
+    # A cached page is the same every time
+    if isinstance(driver, ReplayPageClient):
+        return []
+
+    for attempt in range(max_page_retries):
+        metrics.increment("retries.empty_page")
+        time.sleep(request_controller_module.get_backoff_seconds(attempt, retry_backoff_seconds))
+
+        cards = scrape_store_page_contents_list_view(driver, url)
+        if cards:
+            return cards
+
+    return []
+
+def split_query(driver, query):
+    """Splits a query that has too many results by the first facet in split_facets that it isn't already filtered on. Small facet values are
+    packed together the same way small sets are (see plan_facet_queries). Page 1 of the query needs to be loaded in the driver.
+
+    Args:
+        driver (selenium driver or HttpPageClient): driver with page 1 of the query loaded
+        query (dict): query to split (see normalize_query)
+
+    Returns:
+        list: list of queries, empty if there's nothing left to split by
+    """
+
+    for facet_title, facet_parameter in split_facets:
+        if facet_parameter in query:
+            continue
+
+        facet_counts = get_facet_counts(driver, facet_title)
+        if len(facet_counts) > 1:
+            return plan_facet_queries(facet_counts, facet_parameter, query)
+
+    return []
+
+def pop_query_reports(store_front_url):
+    """Takes a store's query reports out of query_reports, so something that keeps running (i.e. the service) doesn't keep every report it ever made.
+
+    Args:
+        store_front_url (string): base URL for the store
+
+    Returns:
+        list: the store's query reports
+    """
+
+    store = get_store_key(store_front_url)
+
+    with query_reports_lock:
+        store_reports = [report for report in query_reports if report["store"] == store]
+        query_reports[:] = [report for report in query_reports if report["store"] != store]
+
+    return store_reports
+
+def record_query_report(query, expected_results, cards, store_front_url = None):
+    """Keeps track of how many products a query was expected to have against how many were actually scraped, and prints it.
+
+    Args:
+        query (dict): query that was scraped
+        expected_results (int): result total from page 1, None if unknown
+        cards (list): cards scraped for the query (one per SKU)
+        store_front_url (string): base URL for the store the query was for
+    """
+
+    scraped_products = len(set(card[9] for card in cards))
+    report = {"query": describe_query(query), "expected": expected_results, "scraped": scraped_products, "store": get_store_key(store_front_url) if store_front_url else None}
+
+    with query_reports_lock:
+        query_reports.append(report)
+
+    if expected_results is not None and expected_results != scraped_products:
+        print("Query " + report["query"] + " expected " + str(expected_results) + " products, scraped " + str(scraped_products))
+
+def wait_for_page_ready(driver, timeout = None):
+    """Waits until the list page is actually ready instead of sleeping a fixed amount: results container and pagination (for a full page) have rendered
+    or the no results message is showing, and the number of results hasn't changed between two polls. Each poll is one script call.
+
+    Args:
+        driver (selenium driver): active selenium driver
+        timeout (float): seconds to wait. Defaults to page_ready_timeout.
+
+    Returns:
+        bool: True if the page is ready, False if it timed out (whatever has rendered can still be scraped)
+    """
+
+    if timeout is None:
+        timeout = page_ready_timeout
+
+    last_result_count = [-1]
+
+    def page_is_ready(driver):
+        results_present, no_results_present, pagination_present, result_count = driver.execute_script(
+            "return [!!document.querySelector('.search-results-list'), "
+            "!!document.querySelector('.search-results__no-results, .no-results'), "
+            "!!document.querySelector('.tcg-pagination'), "
+            "document.querySelectorAll('div.search-results-list__info').length];")
+
+        stable = result_count == last_result_count[0]
+        last_result_count[0] = result_count
+
+        if not stable:
+            return False
+
+        # An empty list only counts once the site says there's nothing, otherwise it's probably just still loading
+        if result_count == 0:
+            return no_results_present
+
+        # A short page is the only (or last) page, so there might not be any pagination to wait for
+        return results_present and (pagination_present or result_count < page_size)
+
+    try:
+        with metrics.timer("wait"):
+            WebDriverWait(driver, timeout, poll_frequency = page_ready_poll_frequency).until(page_is_ready)
+        return True
+    except TimeoutException:
+        metrics.increment("timeouts.page_ready")
+        print("Page not ready after " + str(timeout) + " seconds, scraping what's there: " + driver.current_url)
+        return False
+
+def scroll_to_bottom(driver, height_increment):
+    """Scrolls to the bottom of the page in increments. This is typically done in the case of lazy loading images so that the image URL can be retrieved or if a page is dynamically loading other content.
+
+    Args:
+        driver (selenium driver): active selenium driver
+        height_increment (int): height increment to scroll
+    """
+
+    with metrics.timer("scroll"):
+        scroll_height = driver.execute_script("return document.body.scrollHeight;")
+        increment = height_increment
+
+        for i in range(0, scroll_height, increment):
+            driver.execute_script(f"window.scrollTo(0, {i});")
+            time.sleep(0.10)
+
+def get_card_treatment(name):
+    """Returns the treatment with parenthesis removed. If more than one treatment, it'll be return comma delimited.
+
+    Args:
+        name (string): full name of the card including treatment. Example: Barrowgoyf (Extended Art) (Ripple Foil)
+
+    Returns:
+        string: treatment, comma delimited if more than one. If no treatment, returns empty string.
+    """
+
+    if name:
+        matches = re.findall(r'\((.*?)\)', name)
+
+        if matches:
+            return ",".join(matches)
+
+    return ""
+
+def remove_card_treatment_info(name):
+    """Removes the treatment from the card name.
+
+    Args:
+        name (string): full name of the card including treatment. Example: Barrowgoyf (Extended Art) (Ripple Foil)
+
+    Returns:
+        string: name of the card with the treatment removed.
+    """
+
+    if name:
+        return re.sub("[\(\[].*?[\)\]]", "", name)
+    
+    return name
+
+def build_card_row(name, set, rarity, quantity, condition_language, price, product_url):
+    """Builds a single card (one per SKU) from the text on the list page. Shared by the DOM parsing engines so they all produce identical cards.
+    The treatment is left for card_record.split_treatments to fill in for the whole page at once.
+
+    Args:
+        name (string): full name of the card including treatment. Example: Barrowgoyf (Extended Art) (Ripple Foil)
+        set (string): set name with "Set: " already stripped
+        rarity (string): rarity with "Rarity: " already stripped
+        quantity (string): quantity available with "of " already stripped
+        condition_language (string): condition and language of the SKU, i.e. Heavily Played Foil - English
+        price (string): price of the SKU, i.e. $1.23
+        product_url (string): product detail URL
+
+    Returns:
+        CardRecord: card, which reads like a row with the following fields: "Name", "Treatment", "Name Without Treatment", "Set", "Rarity", "Quantity", "Condition/Language", "Price", "Image URL", "Product URL"
+    """
+
+    return card_record.CardRecord(name, set, rarity, card_record.parse_quantity(quantity), condition_language, card_record.parse_price_cents(price), product_url)
+
+def css_class_xpath(class_name):
+    """Returns an XPath predicate matching elements that have the given CSS class, the same as a ".class_name" CSS selector would.
+
+    Args:
+        class_name (string): CSS class name, without the leading dot.
+
+    Returns:
+        string: XPath predicate (without the surrounding brackets)
+    """
+
+    return "contains(concat(' ', normalize-space(@class), ' '), ' " + class_name + " ')"
+
+def get_element_text(element):
+    """Returns the text of an lxml element with whitespace collapsed, which is how Selenium's .text reports rendered text.
+
+    Args:
+        element (lxml element): element to get the text of
+
+    Returns:
+        string: text of the element, or empty string if element is None.
+    """
+
+    if element is None:
+        return ""
+
+    return " ".join(element.text_content().split())
+
+def find_first(element, xpath):
+    """Returns the first lxml element matching the xpath, or None if nothing matched.
+
+    Args:
+        element (lxml element): element to search under
+        xpath (string): xpath to search with
+
+    Returns:
+        lxml element: first match or None
+    """
+
+    matches = element.xpath(xpath)
+
+    if matches:
+        return matches[0]
+
+    return None
+
+def parse_store_page_source_list_view(page_source, base_url):
+    """Parses the list view page source (HTML) in one go with lxml. Returns a list of cards.
+
+    Args:
+        page_source (string): HTML of the list page, typically driver.page_source
+        base_url (string): URL the page was loaded from, used to make product URLs absolute like Selenium's get_attribute("href") does.
+
+    Returns:
+        list: list of cards (CardRecord) with the following fields: "Name", "Treatment", "Name Without Treatment", "Set", "Rarity", "Quantity", "Condition/Language", "Price", "Image URL", "Product URL"
+    """
+
+    cards = []
+
+    if not page_source:
+        return cards
+
+    document = lxml.html.fromstring(page_source)
+    found_cards = document.xpath("//div[" + css_class_xpath("search-results-list__info") + "]")
+
+    for card in found_cards:
+        name = get_element_text(find_first(card, ".//*[" + css_class_xpath("search-results-list__name") + "]"))
+
+        # sometimes, no rarity (i.e. Secret Lair packs)
+        set = get_element_text(find_first(card, ".//*[" + css_class_xpath("search-results-list__set") + "]")).replace("Set: ", "")
+        rarity = get_element_text(find_first(card, ".//*[" + css_class_xpath("search-results-list__rarity") + "]")).replace("Rarity: ", "")
+
+        product_url = ""
+        details = find_first(card, ".//a[" + css_class_xpath("search-results-list__details") + "]")
+        if details is not None and details.get("href"):
+            product_url = urllib.parse.urljoin(base_url, details.get("href"))
+
+        # This has SKUs, so we'll go through each (i.e. multiple conditions) and add them as individual list items
+        card_skus = card.xpath(".//*[" + css_class_xpath("sku-list__list-item") + "]")
+        for sku in card_skus:
+            price = get_element_text(find_first(sku, ".//*[" + css_class_xpath("sku-list__price") + "]"))
+            condition_language = get_element_text(find_first(sku, ".//*[" + css_class_xpath("sku-list__condition") + "]"))
+            quantity = get_element_text(find_first(sku, ".//*[" + css_class_xpath("tcg-quantity-selector__max-available") + "]")).replace("of ", "")
+
+            cards.append(build_card_row(name, set, rarity, quantity, condition_language, price, product_url))
+
+    return card_record.split_treatments(cards)
+
+def get_first_value(data, keys, default = ""):
+    """Returns the value of the first key found in the dictionary. The search API isn't documented, so this lets us be a little forgiving on field names.
+
+    Args:
+        data (dict): dictionary to look in
+        keys (list): keys to try, in order
+        default (any): value to return if none of the keys are there
+
+    Returns:
+        any: first found value, or default
+    """
+
+    if isinstance(data, dict):
+        for key in keys:
+            if key in data and data[key] is not None:
+                return data[key]
+
+    return default
+
+def get_search_response_products(search_response):
+    """Returns the list of products from a captured search response. Handles the results being nested under a "data"/"results" wrapper.
+
+    Args:
+        search_response (dict): parsed search response JSON
+
+    Returns:
+        list: list of product dictionaries
+    """
+
+    products = get_first_value(search_response, ["products", "results", "items", "data"], [])
+
+    # Sometimes it's {"results": [{"results": [...], "totalResults": 123}]}
+    if isinstance(products, dict):
+        return get_search_response_products(products)
+
+    if products and isinstance(products[0], dict) and get_first_value(products[0], ["products", "results", "items"], None) is not None:
+        return get_search_response_products(products[0])
+
+    return products
+
+def get_search_response_total_results(search_response):
+    """Returns the result total from a captured search response.
+
+    Args:
+        search_response (dict): parsed search response JSON
+
+    Returns:
+        int: total results, or None if the response doesn't have one
+    """
+
+    wrapper = search_response
+    results = get_first_value(search_response, ["results", "data"], None)
+    if isinstance(results, dict):
+        wrapper = results
+    elif isinstance(results, list) and results and isinstance(results[0], dict) and "totalResults" in results[0]:
+        wrapper = results[0]
+
+    try:
+        return int(get_first_value(wrapper, ["totalResults", "totalCount", "total", "resultCount"], None))
+    except (TypeError, ValueError):
+        return None
+
+def is_search_response(search_response):
+    """Checks that a captured JSON response actually has search results in it (a list of products or a result total), so some other JSON from a
+    matching URL isn't taken for an empty page.
+
+    Args:
+        search_response (any): parsed JSON
+
+    Returns:
+        bool: True if it looks like a search response
+    """
+
+    if not isinstance(search_response, dict):
+        return False
+
+    products = get_search_response_products(search_response)
+    if isinstance(products, list) and products and isinstance(products[0], dict):
+        return True
+
+    return get_search_response_total_results(search_response) is not None
+
+def save_rendered_page(driver):
+    """Saves the rendered list page to the page cache, when there is one, for pages the json parsing engine read from the search response instead of
+    the DOM. Replay parses cached pages as HTML, so without this a json scrape couldn't be replayed. Only waits for the page to render when caching.
+
+    Args:
+        driver (selenium driver): active selenium driver with the list page loaded
+    """
+
+    if page_cache is None:
+        return
+
+    wait_for_page_ready(driver)
+    get_page_source(driver)
+
+def build_cards_from_search_response(search_response, store_front_url):
+    """Builds card rows straight from a captured search response. No DOM and no string stripping, the SKU price, quantity and condition come typed.
+
+    Args:
+        search_response (dict): parsed search response JSON
+        store_front_url (string): base URL for the store via TCGPlayer Pro, used to build product URLs when the response doesn't have one
+
+    Returns:
+        list: list of cards (CardRecord) with the following fields: "Name", "Treatment", "Name Without Treatment", "Set", "Rarity", "Quantity", "Condition/Language", "Price", "Image URL", "Product URL"
+    """
+
+    cards = []
+
+    for product in get_search_response_products(search_response):
+        name = get_first_value(product, ["name", "productName"])
+        set = get_first_value(product, ["setName", "groupName", "set"])
+        rarity = get_first_value(product, ["rarityName", "rarity"])
+        product_id = get_first_value(product, ["productId", "id"])
+
+        product_url = get_first_value(product, ["url", "productUrl"])
+        if product_url:
+            product_url = urllib.parse.urljoin(store_front_url, product_url)
+        elif product_id:
+            product_url = store_front_url + "catalog/product/" + str(product_id)
+
+        for sku in get_first_value(product, ["skus", "variants", "inventory"], []):
+            quantity = get_first_value(sku, ["quantity", "availableQuantity", "maxAvailable"], 0)
+            if not quantity:
+                continue
+
+            # Put it back together the way the list page shows it, i.e. Heavily Played Foil - English
+            condition_language = get_first_value(sku, ["conditionName", "condition"])
+            printing = get_first_value(sku, ["printingName", "printing"])
+            if printing and printing.lower() != "normal":
+                condition_language += " " + printing
+            language = get_first_value(sku, ["languageName", "language"])
+            if language:
+                condition_language += " - " + language
+
+            price_cents = int(round(float(get_first_value(sku, ["price", "currentPrice", "lowPrice"], 0)) * 100))
+
+            cards.append(card_record.CardRecord(name, set, rarity, int(quantity), condition_language, price_cents, product_url))
+
+    return card_record.split_treatments(cards)
+
+def wait_for_search_response(driver, timeout = None):
+    """Watches Chrome's performance log for the storefront's search response and returns its parsed JSON body. The body is only fetched once Chrome
+    says it finished loading (Network.loadingFinished), otherwise Network.getResponseBody can come back empty.
+
+    Args:
+        driver (selenium driver): active selenium driver set up with the performance log enabled (parsing_engine = "json")
+        timeout (float): seconds to wait. Defaults to search_response_timeout.
+
+    Returns:
+        dict: parsed search response, or None if none showed up in time
+    """
+
+    if timeout is None:
+        timeout = search_response_timeout
+
+    with metrics.timer("wait"):
+        search_response = read_search_response(driver, time.monotonic() + timeout)
+
+    if search_response is None:
+        metrics.increment("timeouts.search_response")
+
+    return search_response
+
+def read_search_response(driver, deadline):
+    """Reads Chrome's performance log until the search response shows up or the deadline passes. See wait_for_search_response.
+
+    Args:
+        driver (selenium driver): active selenium driver set up with the performance log enabled
+        deadline (float): time.monotonic() to give up at
+
+    Returns:
+        dict: parsed search response, or None if none showed up in time
+    """
+
+    pending_request_ids = set()
+
+    while time.monotonic() < deadline:
+        for entry in driver.get_log("performance"):
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+
+            params = message.get("params", {})
+
+            if message.get("method") == "Network.responseReceived":
+                response = params.get("response", {})
+                if "json" in response.get("mimeType", "") and search_response_url_pattern.search(response.get("url", "")):
+                    pending_request_ids.add(params.get("requestId"))
+
+            elif message.get("method") == "Network.loadingFinished" and params.get("requestId") in pending_request_ids:
+                try:
+                    body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": params["requestId"]})
+                    search_response = json.loads(body["body"])
+                except Exception as e:
+                    print("Could not read search response: " + str(e))
+                    continue
+
+                if is_search_response(search_response):
+                    return search_response
+
+        time.sleep(0.05)
+
+    return None
+
+def scrape_store_page_contents_list_view_elements(driver):
+    """Scrapes the current page in the driver element by element via WebDriver calls. Each find_element/.text is a round trip to chromedriver, so this is
+    much slower than parse_store_page_source_list_view, but it's kept around as a fallback (parsing_engine = "webdriver").
+
+    Args:
+        driver (selenium driver): active selenium driver
+
+    Returns:
+        list: list of cards (CardRecord) with the following fields: "Name", "Treatment", "Name Without Treatment", "Set", "Rarity", "Quantity", "Condition/Language", "Price", "Image URL", "Product URL"
+    """
+
+    cards = []
+    found_cards = driver.find_elements(By.CSS_SELECTOR, 'div.search-results-list__info')
+
+    for card in found_cards:
+        name = card.find_element(By.CSS_SELECTOR, ".search-results-list__name").text
+
+        # TODO: Make a basic name that doesn't have alternate print names so we can try and do a catchall. Need to find the right way to pattern match this.
+        set = ""
+
+        try:   
+            set_holder = card.find_element(By.CSS_SELECTOR, ".search-results-list__set")
+            if (set_holder):
+                set = set_holder.text.replace("Set: ", "")
+        except Exception as e:
+            set = ""
+         
+        rarity = ""
+
+        # sometimes, no rarity (i.e. Secret Lair packs)
+        try:
+            rarity_holder = card.find_element(By.CSS_SELECTOR, ".search-results-list__rarity")
+            if (rarity_holder):
+                rarity = rarity_holder.text.replace("Rarity: ", "")
+        except Exception as e:
+            rarity = ""
+        
+        product_url = card.find_element(By.CSS_SELECTOR, "a.search-results-list__details").get_attribute("href")
+
+        # This has SKUs, so we'll go through each (i.e. multiple conditions) and add them as individual list items
+        card_skus = card.find_elements(By.CSS_SELECTOR, ".sku-list__list-item")
+        for sku in card_skus:
+            price = sku.find_element(By.CSS_SELECTOR, ".sku-list__price").text
+            condition_language = sku.find_element(By.CSS_SELECTOR, ".sku-list__condition").text
+            quantity = sku.find_element(By.CSS_SELECTOR, ".tcg-quantity-selector__max-available").text.replace("of ", "")
+
+            cards.append(build_card_row(name, set, rarity, quantity, condition_language, price, product_url))
+
+    return card_record.split_treatments(cards)
+
+def scrape_store_page_contents_list_view(driver, url):
+    """Hits the URL (if supplied). If URL not supplied, will scrape current page. Returns a list of cards.
+
+    Args:
+        driver (selenium driver or HttpPageClient): active selenium driver, or HTTP client when scrape_engine is "http"
+        url (string): list page URL to scrape for, typically with the page number applied: https://nolandbeyond.tcgplayerpro.com/search/products?q=&productLineName=Magic:+The+Gathering&pageSize=48&view=list&page=1. If empty, will scrape current page in driver.
+
+    Returns:
+        list: list of cards (CardRecord) with the following fields: "Name", "Treatment", "Name Without Treatment", "Set", "Rarity", "Quantity", "Condition/Language", "Price", "Image URL", "Product URL"
+    """
+
+    # div.search-results-list__info
+    #   image:              div.search-results-list__image-container img
+    #   card info:          div.search-results-list__card-info
+    #       name:           .search-results-list__name
+    #       rarity:         .search-results-list__rarity (Strip out "Rarity: ")
+    #       set:            .search-results-list__set (Strip out "Set: )
+    #       URL:            a.search-results-list__details
+    #   SKUs:               div.search-results-list__skus
+    #       list item:      .sku-list__list-item
+    #           price:      .sku-list__price
+    #           condition:  .sku-list__condition (might also have language, i.e. Heavily Played Foil - English)
+    #           quantity:   .tcg-quantity-selector__max-available  (Strip "of ")
+    #       
+    with metrics.timer("page", url or driver.current_url, get_store_key(url or driver.current_url)) as timing:
+        cards = load_and_parse_list_page(driver, url)
+        timing["cards"] = len(cards)
+
+    if not cards:
+        metrics.increment("empty_pages")
+
+    return cards
+
+def load_and_parse_list_page(driver, url):
+    """Loads the URL (if supplied) and parses the list page with whichever parsing engine is set. See scrape_store_page_contents_list_view.
+
+    Args:
+        driver (selenium driver or HttpPageClient): active selenium driver, or HTTP client when scrape_engine is "http"
+        url (string): list page URL to scrape, empty to scrape the current page
+
+    Returns:
+        list: list of cards (CardRecord)
+    """
+
+    if url:
+        load_page(driver, url)
+
+    # No rendering or lazy loading without a browser, and the rate limiter already keeps us polite
+    if not is_browser(driver):
+        with metrics.timer("parse"):
+            return parse_store_page_source_list_view(get_page_source(driver), driver.current_url)
+
+    # No waiting for render or scrolling, just the search response. If it never shows up, fall back to the DOM like the lxml engine.
+    if parsing_engine == "json":
+        search_response = wait_for_search_response(driver)
+        if search_response is not None:
+            # store front URL is everything in front of search/products
+            with metrics.timer("parse"):
+                cards = build_cards_from_search_response(search_response, driver.current_url.split("search/")[0])
+
+            save_rendered_page(driver)
+            return cards
+
+    # Image URLs are built from the product id, so there's no need to scroll to trigger lazy loading. Pacing is up to the rate limiter in load_page.
+    wait_for_page_ready(driver)
+
+    if parsing_engine == "webdriver":
+        with metrics.timer("parse"):
+            return scrape_store_page_contents_list_view_elements(driver)
+
+    # One round trip for the whole page instead of one per field. Getting page_source is a round trip too, so it counts as navigation.
+    with metrics.timer("navigation"):
+        page_source = get_page_source(driver)
+
+    with metrics.timer("parse"):
+        return parse_store_page_source_list_view(page_source, driver.current_url)
+
+def load_desired_cards_from_file(file_location):
+    """Attempts to load the desired cards to search against store inventory from a txt file hat is space delimited. Format is: {qty} {name}. Reference example in desired_cards_example.txt.
+
+    Args:
+        file_location (string): file_location for wanted cards text file. 
+
+    Returns:
+        list: list of desired cards with quantity and name as fields.
+    """
+
+    desired_cards = []
+
+    if not file_location:
+        return desired_cards
+
+    try:
+        with open(file_location, "r") as f:
+            file_content = f.read()
+
+        if not file_content:
+            print("no data found in file " + file_location)
+            return desired_cards
+        
+        # format in file is {qty} {card name}
+        cards = file_content.splitlines()
+        for card in cards:
+            card_parts = card.split(None, 1)
+
+            desired_card = [card_parts[0], card_parts[1]]
+            desired_cards.append(desired_card)
+
+        return desired_cards
+
+    except Exception as e:
+        print(e)
+        return desired_cards
+
+def column(matrix, column_index):
+    """Returns the column from the matrix based on the supplied column_index
+
+    Args:
+        column_index (int): index (zero based) of the column to retrieve.
+
+    Returns:
+        list: rows for the given column index.
+    """
+
+    return [row[column_index] for row in matrix]
+
+def prepare_wanted_cards(wanted_cards):
+    """Splits the treatment off of each wanted card's name so it can be matched the same way the scraped cards are.
+
+    Args:
+        wanted_cards (list): list of wanted cards, [quantity, name]
+
+    Returns:
+        list: list of wanted cards as [quantity, name, name without treatment, treatment]
+    """
+
+    return [[wanted_card[0], wanted_card[1], remove_card_treatment_info(wanted_card[1]), get_card_treatment(wanted_card[1])] for wanted_card in wanted_cards]
+
+def write_inventory_changes(changes, file_location = None):
+    """Writes the changes from ScrapeCheckpoint.diff_against_previous_run to a CSV file.
+
+    Args:
+        changes (iterable): changes, with the fields in inventory_changes_header
+        file_location (string): CSV file to write. Defaults to inventory_changes_file_location.
+
+    Returns:
+        dict: number of changes by change type (Added, Removed, Repriced)
+    """
+
+    if file_location is None:
+        file_location = inventory_changes_file_location
+
+    change_counts = {"Added": 0, "Removed": 0, "Repriced": 0}
+    changes_sink = card_sinks.CsvCardSink(file_location, inventory_changes_header)
+
+    for change in changes:
+        changes_sink.write(change)
+        change_counts[change[0]] += 1
+
+    changes_sink.close()
+
+    return change_counts
+
+def write_fulfillment_plan(plan, wanted_cards, file_location = None):
+    """Writes a plan from fulfillment_optimizer.plan_cheapest_fulfillment to a CSV file. Typo matches say so in the Match column, so they can be checked
+    before buying. Whatever couldn't be filled is listed at the end with no store.
+
+    Args:
+        plan (dict): fulfillment plan
+        wanted_cards (list): list of wanted cards the plan was made for, [quantity, name]
+        file_location (string): CSV file to write. Defaults to fulfillment_plan_file_location.
+    """
+
+    if file_location is None:
+        file_location = fulfillment_plan_file_location
+
+    plan_sink = card_sinks.CsvCardSink(file_location, fulfillment_plan_header)
+
+    for wanted_index, store, card, quantity, match in plan["purchases"]:
+        plan_sink.write([store, wanted_cards[wanted_index][1], quantity, card.name, card.set, card.condition_language, card.price, "${:,.2f}".format(card.price_cents * quantity / 100), card.product_url, match])
+
+    for wanted_index, quantity in plan["missing"]:
+        plan_sink.write(["", wanted_cards[wanted_index][1], quantity, "Not available", "", "", "", "", "", ""])
+
+    plan_sink.close()
+
+def parse_facet_count(text):
+    """Parses the item count shown next to a facet value, i.e. "(1,234)" or "1234".
+
+    Args:
+        text (string): count text
+
+    Returns:
+        int: count, or None if there isn't one
+    """
+
+    match = re.search(r"\d[\d,]*", text or "")
+
+    if match:
+        return int(match.group(0).replace(",", ""))
+
+    return None
+
+def parse_facet_counts_from_panel(panel):
+    """Reads the values and their item counts out of an lxml filter accordion panel (i.e. "Set Name"). The value is the first div in the checkbox label, the count is the one after it.
+
+    Args:
+        panel (lxml element): the filter accordion panel
+
+    Returns:
+        list: list of [value, count] with count None if the facet didn't show one
+    """
+
+    facet_counts = []
+
+    for label in panel.xpath(".//*[" + css_class_xpath("tcg-input-checkbox__label-text") + "]"):
+        value = find_first(label, ".//div/*[1][self::div]")
+        if value is None:
+            continue
+
+        count = find_first(value, "following-sibling::div[1]")
+        facet_counts.append([get_element_text(value), parse_facet_count(get_element_text(count))])
+
+    return facet_counts
+
+def parse_facet_counts_from_page_source(page_source, facet_title):
+    """Reads the values and item counts out of the filter accordion panel with the given title in the page source.
+
+    Args:
+        page_source (string): HTML of the list page
+        facet_title (string): title of the panel, i.e. "Set Name" or "Rarity"
+
+    Returns:
+        list: list of [value, count]
+    """
+
+    facet_counts = []
+
+    try:
+        document = lxml.html.fromstring(page_source)
+        found_panels = document.xpath("//div[" + css_class_xpath("tcg-accordion-panel") + "]")
+
+        for found_panel in found_panels:
+            header_content = find_first(found_panel, ".//span[" + css_class_xpath("tcg-accordion-panel-header__content") + "]")
+
+            if header_content is not None and get_element_text(header_content).lower() == facet_title.lower():
+                facet_counts += parse_facet_counts_from_panel(found_panel)
+
+    except Exception as e:
+        print(e)
+
+    return facet_counts
+
+def get_facet_counts(driver, facet_title):
+    """Retrieves the values and item counts of a filter panel (i.e. "Set Name" or "Rarity") on the page currently loaded in the driver, expanding the panel if needed.
+
+    Args:
+        driver (selenium driver or HttpPageClient): active selenium driver, or HTTP client when scrape_engine is "http"
+        facet_title (string): title of the panel
+
+    Returns:
+        list: list of [value, count], count is None if the facet didn't show one
+    """
+
+    # Server rendered facet, nothing to expand or wait for
+    if not is_browser(driver):
+        return parse_facet_counts_from_page_source(get_page_source(driver), facet_title)
+
+    facet_counts = []
+
+    try:
+        WebDriverWait(driver, page_ready_timeout, poll_frequency = page_ready_poll_frequency).until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.tcg-accordion-panel")))
+    except TimeoutException:
+        print("No filter panels found on " + driver.current_url)
+
+    try:
+        found_panels = driver.find_elements(By.CSS_SELECTOR, 'div.tcg-accordion-panel')
+
+        for found_panel in found_panels:
+            header = found_panel.find_element(By.CSS_SELECTOR, "div.tcg-accordion-panel-header")
+            header_content = found_panel.find_element(By.CSS_SELECTOR, "span.tcg-accordion-panel-header__content")
+
+            if header_content and (header_content.text.lower() == facet_title.lower()):
+                # Check if already expanded
+                if "is-open" not in header.get_attribute("class"):
+                    # Expand to get the values
+                    action_chains = ActionChains(driver)
+                    action_chains.move_to_element(header_content).click().perform()
+
+                # The values render once the panel opens, so wait on them rather than guessing how long that takes
+                try:
+                    values = WebDriverWait(driver, page_ready_timeout, poll_frequency = page_ready_poll_frequency).until(
+                        lambda driver: found_panel.find_elements(By.CSS_SELECTOR, ".tcg-input-checkbox__label-text div > div:first-child"))
+                except TimeoutException:
+                    values = []
+
+                if not values:
+                    continue
+
+                if parsing_engine != "webdriver":
+                    # One round trip for the whole panel instead of two per value
+                    facet_counts += parse_facet_counts_from_panel(lxml.html.fromstring(found_panel.get_attribute("outerHTML")))
+                    continue
+
+                for value in values:
+                    try:
+                        count = parse_facet_count(value.find_element(By.XPATH, "following-sibling::div[1]").text)
+                    except Exception as e:
+                        count = None
+
+                    facet_counts.append([value.text, count])
+
+    except Exception as e:
+        print(e)
+
+    # With the panel open, so a replay can read the facet straight out of the HTML
+    if page_cache is not None and facet_counts:
+        get_page_source(driver)
+
+    return facet_counts
+
+def get_set_counts(driver, store_front_url):
+    """Retrieves a list of M:TG sets available from the given store_front_url along with how many items the Set Name facet says each one has.
+
+    Args:
+        driver (selenium driver or HttpPageClient): active selenium driver, or HTTP client when scrape_engine is "http"
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+
+    Returns:
+        list: list of [set name, count], count is None if the facet didn't show one
+    """
+
+    for attempt in range(max_page_retries + 1):
+        load_page(driver, build_search_url(store_front_url, ""))
+        set_counts = get_facet_counts(driver, "Set Name")
+
+        # No sets at all would make for an empty scrape, so it's worth a reload or two first
+        if set_counts or isinstance(driver, ReplayPageClient) or attempt >= max_page_retries:
+            return set_counts
+
+        metrics.increment("retries.empty_page")
+        time.sleep(request_controller_module.get_backoff_seconds(attempt, retry_backoff_seconds))
+
+def get_cached_set_counts(driver, store_front_url):
+    """Returns the set counts for the store (see get_set_counts), reusing ones looked up in the last set_counts_cache_seconds.
+
+    Args:
+        driver (selenium driver or HttpPageClient): active selenium driver, or HTTP client when scrape_engine is "http"
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+
+    Returns:
+        list: list of [set name, count]
+    """
+
+    with set_counts_cache_lock:
+        cached = set_counts_cache.get(store_front_url)
+
+    if cached and time.monotonic() - cached[0] < set_counts_cache_seconds:
+        metrics.increment("cache.set_counts_hits")
+        return cached[1]
+
+    with metrics.timer("get_sets", store_front_url, get_store_key(store_front_url)):
+        set_counts = get_set_counts(driver, store_front_url)
+
+    # No sets is more likely a bad page load than an empty store, so don't hang on to it
+    if set_counts_cache_seconds > 0 and set_counts:
+        with set_counts_cache_lock:
+            set_counts_cache[store_front_url] = (time.monotonic(), set_counts)
+
+    return set_counts
+
+def get_sets(driver, store_front_url):
+    """Retrieves a list of M:TG sets available from the given store_front_url.
+
+    Args:
+        driver (selenium driver or HttpPageClient): active selenium driver, or HTTP client when scrape_engine is "http"
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+
+    Returns:
+        list: list of set names
+    """
+
+    return column(get_set_counts(driver, store_front_url), 0)
+
+def plan_facet_queries(facet_counts, facet_parameter, base_query = None, max_results = None, previous_queries = None):
+    """Plans which facet values to search together. Values are bin packed (first fit, biggest first) into multi-value queries that stay under the result cap,
+    so a handful of 1 card sets cost one page load instead of one each. Values without a count, or too big to share, get queried on their own.
+
+    With previous_queries, the groups from the last plan are kept as they were wherever they still fit, and only values that are new (or whose group
+    no longer fits) get packed again, into groups of their own. Incremental scrapes fingerprint whole queries, so if one set's count changing could
+    reshuffle the bins, every query would look changed and the whole store would be scraped again.
+
+    Args:
+        facet_counts (list): list of [value, count], i.e. from get_facet_counts
+        facet_parameter (string): search parameter for the facet, i.e. "setName"
+        base_query (dict): filters every planned query should keep (see normalize_query). Defaults to none.
+        max_results (int): most items a single query can have. Defaults to query_result_cap.
+        previous_queries (list): queries planned last time, to keep the same groups. Defaults to none, which plans from scratch.
+
+    Returns:
+        list: list of queries (dictionaries of filters)
+    """
+
+    if max_results is None:
+        max_results = query_result_cap
+
+    base_query = normalize_query(base_query)
+    groups = []
+    bins = []
+
+    counts = dict((value, count) for value, count in facet_counts)
+    kept_values = set()
+
+    for previous_query in previous_queries or []:
+        previous_query = normalize_query(previous_query)
+        previous_base_query = dict((key, values) for key, values in previous_query.items() if key != facet_parameter)
+        values = [value for value in previous_query.get(facet_parameter, []) if value in counts and value not in kept_values]
+
+        if not values or previous_base_query != base_query:
+            continue
+
+        if len(values) == 1:
+            groups.append(values)
+        elif all(counts[value] is not None for value in values) and sum(counts[value] for value in values) <= max_results and len(values) <= max_sets_per_query:
+            groups.append(values)
+        else:
+            continue
+
+        kept_values.update(values)
+
+    remaining_facet_counts = [facet_count for facet_count in facet_counts if facet_count[0] not in kept_values]
+
+    for value, count in sorted(remaining_facet_counts, key = lambda facet_count: -1 if facet_count[1] is None else facet_count[1], reverse = True):
+        # Unknown or big enough to fill a query by itself
+        if count is None or count > max_results // 2:
+            groups.append([value])
+            continue
+
+        for bin in bins:
+            if bin["count"] + count <= max_results and len(bin["values"]) < max_sets_per_query:
+                bin["values"].append(value)
+                bin["count"] += count
+                break
+        else:
+            bins.append({"values": [value], "count": count})
+
+    for bin in bins:
+        groups.append(bin["values"])
+
+    queries = []
+    for group in groups:
+        query = dict(base_query)
+        query[facet_parameter] = group
+        queries.append(query)
+
+    return queries
+
+def plan_set_queries(set_counts, max_results = None, previous_queries = None):
+    """Plans which sets to search together, see plan_facet_queries.
+
+    Args:
+        set_counts (list): list of [set name, count] from get_set_counts
+        max_results (int): most items a single query can have. Defaults to query_result_cap.
+        previous_queries (list): queries planned by the last run, to keep the same groups of sets. Defaults to none, which plans from scratch.
+
+    Returns:
+        list: list of queries (dictionaries of filters)
+    """
+
+    return plan_facet_queries(set_counts, "setName", None, max_results, previous_queries)
+
+def setup_selenium_driver():
+    """Sets up the Selenium driver based on a variety of settings.
+    """
+
+    options = ChromeOptions()
+
+    # Does not like headless due to out of bounds, will need to look into this. Trying the headless=new flag for full featured Chrome, but new headless implementation
+    # Headless=new requires Chrome 109. Need to add the Chrome installation dependency.
+    if headless:
+        options.add_argument(headless)
+
+    options.add_argument('--start-maximized')
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+
+    # The json parsing engine reads the search responses back out of the performance (network) log
+    if parsing_engine == "json":
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    # Images off at the renderer too, so nothing is decoded even if a URL gets past the blocked list, and none of Chrome's own background traffic
+    if lean:
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_argument("--disable-remote-fonts")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-background-networking")
+        options.add_argument("--disable-component-update")
+        options.add_argument("--mute-audio")
+
+    # Counts every WebDriver command for the metrics
+    driver = scrape_metrics.instrument_driver(Chrome(options=options))
+
+    # Otherwise a page that never finishes loading hangs its worker forever
+    driver.set_page_load_timeout(page_load_timeout)
+
+    if lean:
+        block_unneeded_requests(driver)
+
+    return driver
+
+def get_lean_blocked_urls():
+    """Returns the URL patterns blocked in lean mode: every blocked extension (with or without a query string) and every blocked host.
+
+    Returns:
+        list: URL patterns, * being a wildcard
+    """
+
+    blocked_urls = []
+
+    for extension in lean_blocked_extensions:
+        blocked_urls.append("*." + extension)
+        blocked_urls.append("*." + extension + "?*")
+
+    return blocked_urls + lean_blocked_hosts
+
+def block_unneeded_requests(driver):
+    """Blocks the lean mode URL patterns in Chrome through DevTools, so they fail before a request is even made. The DOM is untouched, so every
+    parsing engine (and the readiness check) works the same.
+
+    Args:
+        driver (selenium driver): active selenium driver
+    """
 
-def get_store_info(store_key):
-    """Returns store info from the TCGPlayer API. This is no longer used by the script, but is here if for some reason you want to use it. You'll need an API key defined in a constants.py file. 
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": get_lean_blocked_urls()})
+    except Exception as e:
+        print("Could not block requests for lean mode: " + str(e))
 
-    Args:
-        store_key (string): store_key (from TCGPlayer) representing the store.
+def start_driver():
+    """Starts a brand new driver for whatever the scrape_engine calls for: a Selenium driver, an HttpPageClient on the shared pooled session, or a
+    ReplayPageClient on the page cache. Never goes through the driver_pool, it's what the pool starts its drivers with.
 
     Returns:
-        JSON: store info from the /stores/ endpoint.
+        selenium driver or HttpPageClient: driver to scrape with
     """
 
-    url = os.getenv("TCG_PLAYER_API_BASE_URL") + "/stores/" + store_key
-    
-    headers = {"accept": "application/json", "Authorization": "bearer " + os.getenv("TCG_PLAYER_API_KEY")}
-    
-    response = requests.get(url, headers=headers)
-
-    if (is_json(response.text)):
-        resp_json = json.loads(response.text)    
+    if scrape_engine == "replay":
+        return ReplayPageClient(page_cache)
 
-        if "results" in resp_json and len(resp_json["results"]) > 0:  
-            return resp_json["results"][0]
-    
-    return ""
+    if scrape_engine == "http":
+        return HttpPageClient(setup_http_session())
 
-def scrape_store_inventory(driver, store_front_url, set_name):
-    """Goes through the store and scrapes all of the MTG inventory via the list page since it gives us more data than the grid view. Returns a list of cards.
+    return setup_selenium_driver()
 
-    Args:
-        driver (selenium driver): active selenium driver
-        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
-        set_name (string): name of the set from the Set Name filter. Needed as TCGPlayer limits us to around 10k cards when going through pagination, so sets allow us to get under that.
+def setup_driver():
+    """Sets up a driver to scrape with, from the driver_pool when there is one, otherwise a new one from start_driver.
 
     Returns:
-        list: list of cards with the following fields: "Name", "Treatment", "Name Without Treatment", "Set", "Rarity", "Quantity", "Condition/Language", "Price", "Image URL", "Product URL"
+        selenium driver or HttpPageClient: driver to scrape with
     """
 
-    # We'll want to restrict to the product search, particularly only for MTG cards
-    # /search/products?q=&productLineName=Magic:+The+Gathering&pageSize=48
-    # Do an initial page load to get page count
-    url = store_front_url + "search/products?q=&productLineName=Magic:+The+Gathering&pageSize=48&view=list&page=1"
+    if driver_pool is not None:
+        return driver_pool.acquire()
 
-    if set_name:
-        set_qs = { "setName": set_name }
-        url = url + "&" + urllib.parse.urlencode(set_qs)
+    return start_driver()
 
-    # Get number of pages available, first
-    driver.get(url)
+def release_driver(driver):
+    """Done with a driver from setup_driver. Goes back to the driver_pool if there is one, otherwise it's quit.
 
-    # Waiting for web requests to finish. Yeah, better ways to do this. Sue me.
-    driver.implicitly_wait(sleep_time_between_pages)
+    Args:
+        driver (selenium driver or HttpPageClient): driver to release
+    """
 
-    try:
-        last_page = driver.find_element(By.CSS_SELECTOR, ".tcg-pagination .tcg-pagination__pages .tcg-standard-button--flat:nth-last-child(1)")
-        total_pages = 1
-        if last_page:
-            total_pages = int(last_page.text)
-    except Exception as e:
-        total_pages = 1
+    if driver_pool is not None:
+        driver_pool.release(driver)
+    else:
+        driver.quit()
 
-    # Looks like TCGPlayer may limit how many pages with pageSize=48 somebody can go. Looks like the stopper is something like 208. Which is nearly 10k cards.
-    # Tried 36 as the number per page, and the top limit is around 277 pages which is also right near 10k cards. 
-    # Tried 24 as the number per page, and my hunch was it'd stop at double the 48 pageSize (416). And this was true, too. So, looks like TCGPlayer doesn't want you to go more
-    # than 10k products deep.
-    # So, that's why we're scraping by set
+def scrape_sets_worker(driver, store_front_url, sets_queue, results, results_ready, checkpoint = None):
+    """Worker loop for the driver pool. Keeps pulling (index, set name) off of the shared queue and scrapes it with the same driver until the queue is empty,
+    so Chrome startup is paid once per worker instead of once per set.
 
-    all_cards = []
-    for page_number in range(total_pages):
-        if page_number == 0:
-            # Setting URL empty for page 1, since we're already on it. Save an unnecessary call.
-            cards = scrape_store_page_contents_list_view(driver, "")
-        else:
-            paginated_url = store_front_url + "search/products?q=&productLineName=Magic:+The+Gathering&pageSize=48&view=list&page=" + str(page_number+1)
+    Args:
+        driver (selenium driver or HttpPageClient): active driver owned by this worker
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+        sets_queue (queue): queue of (index, query) tuples, a query being a set name or anything else scrape_store_inventory takes
+        results (dict): set index -> list of cards, filled in by the worker
+        results_ready (threading.Condition): notified every time a set is added to results
+        checkpoint (ScrapeCheckpoint): optional checkpoint to skip already completed queries and commit newly completed ones to
+    """
 
-            if set_name:
-                set_qs = { "setName": set_name }
-                paginated_url = paginated_url + "&" + urllib.parse.urlencode(set_qs)
+    while True:
+        try:
+            index, set = sets_queue.get_nowait()
+        except queue.Empty:
+            return
 
-            cards = scrape_store_page_contents_list_view(driver, paginated_url)
+        set_label = describe_query(set)
+        cards = []
 
-        # Might hit the end of the line of cards
-        if len(cards) == 0:
-            break
+        # Whatever happens to the set, it gets a result, otherwise iter_sets_with_driver_pool would wait on it forever
+        try:
+            if checkpoint and checkpoint.is_query_completed(set):
+                cards = [card_record.CardRecord.from_row(row) for row in checkpoint.load_query_cards(set)]
+                print("Already scraped set " + set_label + ", loaded " + str(len(cards)) + " cards from checkpoint")
+                continue
 
-        for card in cards:
-            all_cards.append(card)
+            print("Scraping by set name: " + set_label)
 
-    return all_cards
+            previous_fingerprint = None
+            if checkpoint and incremental:
+                previous_fingerprint = checkpoint.get_previous_fingerprint(set)
 
-def scroll_to_bottom(driver, height_increment):
-    """Scrolls to the bottom of the page in increments. This is typically done in the case of lazy loading images so that the image URL can be retrieved or if a page is dynamically loading other content.
+            with metrics.timer("set", set_label, get_store_key(store_front_url)) as timing:
+                cards, fingerprint = scrape_query(driver, store_front_url, set, previous_fingerprint)
 
-    Args:
-        driver (selenium driver): active selenium driver
-        height_increment (int): height increment to scroll
-    """
+                if cards is None:
+                    metrics.increment("unchanged_sets")
+                    print("Set " + set_label + " hasn't changed since the last run, reusing its cards")
+                    cards = [card_record.CardRecord.from_row(row) for row in checkpoint.load_query_cards(set, checkpoint.previous_run_id)]
 
-    scroll_height = driver.execute_script("return document.body.scrollHeight;")
-    increment = height_increment
+                timing["cards"] = len(cards)
 
-    for i in range(0, scroll_height, increment):
-        driver.execute_script(f"window.scrollTo(0, {i});")
-        time.sleep(0.10)
+            if checkpoint:
+                with metrics.timer("checkpoint"):
+                    checkpoint.save_query_cards(set, cards, fingerprint)
 
-def get_card_treatment(name):
-    """Returns the treatment with parenthesis removed. If more than one treatment, it'll be return comma delimited.
+            print("Cards found in set " + set_label + ": " + str(len(cards)))
+        except Exception as e:
+            metrics.increment("failed_sets")
+            print("Failed scraping set " + set_label + ": " + str(e))
+            cards = []
+        finally:
+            with results_ready:
+                results[index] = cards
+                results_ready.notify_all()
+
+def iter_sets_with_driver_pool(store_front_url, sets, pool_size, driver = None, checkpoint = None):
+    """Scrapes the given sets with pool_size drivers working off of a shared queue, yielding cards as each set finishes. Cards come out in the same
+    order as sets no matter which worker finished first, and a set's cards are let go of as soon as they've been yielded.
 
     Args:
-        name (string): full name of the card including treatment. Example: Barrowgoyf (Extended Art) (Ripple Foil)
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+        sets (list): list of set names, or list of queries (see plan_set_queries)
+        pool_size (int): number of drivers to scrape with
+        driver (selenium driver): optional already running driver to use as one of the workers (i.e. the one get_sets used)
+        checkpoint (ScrapeCheckpoint): optional checkpoint to skip already completed queries and commit newly completed ones to
 
     Returns:
-        string: treatment, comma delimited if more than one. If no treatment, returns empty string.
+        generator: cards
     """
 
-    if name:
-        matches = re.findall(r'\((.*?)\)', name)
-
-        if matches:
-            return ",".join(matches)
+    sets_queue = queue.Queue()
+    for index, set in enumerate(sets):
+        sets_queue.put((index, set))
 
-    return ""
+    results = {}
+    results_ready = threading.Condition()
+    drivers = []
+    if driver:
+        drivers.append(driver)
+    workers = []
 
-def remove_card_treatment_info(name):
-    """Removes the treatment from the card name.
+    try:
+        # No point in starting more Chrome instances than there are sets
+        while len(drivers) < min(pool_size, len(sets)):
+            drivers.append(setup_driver())
+
+        for worker_driver in drivers:
+            worker = threading.Thread(target = scrape_metrics.profile_thread(scrape_sets_worker), args = (worker_driver, store_front_url, sets_queue, results, results_ready, checkpoint))
+            worker.start()
+            workers.append(worker)
+
+        for index in range(len(sets)):
+            with results_ready:
+                results_ready.wait_for(lambda: index in results)
+                cards = results.pop(index)
+
+            for card in cards:
+                yield card
+    finally:
+        # If whoever is reading stopped early, don't let the workers start on anything else
+        while True:
+            try:
+                sets_queue.get_nowait()
+            except queue.Empty:
+                break
+
+        for worker in workers:
+            worker.join()
+
+        for worker_driver in drivers:
+            release_driver(worker_driver)
+
+def scrape_sets_with_driver_pool(store_front_url, sets, pool_size, driver = None, checkpoint = None):
+    """Scrapes the given sets with pool_size drivers working off of a shared queue. Results are merged back in the same order as sets,
+    no matter which worker finished first. See iter_sets_with_driver_pool.
 
     Args:
-        name (string): full name of the card including treatment. Example: Barrowgoyf (Extended Art) (Ripple Foil)
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+        sets (list): list of set names, or list of queries (see plan_set_queries)
+        pool_size (int): number of drivers to scrape with
+        driver (selenium driver): optional already running driver to use as one of the workers (i.e. the one get_sets used)
+        checkpoint (ScrapeCheckpoint): optional checkpoint to skip already completed queries and commit newly completed ones to
 
     Returns:
-        string: name of the card with the treatment removed.
+        list: list of cards
     """
 
-    if name:
-        return re.sub("[\(\[].*?[\)\]]", "", name)
-    
-    return name
+    return list(iter_sets_with_driver_pool(store_front_url, sets, pool_size, driver, checkpoint))
 
-def scrape_store_page_contents_list_view(driver, url):
-    """Hits the URL (if supplied). If URL not supplied, will scrape current page. Returns a list of cards.
+def iter_store_cards(store_front_url, pool_size = 1, checkpoint = None):
+    """Scrapes the entire store for M:TG cards on a per set basis to avoid 10k card limit via pagination, yielding cards as they're scraped
+    instead of building up the whole inventory.
 
     Args:
-        driver (selenium driver): active selenium driver
-        url (string): list page URL to scrape for, typically with the page number applied: https://nolandbeyond.tcgplayerpro.com/search/products?q=&productLineName=Magic:+The+Gathering&pageSize=48&view=list&page=1. If empty, will scrape current page in driver.
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+        pool_size (int): number of Chrome drivers to scrape sets with at the same time. Defaults to 1.
+        checkpoint (ScrapeCheckpoint): optional checkpoint with a run already started. Completed queries are committed to it as they finish, and if the run
+            was resumed, its saved query plan is used and completed queries are loaded instead of scraped.
 
     Returns:
-        list: list of cards with the following fields: "Name", "Treatment", "Name Without Treatment", "Set", "Rarity", "Quantity", "Condition/Language", "Price", "Image URL", "Product URL"
+        generator: cards
     """
 
-    # div.search-results-list__info
-    #   image:              div.search-results-list__image-container img
-    #   card info:          div.search-results-list__card-info
-    #       name:           .search-results-list__name
-    #       rarity:         .search-results-list__rarity (Strip out "Rarity: ")
-    #       set:            .search-results-list__set (Strip out "Set: )
-    #       URL:            a.search-results-list__details
-    #   SKUs:               div.search-results-list__skus
-    #       list item:      .sku-list__list-item
-    #           price:      .sku-list__price
-    #           condition:  .sku-list__condition (might also have language, i.e. Heavily Played Foil - English)
-    #           quantity:   .tcg-quantity-selector__max-available  (Strip "of ")
-    #       
-    if url:
-        driver.get(url)
+    driver = setup_driver()
 
-    # this is only here so we don't go crazy with the web requests
-    time.sleep(sleep_time_between_pages)
+    # Until the driver is handed over to the pool (which releases it when it's done), it's ours to release if anything goes wrong
+    try:
+        sets = None
+        if checkpoint:
+            sets = checkpoint.get_query_plan()
 
-    scroll_to_bottom(driver, 800)
+        if sets is not None:
+            print("Resuming with the saved plan of " + str(len(sets)) + " queries")
+        else:
+            set_counts = get_cached_set_counts(driver, store_front_url)
+
+            if pack_small_sets:
+                # Incremental scrapes keep the last run's groups of sets, so their fingerprints can still match
+                previous_queries = None
+                if checkpoint and incremental and checkpoint.previous_run_id is not None:
+                    previous_queries = checkpoint.get_query_plan(checkpoint.previous_run_id)
+
+                sets = plan_set_queries(set_counts, None, previous_queries)
+                print("Sets: " + str(len(set_counts)) + ", queries after packing small sets: " + str(len(sets)))
+            else:
+                sets = [normalize_query(set_name) for set_name in column(set_counts, 0)]
+
+            if checkpoint:
+                checkpoint.save_query_plan(sets)
+    except BaseException:
+        release_driver(driver)
+        raise
+
+    # The driver that found the sets becomes the first worker in the pool
+    for card in iter_sets_with_driver_pool(store_front_url, sets, pool_size, driver, checkpoint):
+        yield card
+
+    if checkpoint:
+        unfinished_queries = [set for set in sets if not checkpoint.is_query_completed(set)]
+
+        if unfinished_queries:
+            print(str(len(unfinished_queries)) + " queries didn't finish. Run again with --resume to only scrape those.")
+        else:
+            checkpoint.finish_run()
 
-    cards = []
-    found_cards = driver.find_elements(By.CSS_SELECTOR, 'div.search-results-list__info')
+def scrape_store_by_sets(store_front_url, pool_size = 1, checkpoint = None):
+    """Scrapes the entire store for M:TG cards on a per set basis to avoid 10k card limit via pagination. See iter_store_cards.
 
-    for card in found_cards:
-        name = card.find_element(By.CSS_SELECTOR, ".search-results-list__name").text
-        name_without_treatment = remove_card_treatment_info(name)
-        treatment = get_card_treatment(name)
+    Args:
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+        pool_size (int): number of Chrome drivers to scrape sets with at the same time. Defaults to 1.
+        checkpoint (ScrapeCheckpoint): optional checkpoint with a run already started (see iter_store_cards)
 
-        # TODO: Make a basic name that doesn't have alternate print names so we can try and do a catchall. Need to find the right way to pattern match this.
-        set = ""
+    Returns:
+        list: list of cards
+    """
 
-        try:   
-            set_holder = card.find_element(By.CSS_SELECTOR, ".search-results-list__set")
-            if (set_holder):
-                set = set_holder.text.replace("Set: ", "")
-        except Exception as e:
-            set = ""
-         
-        rarity = ""
+    return list(iter_store_cards(store_front_url, pool_size, checkpoint))
 
-        # sometimes, no rarity (i.e. Secret Lair packs)
-        try:
-            rarity_holder = card.find_element(By.CSS_SELECTOR, ".search-results-list__rarity")
-            if (rarity_holder):
-                rarity = rarity_holder.text.replace("Rarity: ", "")
-        except Exception as e:
-            rarity = ""
-        
-        product_url = card.find_element(By.CSS_SELECTOR, "a.search-results-list__details").get_attribute("href")
+def setup_card_sinks(output_formats, wanted_cards, file_name = None, store_front_url = None):
+    """Sets up the sinks scraped cards get written to as they come in. The wanted cards matcher is always first, since the Excel sink needs its matches.
+
+    Args:
+        output_formats (list): any of available_output_formats
+        wanted_cards (list): list of wanted cards, [quantity, name]
+        file_name (string): file name (without extension) to write to. Defaults to output_file_name.
+        store_front_url (string): store being scraped, needed for the history output format
 
-        image_url = ""
+    Returns:
+        tuple: (list of sinks, the WantedCardsSink)
+    """
 
-        # for some reason, grabbing the SRC of the image on the list page is absurdly slow, so we are going to construct the URL based on card id found in product detail page
-        # format follows: https://tcgplayer-cdn.tcgplayer.com/product/{id}_200w.jpg
-        # example: https://tcgplayer-cdn.tcgplayer.com/product/282745_200w.jpg
-        if product_url:
-            parts = product_url.split("/")
-            card_id = parts[-1]
-            image_url = "https://tcgplayer-cdn.tcgplayer.com/product/" + card_id + "_200w.jpg"
+    if file_name is None:
+        file_name = output_file_name
 
-        # This has SKUs, so we'll go through each (i.e. multiple conditions) and add them as individual list items
-        card_skus = card.find_elements(By.CSS_SELECTOR, ".sku-list__list-item")
-        for sku in card_skus:
-            price = sku.find_element(By.CSS_SELECTOR, ".sku-list__price").text
-            condition_language = sku.find_element(By.CSS_SELECTOR, ".sku-list__condition").text
-            quantity = sku.find_element(By.CSS_SELECTOR, ".tcg-quantity-selector__max-available").text.replace("of ", "")
+    wanted_cards_sink = card_sinks.WantedCardsSink(prepare_wanted_cards(wanted_cards))
+    sinks = [wanted_cards_sink]
 
-            card = [name, treatment, name_without_treatment, set, rarity, quantity, condition_language, price, image_url, product_url]
-            cards.append(card)
+    for output_format in output_formats:
+        file_location = file_name + output_format_extensions.get(output_format, "")
 
-    return cards
+        if output_format == "excel":
+            sinks.append(card_sinks.ExcelCardSink(file_location, cards_header, wanted_card_matches_header, wanted_cards_sink))
+        elif output_format == "csv":
+            sinks.append(card_sinks.CsvCardSink(file_location, cards_header))
+        elif output_format == "jsonl":
+            sinks.append(card_sinks.JsonlCardSink(file_location, cards_header))
+        elif output_format == "sqlite":
+            sinks.append(card_sinks.SqliteCardSink(file_location, cards_header))
+        elif output_format in ["parquet", "arrow"]:
+            sinks.append(card_sinks.ArrowCardSink(file_location, output_format))
+        elif output_format == "history":
+            sinks.append(card_sinks.HistoryCardSink(history_database_location, store_front_url))
 
-def load_desired_cards_from_file(file_location):
-    """Attempts to load the desired cards to search against store inventory from a txt file hat is space delimited. Format is: {qty} {name}. Reference example in desired_cards_example.txt.
+    return sinks, wanted_cards_sink
+
+def write_cards_to_sinks(cards, sinks, store_front_url = None):
+    """Feeds every card to every sink as it arrives, then closes the sinks. Nothing holds on to the cards, so memory stays flat no matter how big the store is.
+    If the cards stop coming because something failed, sinks that can tell a partial inventory from a whole one (the ones with an abort) are aborted instead.
 
     Args:
-        file_location (string): file_location for wanted cards text file. 
+        cards (iterable): cards, i.e. from iter_store_cards
+        sinks (list): sinks from setup_card_sinks
+        store_front_url (string): base URL for the store the cards are from, for the metrics
 
     Returns:
-        list: list of desired cards with quantity and name as fields.
+        int: number of cards written
     """
 
-    desired_cards = []
-
-    if not file_location:
-        return desired_cards
+    total_cards = 0
+    # Timed per sink but only recorded at the end, one card at a time is too fine grained for the metrics lock
+    sink_seconds = [0.0 for sink in sinks]
+    perf_counter = time.perf_counter
+    completed = False
 
     try:
-        with open(file_location, "r") as f:
-            file_content = f.read()
-
-        if not file_content:
-            print("no data found in file " + file_location)
-            return desired_cards
-        
-        # format in file is {qty} {card name}
-        cards = file_content.splitlines()
         for card in cards:
-            card_parts = card.split(None, 1)
-
-            desired_card = [card_parts[0], card_parts[1]]
-            desired_cards.append(desired_card)
-
-        return desired_cards
-
-    except Exception as e:
-        print(e)
-        return desired_cards
+            for sink_index, sink in enumerate(sinks):
+                start_time = perf_counter()
+                sink.write(card)
+                sink_seconds[sink_index] += perf_counter() - start_time
 
-def column(matrix, column_index):
-    """Returns the column from the matrix based on the supplied column_index
+            total_cards += 1
 
-    Args:
-        column_index (int): index (zero based) of the column to retrieve.
+        completed = True
+    finally:
+        for sink_index, sink in enumerate(sinks):
+            start_time = perf_counter()
+            if completed or not hasattr(sink, "abort"):
+                sink.close()
+            else:
+                sink.abort()
+            sink_seconds[sink_index] += perf_counter() - start_time
 
-    Returns:
-        list: rows for the given column index.
-    """
+            # Matching the wanted cards is its own stage, everything else is writing output
+            metrics.record("match" if isinstance(sink, card_sinks.WantedCardsSink) else "write", sink_seconds[sink_index], type(sink).__name__, total_cards,
+                get_store_key(store_front_url) if store_front_url else None)
 
-    return [row[column_index] for row in matrix]
+    return total_cards
 
-def find_wanted_cards_dataframe(store_card_inventory, wanted_cards):
-    """Returns a dataframe represented a filtered list of the supplied store_card_inventory list based on the wanted_cards name.
+def get_store_label(store_front_url):
+    """Returns a short label for a store to tell stores apart in file names and the fulfillment plan.
 
     Args:
-        store_card_inventory (list): list of store card inventory to search wanted_cards against
-        wanted_cards (list): list of card names to search store_card_inventory against
+        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
 
     Returns:
-        dataframe: dataframe based on matched wanted_cards
+        string: label, i.e. nolandbeyond
     """
 
-    # let's use pandas to grab rows from scraped site so that all of the columns are visible so users can quickly see things like price, condition, etc. instead of just card name
-    wanted_card_names = column(wanted_cards, 1)
+    host = urllib.parse.urlparse(store_front_url).netloc or store_front_url
 
-    # Get dataframe to query against
-    cards_df = pd.DataFrame(data = store_card_inventory, columns = cards_header)
-    found_cards_df = cards_df[cards_df["Name"].isin(wanted_card_names)] 
+    # Store sub domain for TCGPlayer Pro stores, the whole host for anything else
+    if host.lower().endswith(".tcgplayerpro.com"):
+        host = host.split(".")[0]
 
-    return found_cards_df
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", host).strip("_")
 
-def write_to_excel(store_card_inventory, wanted_cards, found_cards_df):
-    """Writes the store_card_inventory list, wanted_cards list, and found_cards_df dataframe to an Excel file called tcg_player_inventory_for_Store.xlsx
+def get_output_file_name(file_name, store_front_url):
+    """Fills in the placeholders in an output file name: {store} with the store (see get_store_label), {date} and {time} with when it's called.
+    Makes sure the folder it's in exists.
 
     Args:
-        store_card_inventory (list): scraped store_card_inventory list
-        wanted_cards (list): list of wanted cards
-        found_cards_df (dataframe): data frame of found cards, most likely from find_wanted_cards_dataframe
+        file_name (string): path without extension, i.e. exports/{store}_{date}
+        store_front_url (string): base URL for the store via TCGPlayer Pro
+
+    Returns:
+        string: path without extension, i.e. exports/nolandbeyond_2024-08-01
     """
 
-    cards_df = pd.DataFrame(data = store_card_inventory, columns = cards_header)
-    wanted_cards_df = pd.DataFrame(data = wanted_cards, columns = wanted_cards_header)
- 
-    writer = pd.ExcelWriter("tcg_player_inventory_for_store.xlsx", engine = "xlsxwriter", engine_kwargs={"options": {"strings_to_urls": False}})
+    now = time.localtime()
+    file_name = file_name.replace("{store}", get_store_label(store_front_url)).replace("{date}", time.strftime("%Y-%m-%d", now)).replace("{time}", time.strftime("%H%M%S", now))
 
-    cards_df.to_excel(writer, index=False, sheet_name = "Store Inventory")
-    wanted_cards_df.to_excel(writer, index=False, sheet_name = "Wanted Cards")
-    found_cards_df.to_excel(writer, index=False, sheet_name = "Found Cards")
-    
-    writer.close()
+    if os.path.dirname(file_name):
+        os.makedirs(os.path.dirname(file_name), exist_ok = True)
 
-def get_sets(driver, store_front_url):
-    """Retrieves a list of M:TG sets available from the given store_front_url.
+    return file_name
+
+def scrape_store(store_front_url, desired_cards, resume = False, file_name_suffix = "", file_name = None, formats = None):
+    """Scrapes a store into the output files, matching the wanted cards as it goes, and writes the inventory changes if doing an incremental scrape.
 
     Args:
-        driver (selenium driver): active selenium driver
         store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+        desired_cards (list): list of wanted cards, [quantity, name]
+        resume (bool): True to continue the last unfinished run for the store
+        file_name_suffix (string): added to the output file names, so stores scraped together don't write over each other
+        file_name (string): file name (without extension) to write to, see get_output_file_name. Defaults to output_file_name.
+        formats (list): output formats to write. Defaults to output_formats.
 
     Returns:
-        list: list of set names
+        tuple: (number of cards scraped, the WantedCardsSink with the store's wanted card matches)
     """
 
-    url = store_front_url + "search/products?q=&productLineName=Magic:+The+Gathering&pageSize=48&view=list"
-    sets = []
+    checkpoint = scrape_checkpoint.ScrapeCheckpoint(checkpoint_database_location)
 
-    driver.get(url)
+    # Closed however the scrape goes, a store that failed shouldn't leave its connection to the shared checkpoint database open
+    try:
+        if checkpoint.start_run(store_front_url, resume):
+            print("Resuming the last unfinished run for " + store_front_url)
 
-    time.sleep(sleep_time_between_pages)
+        # Cards get matched and written as they're scraped rather than being collected first
+        sinks, wanted_cards_sink = setup_card_sinks(formats or output_formats, desired_cards, get_output_file_name(file_name or output_file_name, store_front_url) + file_name_suffix, store_front_url)
+        total_cards_scraped = write_cards_to_sinks(iter_store_cards(store_front_url, pool_size, checkpoint), sinks, store_front_url)
 
-    try:
-        found_panels = driver.find_elements(By.CSS_SELECTOR, 'div.tcg-accordion-panel')
+        fulfilled_wanted_cards = [wanted_card_match for wanted_card_match in wanted_cards_sink.wanted_card_matches if wanted_card_match[4]]
+        print("Wanted cards found: " + str(len(wanted_cards_sink.found_cards)) + ", wanted cards with enough quantity available: " + str(len(fulfilled_wanted_cards)) + " of " + str(len(desired_cards)))
 
-        for found_panel in found_panels:
-            header = found_panel.find_element(By.CSS_SELECTOR, "div.tcg-accordion-panel-header")
-            header_content = found_panel.find_element(By.CSS_SELECTOR, "span.tcg-accordion-panel-header__content")
+        # Typo matches are a best guess, so call them out instead of letting them pass for the card that was asked for
+        for wanted_card_match in wanted_cards_sink.wanted_card_matches:
+            if wanted_card_match[5] == "fuzzy":
+                print("Wanted card " + wanted_card_match[1] + " has no exact match, closest name is " + wanted_card_match[2] + " (fuzzy match, check it's the right card)")
 
-            if header_content and (header_content.text.lower() == "set name"):
-                # Check if already expanded
-                if "is-open" not in header.get_attribute("class"):
-                    # Expand to get sets
-                    action_chains = ActionChains(driver)
-                    action_chains.move_to_element(header_content).click().perform()
+        if incremental and checkpoint.previous_run_id is not None:
+            changes_file_location, changes_file_extension = os.path.splitext(inventory_changes_file_location)
+            change_counts = write_inventory_changes(checkpoint.diff_against_previous_run(), changes_file_location + file_name_suffix + changes_file_extension)
 
-                set_names = found_panel.find_elements(By.CSS_SELECTOR, ".tcg-input-checkbox__label-text div > div:first-child")
-                if set_names:
-                    for set_name in set_names:
-                        sets.append(set_name.text)
+            for change_type, change_count in change_counts.items():
+                print("SKUs " + change_type.lower() + " since last run: " + str(change_count))
 
-    except Exception as e:
-        print(e)
-    
-    return sets
+        return total_cards_scraped, wanted_cards_sink
+    finally:
+        checkpoint.close()
 
-def setup_selenium_driver():
-    """Sets up the Selenium driver based on a variety of settings.
+def scrape_stores(store_front_urls, desired_cards, resume = False):
+    """Scrapes several stores at the same time, one thread per store (each with its own pool_size drivers), into output files per store. Every store
+    shares the same rate limiter, so this is still polite about requests per second overall.
+
+    Args:
+        store_front_urls (list): base URLs for the stores via TCGPlayer Pro
+        desired_cards (list): list of wanted cards, [quantity, name]
+        resume (bool): True to continue the last unfinished run for each store
+
+    Returns:
+        dict: store label -> (number of cards scraped, WantedCardsSink). Stores that failed aren't in it.
     """
 
-    options = ChromeOptions()
+    store_results = {}
+    store_results_lock = threading.Lock()
 
-    # Does not like headless due to out of bounds, will need to look into this. Trying the headless=new flag for full featured Chrome, but new headless implementation
-    # Headless=new requires Chrome 109. Need to add the Chrome installation dependency.
-    if headless:
-        options.add_argument(headless)
+    def scrape_store_worker(store_front_url):
+        store_label = get_store_label(store_front_url)
 
-    options.add_argument('--start-maximized')
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    
-    driver = Chrome(options=options)
+        try:
+            # Stores need their own files, unless the output file name already has the store in it
+            store_result = scrape_store(store_front_url, desired_cards, resume, "" if "{store}" in output_file_name else "_" + store_label)
+        except Exception as e:
+            print("Failed scraping store " + store_front_url + ": " + str(e))
+            return
 
-    return driver
+        with store_results_lock:
+            store_results[store_label] = store_result
 
-def scrape_store_by_sets(store_front_url):
-    """Scrapes the entire store for M:TG cards on a per set basis to avoid 10k card limit via pagination.
+    workers = []
+    for store_front_url in store_front_urls:
+        worker = threading.Thread(target = scrape_metrics.profile_thread(scrape_store_worker), args = (store_front_url,))
+        worker.start()
+        workers.append(worker)
 
-    Args:
-        store_front_url (string): base URL for the store via TCGPlayer Pro, example: https://nolandbeyond.tcgplayerpro.com/
+    for worker in workers:
+        worker.join()
 
-    Returns:
-        list: list of cards
-    """
+    return store_results
 
-    driver = setup_selenium_driver()
+def print_fulfillment_plan(plan):
+    """Prints what a fulfillment plan costs, overall and per store.
 
-    sets = get_sets(driver, store_front_url)
-    store_card_inventory = []
+    Args:
+        plan (dict): plan from fulfillment_optimizer.plan_cheapest_fulfillment
+    """
 
-    if sets:
-        for set in sets:
-            store_card_set_inventory = []
-            print("Scraping by set name: " + set)
-            store_card_set_inventory += scrape_store_inventory(driver, store_front_url, set)
-            print("Cards found in set: " + str(len(store_card_set_inventory)))
+    store_costs = {}
+    for wanted_index, store, card, quantity, match in plan["purchases"]:
+        store_costs[store] = store_costs.get(store, 0) + card.price_cents * quantity
 
-            store_card_inventory += store_card_set_inventory
+    for store in plan["stores"]:
+        print("Buy from " + store + ": " + "${:,.2f}".format(store_costs.get(store, 0) / 100))
 
-    return store_card_inventory
+    print("Cheapest fulfillment: " + "${:,.2f}".format(plan["card_cost"] / 100) + " in cards across " + str(len(plan["stores"])) + " stores, " + "${:,.2f}".format(plan["total_cost"] / 100) + " with trip penalties")
+    print("Wanted cards that couldn't be filled: " + str(len(plan["missing"])))
 
 def main(argv):
+    global headless, parsing_engine, scrape_engine, pool_size, requests_per_second, request_burst, pack_small_sets, checkpoint_database_location, incremental, output_formats, trip_penalty_cents, metrics_file_location, metrics_format, lean, page_cache_location, page_load_timeout, max_page_retries, adaptive_rate, max_requests_per_second, page_cache_max_bytes, page_cache_max_age_seconds, page_cache, history_database_location, output_file_name, store_directory_cache_location, store_directory_cache_seconds
+
     # defaults
-    store_name = ""
-    store_url = ""
+    store_names = []
+    store_urls = []
     want_file_location = ""
+    resume = False
+    profile = False
 
     try:
-        opts, args = getopt.getopt(argv,"s:u:w:h",["store-name=","store-url=","want-file-location=","headless-flag="])
+        opts, args = getopt.getopt(argv,"s:u:w:h",["store-name=","store-url=","want-file-location=","headless-flag=","parsing-engine=","scrape-engine=","pool-size=","requests-per-second=","request-burst=","no-set-packing","resume","checkpoint-database=","incremental","output-formats=","trip-penalty=","metrics-file=","metrics-format=","profile","lean","page-cache=","page-cache-max-mb=","page-cache-max-days=","page-load-timeout=","max-page-retries=","adaptive-rate","max-requests-per-second=","history-database=","output=","store-directory-cache=","store-directory-cache-hours="])
     except getopt.GetoptError:
-        print('tcg_player_searcher.py -s <store-name> -u <store-url> -w <want-file-location> -h <headless-flag>')
-        print("store-url is the TCGPlayer Pro store URL. If provided, store-name will be bypassed and the store URL will be directly used and no API calls will be made to find store information.")
-        print("store-name is the official TCG Player store name to look for")
+        print('tcg_player_searcher.py -s <store-name> -u <store-url> -w <want-file-location> -h <headless-flag> --parsing-engine <parsing-engine> --scrape-engine <scrape-engine> --pool-size <pool-size> --requests-per-second <requests-per-second> --request-burst <request-burst> --no-set-packing --resume --checkpoint-database <checkpoint-database> --incremental --output-formats <output-formats> --trip-penalty <trip-penalty> --metrics-file <metrics-file> --metrics-format <metrics-format> --profile --lean --page-cache <page-cache> --page-cache-max-mb <page-cache-max-mb> --page-cache-max-days <page-cache-max-days> --page-load-timeout <page-load-timeout> --max-page-retries <max-page-retries> --adaptive-rate --max-requests-per-second <max-requests-per-second> --history-database <history-database> --output <output> --store-directory-cache <store-directory-cache> --store-directory-cache-hours <store-directory-cache-hours>')
+        print("store-url is the TCGPlayer Pro store URL. If provided, store-name will be bypassed and the store URL will be directly used and no API calls will be made to find store information. More than one store can be given (comma separated, or -u more than once) to scrape them at the same time and work out the cheapest way to fill the want list across them.")
+        print("store-name is the official TCG Player store name to look for. More than one can be given (comma separated, or -s more than once), they're all looked up at the same time")
         print("want-file-location is the file location for a list of card names (in a text file) that you're looking to find for the store")
         print("headless-flag is the Selenium/Chrome flag to run headless. Values can be: empty (won't run headless), --headless (old headless for Chrome < v109), and --headless=new for full Chrome but headless (Chrome >= v109)")
+        print("parsing-engine is how list pages are read. Values can be: lxml (default, parses one page_source snapshot per page), webdriver (element by element, slower), and json (builds cards from the storefront's search API responses captured from Chrome, skipping the DOM)")
+        print("scrape-engine is what loads the pages. Values can be: selenium (default, drives Chrome), http (no browser, fetches the server rendered list pages over a pooled connection) and replay (no browser or network, reads the pages saved with page-cache)")
+        print("pool-size is the number of Chrome drivers scraping sets at the same time. Defaults to 1")
+        print("requests-per-second is the politeness limit on page loads across all drivers combined. Defaults to 1, 0 disables it")
+        print("request-burst is how many page loads can go out back to back before requests-per-second kicks in. Defaults to 1")
+        print("no-set-packing turns off searching small sets together, so every set gets its own query like it used to")
+        print("resume picks up the last unfinished run for the store from the checkpoint database, only scraping the sets that didn't finish")
+        print("checkpoint-database is the SQLite file every finished set is committed to as the scrape goes. Defaults to tcg_player_scrape_checkpoint.db")
+        print("incremental only rescrapes sets that changed since the last finished run for the store, reuses the rest, and writes the added, removed and repriced SKUs to tcg_player_inventory_changes.csv")
+        print("output-formats is a comma separated list of what to write the scraped cards to as they come in. Values can be: excel (default), csv, jsonl, sqlite, parquet, arrow (both need pyarrow) and history (adds the run to history-database)")
+        print("output is the path (without extension) to write the output files to. {store}, {date} and {time} get filled in, i.e. exports/{store}_{date}. Defaults to tcg_player_inventory_for_store")
+        print("history-database is where the history output format keeps every run's quantities and prices, see inventory_history.py. Defaults to tcg_player_inventory_history.db")
+        print("trip-penalty is what going to one more store is worth in dollars when working out the cheapest way to fill the want list across stores. Defaults to 0")
+        print("metrics-file is where to write the time spent per set, page and stage, WebDriver command counts and so on at the end of the run")
+        print("metrics-format is the format of the metrics file. Values can be: jsonl (default) and prometheus (text exposition format)")
+        print("profile runs the scrape under cProfile, prints the hot spots at the end and saves the profile to " + profile_file_location)
+        print("lean has Chrome skip images, fonts, media and analytics/tracking requests (blocked through DevTools), which the parsers don't need")
+        print("page-cache is a directory to save the raw list pages to as they're scraped, so they can be reparsed later with --scrape-engine replay (which reads from it, defaulting to tcg_player_page_cache)")
+        print("page-load-timeout is how many seconds a page load can take before it's retried. Defaults to 30")
+        print("max-page-retries is how many times a failed (or unexpectedly empty) page is retried, with jittered backoff, before giving up on it. Defaults to 3")
+        print("adaptive-rate has the rate go up while pages load fine (up to max-requests-per-second) and get halved when the store throttles, fails or slows down. requests-per-second is where it starts")
+        print("max-requests-per-second is the most adaptive-rate will go up to. Defaults to requests-per-second")
+        print("page-cache-max-mb and page-cache-max-days limit the page cache, the oldest pages are dropped at the end of a run. Default to 2048 and 30, 0 for no limit")
+        print("store-directory-cache is the SQLite file store names, keys and storefront URLs looked up through the TCGPlayer API are cached in. Defaults to " + store_directory_cache_location + ", empty for no cache")
+        print("store-directory-cache-hours is how long a cached store lookup is good for. Defaults to 24")
         sys.exit(2)
 
     for opt, arg in opts:
         if opt in ("-s", "--store-name"):
-            store_name = arg      
+            store_names += [name.strip() for name in arg.split(",") if name.strip()]
         if opt in ("-u", "--store-url"):
-            store_url = arg      
+            store_urls += [url.strip() for url in arg.split(",") if url.strip()]
         if opt in ("-w", "--want-file-location"):
             want_file_location = arg
         if opt in ("-h", "--headless-flag"):
             headless = arg   
+        if opt == "--parsing-engine":
+            parsing_engine = arg
+        if opt == "--scrape-engine":
+            scrape_engine = arg
+        if opt == "--pool-size":
+            pool_size = max(1, int(arg))
+        if opt == "--requests-per-second":
+            requests_per_second = float(arg)
+        if opt == "--request-burst":
+            request_burst = max(1, int(arg))
+        if opt == "--no-set-packing":
+            pack_small_sets = False
+        if opt == "--resume":
+            resume = True
+        if opt == "--checkpoint-database":
+            checkpoint_database_location = arg
+        if opt == "--incremental":
+            incremental = True
+        if opt == "--output-formats":
+            output_formats = [output_format.strip().lower() for output_format in arg.split(",") if output_format.strip()]
+        if opt == "--trip-penalty":
+            trip_penalty_cents = int(round(float(arg) * 100))
+        if opt == "--metrics-file":
+            metrics_file_location = arg
+        if opt == "--metrics-format":
+            metrics_format = arg
+        if opt == "--profile":
+            profile = True
+        if opt == "--lean":
+            lean = True
+        if opt == "--page-cache":
+            page_cache_location = arg
+        if opt == "--page-cache-max-mb":
+            page_cache_max_bytes = int(float(arg) * 1024 * 1024)
+        if opt == "--page-cache-max-days":
+            page_cache_max_age_seconds = float(arg) * 24 * 60 * 60
+        if opt == "--page-load-timeout":
+            page_load_timeout = float(arg)
+        if opt == "--max-page-retries":
+            max_page_retries = max(0, int(arg))
+        if opt == "--adaptive-rate":
+            adaptive_rate = True
+        if opt == "--max-requests-per-second":
+            max_requests_per_second = float(arg)
+        if opt == "--history-database":
+            history_database_location = arg
+        if opt == "--output":
+            output_file_location, output_file_extension = os.path.splitext(arg)
+            output_file_name = output_file_location if output_file_extension.lower() in output_format_extensions.values() else arg
+        if opt == "--store-directory-cache":
+            store_directory_cache_location = arg
+        if opt == "--store-directory-cache-hours":
+            store_directory_cache_seconds = float(arg) * 60 * 60
+
+    for output_format in output_formats:
+        if output_format not in available_output_formats:
+            print("Unknown output format " + output_format + ". Values can be: " + ", ".join(available_output_formats))
+            sys.exit(2)
+
+        if output_format in ["parquet", "arrow"] and card_sinks.pyarrow is None:
+            print("The " + output_format + " output format needs pyarrow. Install it with pip install pyarrow. Exiting.")
+            sys.exit(2)
+
+    if metrics_format not in metrics_formats:
+        print("Unknown metrics format " + metrics_format + ". Values can be: " + ", ".join(metrics_formats))
+        sys.exit(2)
+
+    if parsing_engine not in parsing_engines:
+        print("Unknown parsing engine " + parsing_engine + ". Values can be: " + ", ".join(parsing_engines))
+        sys.exit(2)
+
+    if scrape_engine not in scrape_engines:
+        print("Unknown scrape engine " + scrape_engine + ". Values can be: " + ", ".join(scrape_engines))
+        sys.exit(2)
+
+    if scrape_engine in ["http", "replay"] and parsing_engine != "lxml":
+        print("The " + parsing_engine + " parsing engine needs a browser, so it can't be used with the " + scrape_engine + " scrape engine. Exiting.")
+        sys.exit(2)
+
+    if scrape_engine == "replay":
+        # Nothing is loaded from the store, so there's nothing to be polite to
+        requests_per_second = 0
+        page_cache_location = page_cache_location or default_page_cache_location
+
+        if not os.path.isdir(page_cache_location):
+            print("No page cache at " + page_cache_location + " to replay. Scrape with --page-cache first. Exiting.")
+            sys.exit(2)
+
+    if page_cache_location:
+        page_cache = page_cache_module.PageCache(page_cache_location, page_cache_max_bytes, page_cache_max_age_seconds)
 
     # Store name is mandatory
-    if not store_name and not store_url:
+    if not store_names and not store_urls:
         print("Please provide store name or a store URL. Exiting.")
         sys.exit(2)
 
+    # With adaptive-rate, each store's own limiter does the speeding up and slowing down, this one just caps them all at the fastest they can go
+    request_rate_limiter.requests_per_second = max(requests_per_second, max_requests_per_second) if adaptive_rate and requests_per_second > 0 else requests_per_second
+    request_rate_limiter.burst = request_burst
+    request_rate_limiter.tokens = request_burst
+    request_controller.adaptive = adaptive_rate
+    request_controller.max_requests_per_second = max_requests_per_second
+
     load_dotenv()
 
+    # Store names are only looked up if there aren't any store URLs, all of them in one go
+    if store_names and not store_urls:
+        if not os.getenv("TCG_PLAYER_API_BASE_URL") or not os.getenv("TCG_PLAYER_API_KEY"):
+            print("Looking up a store by name needs TCG_PLAYER_API_BASE_URL and TCG_PLAYER_API_KEY (see .env). Exiting.")
+            sys.exit(2)
+
+        resolved_stores = get_store_directory().resolve_store_names(store_names)
+
+        for store_name in store_names:
+            if store_name in resolved_stores:
+                print("Store: " + store_name + ", store id: " + str(resolved_stores[store_name][0]) + ", store URL: " + resolved_stores[store_name][1])
+                store_urls.append(resolved_stores[store_name][1])
+            else:
+                print("No store (or store url) found for " + store_name)
+
+        if not store_urls:
+            print("No store found. Exiting.")
+            sys.exit(2)
+
     desired_cards = []
     if want_file_location:
         desired_cards = load_desired_cards_from_file(want_file_location)
 
+    if profile:
+        main_profile = scrape_metrics.start_profiling()
+
     start = time.time()
 
-    if store_name:
-        store_id = get_store_id(store_name)
+    if len(store_urls) > 1:
+        print("Store URLs: " + ", ".join(store_urls))
+        print("Total desired cards to search for: " + str(len(desired_cards)))
 
-        if not store_id:
-            print("No store found. Exiting.")
-            sys.exit(2)
+        store_results = scrape_stores(store_urls, desired_cards, resume)
+        total_cards_scraped = sum(store_result[0] for store_result in store_results.values())
 
-        store_front_url = get_store_info(store_id)["storefrontUrl"]
-        if not store_front_url:
-            print("No corresponding store url found. Exiting.")
-            sys.exit(2)
+        if desired_cards:
+            matched_cards_by_store = {}
+            for store_label, (store_cards_scraped, wanted_cards_sink) in store_results.items():
+                matched_cards_by_store[store_label] = [wanted_cards_sink.matcher.get_matched_cards(wanted_index) for wanted_index in range(len(desired_cards))]
 
-        print("Store: " + store_name)
-        print("Store id: " + store_id)
+            plan = fulfillment_optimizer.plan_cheapest_fulfillment(desired_cards, fulfillment_optimizer.get_offers(matched_cards_by_store), trip_penalty_cents)
+            write_fulfillment_plan(plan, desired_cards)
+            print_fulfillment_plan(plan)
     else:
-        store_front_url = store_url
-
-    print("Store URL: " + store_front_url)
-    print("Total desired cards to search for: " + str(len(desired_cards)))
+        store_front_url = store_urls[0]
 
-    store_card_inventory = scrape_store_by_sets(store_front_url)
-    found_cards_in_inventory_df = find_wanted_cards_dataframe(store_card_inventory, desired_cards)
+        print("Store URL: " + store_front_url)
+        print("Total desired cards to search for: " + str(len(desired_cards)))
 
-    write_to_excel(store_card_inventory, desired_cards, found_cards_in_inventory_df)
+        total_cards_scraped = scrape_store(store_front_url, desired_cards, resume)[0]
 
     end = time.time()
     elapsed_time = end - start
-    total_cards_scraped = len(store_card_inventory)
     cards_scraped_per_second = total_cards_scraped / elapsed_time
 
     print("Script run time: " + str(elapsed_time))
     print("Cards scraped: " + str(total_cards_scraped))
     print("Cards scraped per second: " + str(cards_scraped_per_second))
 
+    mismatched_reports = [report for report in query_reports if report["expected"] is not None and report["expected"] != report["scraped"]]
+    print("Queries run: " + str(len(query_reports)) + ", with expected vs scraped product count mismatches: " + str(len(mismatched_reports)))
+
+    metrics.print_summary()
+
+    if page_cache is not None:
+        # Evicted at the end, so a replay never loses pages partway through
+        page_cache.evict()
+        page_cache_stats = page_cache.get_stats()
+        page_cache.close()
+        print("Page cache: " + str(page_cache_stats["urls"]) + " pages, " + str(page_cache_stats["contents"]) + " distinct, " + str(page_cache_stats["bytes"] // 1024) + " KB compressed")
+
+    if metrics_file_location:
+        if metrics_format == "prometheus":
+            metrics.write_prometheus(metrics_file_location)
+        else:
+            metrics.write_jsonl(metrics_file_location)
+
+    if profile:
+        main_profile.disable()
+        scrape_metrics.write_profile(profile_file_location)
+
 if __name__ == "__main__":
     main(sys.argv[1:])
\ No newline at end of file
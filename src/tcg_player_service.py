@@ -0,0 +1,515 @@
+import time
+import json
+import getopt
+import sys
+import os
+import threading
+import queue
+import collections
+import urllib.parse
+import http.server
+import tcg_player_searcher
+import scrape_metrics
+import page_cache as page_cache_module
+from dotenv import load_dotenv
+
+# where the service listens for jobs. Local only, there's no auth.
+service_host = "127.0.0.1"
+service_port = 8765
+# jobs scraped at the same time. Each one uses pool_size drivers.
+job_concurrency = 1
+# drivers started up front so the first job doesn't pay for Chrome starting
+warm_drivers = 1
+# a driver that has loaded this many pages is quit instead of going back in the pool, so a long running Chrome can't keep growing
+recycle_after_pages = 500
+# most drivers kept sitting idle in the pool, anything past this is quit when it's released
+max_idle_drivers = 4
+# Set Name facet counts are reused for this long between jobs for the same store instead of being looked up every time
+set_counts_cache_seconds = 3600
+# default page loads per second per store, on top of the global requests_per_second. 0 for no per store limit.
+store_requests_per_second = 0
+# finished (or failed) jobs kept around for GET /jobs, the oldest ones past this are forgotten
+finished_jobs_kept = 1000
+
+class DriverPool:
+    """Pool of warm drivers shared by every job. Drivers are handed out by tcg_player_searcher.setup_driver and come back through release_driver,
+    so the scraper doesn't have to know it's running in the service. Shared between threads."""
+
+    def __init__(self, recycle_after_pages, max_idle_drivers):
+        """
+        Args:
+            recycle_after_pages (int): pages a driver can load before it's quit instead of reused
+            max_idle_drivers (int): most drivers to keep around idle
+        """
+
+        self.recycle_after_pages = recycle_after_pages
+        self.max_idle_drivers = max_idle_drivers
+        self.idle_drivers = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.started = 0
+        self.recycled = 0
+        self.in_use = 0
+
+    def start_driver(self):
+        """Starts a brand new driver.
+
+        Returns:
+            selenium driver or HttpPageClient: driver
+        """
+
+        with self.lock:
+            self.started += 1
+
+        # Not through setup_driver, that would just come back here
+        return tcg_player_searcher.start_driver()
+
+    def warm_up(self, count):
+        """Starts drivers ahead of time and puts them in the pool.
+
+        Args:
+            count (int): number of drivers to start
+        """
+
+        for index in range(count):
+            self.idle_drivers.put(self.start_driver())
+
+    def acquire(self):
+        """Hands out a driver, a warm one if there is one.
+
+        Returns:
+            selenium driver or HttpPageClient: driver
+        """
+
+        with self.lock:
+            self.in_use += 1
+
+        try:
+            # Most recently used first, it's the one most likely to still have the store's pages cached
+            return self.idle_drivers.get_nowait()
+        except queue.Empty:
+            pass
+
+        try:
+            return self.start_driver()
+        except BaseException:
+            # Never handed out, so it isn't in use
+            with self.lock:
+                self.in_use -= 1
+            raise
+
+    def release(self, driver):
+        """Takes a driver back. It's quit instead if it's loaded recycle_after_pages pages or the pool already has max_idle_drivers.
+
+        Args:
+            driver (selenium driver or HttpPageClient): driver from acquire
+        """
+
+        with self.lock:
+            self.in_use -= 1
+
+        if getattr(driver, "pages_loaded", 0) >= self.recycle_after_pages or self.idle_drivers.qsize() >= self.max_idle_drivers:
+            with self.lock:
+                self.recycled += 1
+
+            try:
+                driver.quit()
+            except Exception as e:
+                print("Could not quit driver: " + str(e))
+
+            return
+
+        self.idle_drivers.put(driver)
+
+    def close(self):
+        """Quits every idle driver."""
+
+        while True:
+            try:
+                self.idle_drivers.get_nowait().quit()
+            except queue.Empty:
+                return
+            except Exception as e:
+                print("Could not quit driver: " + str(e))
+
+    def get_status(self):
+        """Returns the pool's counts.
+
+        Returns:
+            dict: idle, in use, started and recycled driver counts
+        """
+
+        with self.lock:
+            return {"idle": self.idle_drivers.qsize(), "in_use": self.in_use, "started": self.started, "recycled": self.recycled}
+
+class JobScheduler:
+    """Queue of scrape jobs run by job_concurrency worker threads. The lowest priority number goes first (then first come first served), and two jobs
+    for the same store never run at the same time, since they'd share its checkpoint and rate limit."""
+
+    def __init__(self, job_concurrency, finished_jobs_kept = 1000):
+        """
+        Args:
+            job_concurrency (int): jobs to run at the same time
+            finished_jobs_kept (int): finished jobs to keep around, the oldest ones past this are forgotten. Defaults to 1000.
+        """
+
+        self.jobs = {}
+        self.next_job_id = 1
+        self.finished_jobs_kept = finished_jobs_kept
+        self.finished_job_ids = collections.deque()
+        self.pending_jobs = []
+        self.active_stores = set()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.workers = []
+
+        for index in range(job_concurrency):
+            worker = threading.Thread(target = self.run_jobs, daemon = True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, request):
+        """Queues up a job.
+
+        Args:
+            request (dict): job request, see parse_job_request
+
+        Returns:
+            dict: the job
+        """
+
+        with self.condition:
+            job = dict(request, id = self.next_job_id, status = "queued", submitted_at = time.time(), started_at = None, finished_at = None, result = None, error = None)
+            self.jobs[job["id"]] = job
+            self.next_job_id += 1
+            self.pending_jobs.append(job)
+            self.condition.notify_all()
+
+        return job
+
+    def get_job(self, job_id):
+        """Returns a copy of a job, safe to serialize.
+
+        Args:
+            job_id (int): job id
+
+        Returns:
+            dict: job, or None if there's no such job (or it finished long enough ago to be forgotten)
+        """
+
+        with self.condition:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def get_jobs(self):
+        """Returns a copy of every job.
+
+        Returns:
+            list: jobs, oldest first
+        """
+
+        with self.condition:
+            return [dict(job) for job in self.jobs.values()]
+
+    def next_job(self):
+        """Waits for the next job that can run: highest priority whose store isn't already being scraped.
+
+        Returns:
+            dict: job, or None if the scheduler is stopping
+        """
+
+        with self.condition:
+            while True:
+                if self.stopping:
+                    return None
+
+                runnable_jobs = [job for job in self.pending_jobs if tcg_player_searcher.get_store_key(job["store_url"]) not in self.active_stores]
+                if runnable_jobs:
+                    job = min(runnable_jobs, key = lambda job: (job["priority"], job["id"]))
+                    self.pending_jobs.remove(job)
+                    self.active_stores.add(tcg_player_searcher.get_store_key(job["store_url"]))
+                    job["status"] = "running"
+                    job["started_at"] = time.time()
+                    return job
+
+                self.condition.wait()
+
+    def run_jobs(self):
+        """Worker loop, runs jobs until the scheduler stops."""
+
+        while True:
+            job = self.next_job()
+            if job is None:
+                return
+
+            try:
+                result = run_job(job)
+                status, error = "finished", None
+            except Exception as e:
+                result, status, error = None, "failed", str(e)
+                print("Job " + str(job["id"]) + " failed: " + str(e))
+
+            with self.condition:
+                job["status"] = status
+                job["result"] = result
+                job["error"] = error
+                job["finished_at"] = time.time()
+                self.active_stores.discard(tcg_player_searcher.get_store_key(job["store_url"]))
+
+                # A service that runs for good can't keep every job it ever ran
+                self.finished_job_ids.append(job["id"])
+                while len(self.finished_job_ids) > self.finished_jobs_kept:
+                    del self.jobs[self.finished_job_ids.popleft()]
+
+                self.condition.notify_all()
+
+    def stop(self):
+        """Stops the workers once their current jobs finish."""
+
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+
+        for worker in self.workers:
+            worker.join()
+
+def parse_job_request(request):
+    """Checks a job request and fills in the defaults.
+
+    Args:
+        request (dict): job request JSON. store_url is required. want_file, output (file name without extension), output_formats (list),
+            priority (int, lower goes first, defaults to 10) and requests_per_second (for the store) are optional.
+
+    Returns:
+        dict: job request
+    """
+
+    if not isinstance(request, dict) or not request.get("store_url"):
+        raise ValueError("store_url is required")
+
+    output_formats = request.get("output_formats") or tcg_player_searcher.output_formats
+    for output_format in output_formats:
+        if output_format not in tcg_player_searcher.available_output_formats:
+            raise ValueError("Unknown output format " + str(output_format) + ". Values can be: " + ", ".join(tcg_player_searcher.available_output_formats))
+
+    store_url = request["store_url"]
+    if not store_url.endswith("/"):
+        store_url += "/"
+
+    return {
+        "store_url": store_url,
+        "want_file": request.get("want_file", ""),
+        "output": request.get("output") or tcg_player_searcher.output_file_name + "_" + tcg_player_searcher.get_store_label(store_url),
+        "output_formats": output_formats,
+        "priority": int(request.get("priority", 10)),
+        "requests_per_second": float(request.get("requests_per_second", store_requests_per_second))
+    }
+
+def run_job(job):
+    """Scrapes the job's store with the warm drivers into the job's output files.
+
+    Args:
+        job (dict): job from the scheduler
+
+    Returns:
+        dict: cards scraped, wanted cards found and fulfilled, queries whose scraped product count didn't match the result total, and how long it took
+    """
+
+    start = time.time()
+    print("Job " + str(job["id"]) + ": scraping " + job["store_url"])
+
+    try:
+        tcg_player_searcher.set_store_rate_limit(job["store_url"], job["requests_per_second"])
+        desired_cards = tcg_player_searcher.load_desired_cards_from_file(job["want_file"])
+
+        total_cards_scraped, wanted_cards_sink = tcg_player_searcher.scrape_store(job["store_url"], desired_cards, file_name = job["output"], formats = job["output_formats"])
+    finally:
+        # The service runs for good, so the job's page timings and query reports can't just pile up. Two jobs for the same store never run at the
+        # same time, so these are only ever this job's.
+        scrape_metrics.metrics.clear_events(tcg_player_searcher.get_store_key(job["store_url"]))
+        query_reports = tcg_player_searcher.pop_query_reports(job["store_url"])
+
+    fulfilled_wanted_cards = [wanted_card_match for wanted_card_match in wanted_cards_sink.wanted_card_matches if wanted_card_match[4]]
+    mismatched_reports = [report for report in query_reports if report["expected"] is not None and report["expected"] != report["scraped"]]
+
+    print("Job " + str(job["id"]) + ": " + str(total_cards_scraped) + " cards from " + job["store_url"])
+
+    return {"cards_scraped": total_cards_scraped, "wanted_cards_found": len(wanted_cards_sink.found_cards), "wanted_cards_fulfilled": len(fulfilled_wanted_cards),
+        "queries_run": len(query_reports), "query_mismatches": len(mismatched_reports), "seconds": time.time() - start}
+
+def start_service(host, port, scheduler, pool):
+    """Starts the HTTP endpoint for jobs:
+        POST /jobs with a JSON job request (see parse_job_request) queues a job and returns it
+        GET /jobs lists every job, GET /jobs/{id} returns one
+        GET /status returns the driver pool and queue counts
+
+    Args:
+        host (string): host to listen on
+        port (int): port to listen on
+        scheduler (JobScheduler): scheduler jobs go to
+        pool (DriverPool): driver pool, for /status
+
+    Returns:
+        http.server.ThreadingHTTPServer: server, already serving in a daemon thread
+    """
+
+    class ServiceRequestHandler(http.server.BaseHTTPRequestHandler):
+        def send_json(self, status, body):
+            content = json.dumps(body).encode("utf-8")
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            path = urllib.parse.urlparse(self.path).path.rstrip("/")
+
+            if path == "/jobs":
+                self.send_json(200, scheduler.get_jobs())
+            elif path.startswith("/jobs/") and path[len("/jobs/"):].isdigit():
+                job = scheduler.get_job(int(path[len("/jobs/"):]))
+                self.send_json(200 if job else 404, job or {"error": "No such job"})
+            elif path == "/status":
+                jobs = scheduler.get_jobs()
+                self.send_json(200, {"drivers": pool.get_status(), "queued": len([job for job in jobs if job["status"] == "queued"]), "running": len([job for job in jobs if job["status"] == "running"])})
+            else:
+                self.send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if urllib.parse.urlparse(self.path).path.rstrip("/") != "/jobs":
+                self.send_json(404, {"error": "Not found"})
+                return
+
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                job = scheduler.submit(parse_job_request(request))
+            except ValueError as e:
+                self.send_json(400, {"error": str(e)})
+                return
+
+            self.send_json(202, job)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    return server
+
+def main(argv):
+    global service_host, service_port, job_concurrency, warm_drivers, recycle_after_pages, max_idle_drivers, set_counts_cache_seconds, store_requests_per_second, finished_jobs_kept
+
+    try:
+        opts, args = getopt.getopt(argv, "h:", ["headless-flag=", "host=", "port=", "job-concurrency=", "warm-drivers=", "recycle-after-pages=", "max-idle-drivers=", "finished-jobs-kept=", "set-counts-cache-seconds=",
+            "store-requests-per-second=", "scrape-engine=", "parsing-engine=", "page-cache=", "pool-size=", "requests-per-second=", "request-burst=", "checkpoint-database=", "incremental", "lean"])
+    except getopt.GetoptError:
+        print("tcg_player_service.py -h <headless-flag> --host <host> --port <port> --job-concurrency <job-concurrency> --warm-drivers <warm-drivers> --recycle-after-pages <recycle-after-pages> --max-idle-drivers <max-idle-drivers> --finished-jobs-kept <finished-jobs-kept> --set-counts-cache-seconds <set-counts-cache-seconds> --store-requests-per-second <store-requests-per-second> --scrape-engine <scrape-engine> --parsing-engine <parsing-engine> --page-cache <page-cache> --pool-size <pool-size> --requests-per-second <requests-per-second> --request-burst <request-burst> --checkpoint-database <checkpoint-database> --incremental --lean")
+        print("host and port are where to listen for jobs. Defaults to 127.0.0.1:8765")
+        print("job-concurrency is how many jobs (stores) are scraped at the same time, each with pool-size drivers. Defaults to 1")
+        print("warm-drivers is how many drivers to start before taking jobs. Defaults to 1")
+        print("recycle-after-pages is how many pages a driver loads before it's quit and replaced with a fresh one. Defaults to 500")
+        print("max-idle-drivers is the most drivers kept idle in the pool between jobs. Defaults to 4")
+        print("finished-jobs-kept is how many finished jobs GET /jobs keeps showing, older ones are forgotten. Defaults to 1000")
+        print("set-counts-cache-seconds is how long a store's sets are reused between jobs instead of being looked up again. Defaults to 3600")
+        print("store-requests-per-second is the default page loads per second per store, on top of requests-per-second overall. A job can set its own. Defaults to 0 (no per store limit)")
+        print("The rest are the same as tcg_player_searcher.py, replay reads the page-cache")
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-h", "--headless-flag"):
+            tcg_player_searcher.headless = arg
+        if opt == "--host":
+            service_host = arg
+        if opt == "--port":
+            service_port = int(arg)
+        if opt == "--job-concurrency":
+            job_concurrency = max(1, int(arg))
+        if opt == "--warm-drivers":
+            warm_drivers = max(0, int(arg))
+        if opt == "--recycle-after-pages":
+            recycle_after_pages = max(1, int(arg))
+        if opt == "--max-idle-drivers":
+            max_idle_drivers = max(0, int(arg))
+        if opt == "--finished-jobs-kept":
+            finished_jobs_kept = max(0, int(arg))
+        if opt == "--set-counts-cache-seconds":
+            set_counts_cache_seconds = float(arg)
+        if opt == "--store-requests-per-second":
+            store_requests_per_second = float(arg)
+        if opt == "--scrape-engine":
+            tcg_player_searcher.scrape_engine = arg
+        if opt == "--parsing-engine":
+            tcg_player_searcher.parsing_engine = arg
+        if opt == "--page-cache":
+            tcg_player_searcher.page_cache_location = arg
+        if opt == "--pool-size":
+            tcg_player_searcher.pool_size = max(1, int(arg))
+        if opt == "--requests-per-second":
+            tcg_player_searcher.request_rate_limiter.requests_per_second = float(arg)
+        if opt == "--request-burst":
+            tcg_player_searcher.request_rate_limiter.burst = max(1, int(arg))
+            tcg_player_searcher.request_rate_limiter.tokens = tcg_player_searcher.request_rate_limiter.burst
+        if opt == "--checkpoint-database":
+            tcg_player_searcher.checkpoint_database_location = arg
+        if opt == "--incremental":
+            tcg_player_searcher.incremental = True
+        if opt == "--lean":
+            tcg_player_searcher.lean = True
+
+    if tcg_player_searcher.parsing_engine not in tcg_player_searcher.parsing_engines:
+        print("Unknown parsing engine " + tcg_player_searcher.parsing_engine + ". Values can be: " + ", ".join(tcg_player_searcher.parsing_engines))
+        sys.exit(2)
+
+    if tcg_player_searcher.scrape_engine not in tcg_player_searcher.scrape_engines:
+        print("Unknown scrape engine " + tcg_player_searcher.scrape_engine + ". Values can be: " + ", ".join(tcg_player_searcher.scrape_engines))
+        sys.exit(2)
+
+    if tcg_player_searcher.scrape_engine in ["http", "replay"] and tcg_player_searcher.parsing_engine != "lxml":
+        print("The " + tcg_player_searcher.parsing_engine + " parsing engine needs a browser, so it can't be used with the " + tcg_player_searcher.scrape_engine + " scrape engine. Exiting.")
+        sys.exit(2)
+
+    if tcg_player_searcher.scrape_engine == "replay":
+        # Nothing is loaded from the store, so there's nothing to be polite to
+        tcg_player_searcher.request_rate_limiter.requests_per_second = 0
+        store_requests_per_second = 0
+        tcg_player_searcher.page_cache_location = tcg_player_searcher.page_cache_location or tcg_player_searcher.default_page_cache_location
+
+        if not os.path.isdir(tcg_player_searcher.page_cache_location):
+            print("No page cache at " + tcg_player_searcher.page_cache_location + " to replay. Scrape with --page-cache first. Exiting.")
+            sys.exit(2)
+
+    if tcg_player_searcher.page_cache_location:
+        tcg_player_searcher.page_cache = page_cache_module.PageCache(tcg_player_searcher.page_cache_location, tcg_player_searcher.page_cache_max_bytes,
+            tcg_player_searcher.page_cache_max_age_seconds)
+
+    load_dotenv()
+
+    pool = DriverPool(recycle_after_pages, max_idle_drivers)
+    print("Starting " + str(warm_drivers) + " drivers")
+    pool.warm_up(warm_drivers)
+
+    tcg_player_searcher.driver_pool = pool
+    tcg_player_searcher.set_counts_cache_seconds = set_counts_cache_seconds
+
+    scheduler = JobScheduler(job_concurrency, finished_jobs_kept)
+    server = start_service(service_host, service_port, scheduler, pool)
+    print("Taking jobs on http://" + service_host + ":" + str(server.server_address[1]) + "/jobs")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping, waiting on running jobs")
+    finally:
+        server.shutdown()
+        scheduler.stop()
+        pool.close()
+
+        if tcg_player_searcher.page_cache is not None:
+            tcg_player_searcher.page_cache.evict()
+            tcg_player_searcher.page_cache.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
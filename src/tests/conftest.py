@@ -0,0 +1,30 @@
+import os
+import sys
+
+# The scripts in src import each other by module name, so the tests need src on the path the same way running a script from src does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import benchmark
+import tcg_player_searcher
+
+@pytest.fixture
+def http_fixture_store(monkeypatch):
+    """Synthetic store served by the benchmark fixture server, set up to be scraped with the http engine and nothing carried over from other tests.
+
+    Returns:
+        tuple: (FixtureStore, server, store front URL)
+    """
+
+    monkeypatch.setattr(tcg_player_searcher, "scrape_engine", "http")
+    monkeypatch.setattr(tcg_player_searcher, "parsing_engine", "lxml")
+    monkeypatch.setattr(tcg_player_searcher, "request_rate_limiter", tcg_player_searcher.TokenBucketRateLimiter(0))
+    monkeypatch.setattr(tcg_player_searcher, "driver_pool", None)
+    monkeypatch.setattr(tcg_player_searcher, "http_session", None)
+    monkeypatch.setattr(tcg_player_searcher, "page_cache", None)
+    monkeypatch.setattr(tcg_player_searcher, "set_counts_cache", {})
+    store = benchmark.FixtureStore(2000)
+    server, store_front_url = benchmark.start_fixture_server(store)
+    yield store, server, store_front_url
+    server.shutdown()
+    server.server_close()
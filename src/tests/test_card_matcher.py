@@ -0,0 +1,63 @@
+import card_matcher
+import card_record
+import tcg_player_searcher
+
+def build_card(name, quantity, product_id = 1):
+    card = card_record.CardRecord(name, "Secret Lair Drop Series", "Rare", quantity, "Near Mint", 25, "https://store.tcgplayerpro.com/catalog/magic/secret-lair-drop-series/" + str(product_id))
+    return card_record.split_treatments([card])[0]
+
+def match(wanted_cards, cards):
+    matcher = card_matcher.WantedCardMatcher(tcg_player_searcher.prepare_wanted_cards(wanted_cards))
+    for card in cards:
+        matcher.add(card)
+
+    return matcher
+
+def test_split_card_is_counted_once():
+    matcher = match([["4", "Fire // Ice"]], [build_card("Fire // Ice", 3)])
+
+    assert matcher.get_matched_cards(0)[0] == [build_card("Fire // Ice", 3)]
+    assert matcher.get_wanted_card_matches() == [["4", "Fire // Ice", "Fire // Ice", 3, False, "exact"]]
+
+def test_split_card_wanted_by_one_face():
+    matcher = match([["1", "Ice"], ["2", "Fire // Ice"]], [build_card("Fire // Ice", 2)])
+
+    assert [wanted_card_match[3:] for wanted_card_match in matcher.get_wanted_card_matches()] == [[2, True, "exact"], [2, True, "exact"]]
+    assert len(matcher.get_found_cards()) == 1
+
+def test_typo_still_matches_and_is_labeled_fuzzy():
+    matcher = match([["1", "Sheoldred, the Apocalypse"]], [build_card("Sheoldred, the Apocalyps", 1)])
+
+    assert matcher.get_wanted_card_matches()[0][5] == "fuzzy"
+    assert matcher.get_found_cards() == [[build_card("Sheoldred, the Apocalyps", 1), "fuzzy"]]
+
+def test_different_numbers_never_fuzzy_match():
+    matcher = match([["1", "Card Name 200012"]], [build_card("Card Name 200011", 1)])
+
+    assert matcher.get_matched_cards(0) == ([], "")
+
+def test_missing_letter_at_the_end_of_a_word_is_a_different_card():
+    matcher = match([["1", "Scalding Tar"]], [build_card("Scalding Tarn", 1)])
+
+    assert matcher.get_matched_cards(0) == ([], "")
+
+def test_exact_matches_are_labeled_exact():
+    matcher = match([["1", "Fire // Ice"]], [build_card("Fire // Ice", 1)])
+
+    assert matcher.get_found_cards() == [[build_card("Fire // Ice", 1), "exact"]]
+
+def test_every_sku_of_a_name_is_matched_not_just_the_first():
+    cards = [build_card("Sheoldred, the Apocalyps", 1, product_id) for product_id in range(1, 4)]
+    cards += [build_card("Fire // Ice", 2, product_id) for product_id in range(4, 6)]
+    matcher = match([["3", "Sheoldred, the Apocalypse"], ["4", "Fire // Ice"]], cards)
+
+    assert [wanted_card_match[3:] for wanted_card_match in matcher.get_wanted_card_matches()] == [[3, True, "fuzzy"], [4, True, "exact"]]
+
+def test_typo_lookup_only_checks_names_that_could_be_close_enough():
+    index = card_matcher.CardNameIndex()
+    for wanted_index, name in enumerate(["Sheoldred, the Apocalypse", "Ragavan, Nimble Pilferer", "Orcish Bowmasters"]):
+        index.add(name, wanted_index)
+
+    assert index.get_closest_key("Sheoldred, the Apocalyps")[0] == "sheoldred the apocalypse"
+    assert index.get_closest_key("Orcish Bowmaster")[0] == "orcish bowmasters"
+    assert index.get_closest_key("Lightning Bolt") == (None, 0)
@@ -0,0 +1,22 @@
+import card_record
+
+def build_card():
+    card = card_record.CardRecord("Barrowgoyf (Extended Art) (Ripple Foil)", "Modern Horizons 3", "Rare", 3, "Near Mint Foil - English", 123456,
+        "https://nolandbeyond.tcgplayerpro.com/catalog/magic/modern-horizons-3/551155")
+    return card_record.split_treatments([card])[0]
+
+def test_every_index_and_iteration_match_the_row():
+    card = build_card()
+    row = ["Barrowgoyf (Extended Art) (Ripple Foil)", "Extended Art,Ripple Foil", "Barrowgoyf  ", "Modern Horizons 3", "Rare", 3, "Near Mint Foil - English", "$1,234.56",
+        "https://tcgplayer-cdn.tcgplayer.com/product/551155_200w.jpg", "https://nolandbeyond.tcgplayerpro.com/catalog/magic/modern-horizons-3/551155"]
+
+    assert card.to_row() == row
+    assert list(card) == row
+    assert [card[index] for index in range(len(card))] == row
+    assert card[-1] == row[-1]
+    assert card[3:5] == row[3:5]
+
+def test_prices_parse_the_way_the_page_shows_them():
+    assert [card_record.parse_price_cents(price) for price in ["$1,234.56", " $0.25 ", "$3", "", None, "N/A", 12.5]] == [123456, 25, 300, None, None, None, 1250]
+    assert [card_record.parse_quantity(quantity) for quantity in ["4", " 1,200 ", 7, "", "many"]] == [4, 1200, 7, 0, 0]
+    assert card_record.format_price(None) == ""
@@ -0,0 +1,111 @@
+import csv
+import json
+import sqlite3
+import pytest
+import card_record
+import tcg_player_searcher
+
+store_front_url = "https://nolandbeyond.tcgplayerpro.com/"
+
+def get_cards():
+    return [
+        card_record.CardRecord("Barrowgoyf (Extended Art) (Ripple Foil)", "Modern Horizons 3", "Mythic", 2, "Near Mint Foil - English", 4599,
+            store_front_url + "catalog/magic/modern-horizons-3/barrowgoyf-extended-art/541230", "Extended Art, Ripple Foil", "Barrowgoyf"),
+        card_record.CardRecord("Sol Ring", "Commander Masters", "Uncommon", 12, "Lightly Played - English", 150, store_front_url + "catalog/magic/commander-masters/sol-ring/491595", "", "Sol Ring"),
+        card_record.CardRecord("Mox Opal", "Scars of Mirrodin", "Mythic", 1, "Damaged - Japanese", None, store_front_url + "catalog/magic/scars-of-mirrodin/mox-opal/33437", "", "Mox Opal")
+    ]
+
+def write_cards(tmp_path, output_formats, wanted_cards = None):
+    file_name = str(tmp_path / "inventory")
+    sinks, wanted_cards_sink = tcg_player_searcher.setup_card_sinks(output_formats, wanted_cards or [], file_name, store_front_url)
+
+    assert tcg_player_searcher.write_cards_to_sinks(iter(get_cards()), sinks, store_front_url) == 3
+
+    return file_name
+
+def get_text_rows():
+    return [["" if value is None else str(value) for value in card] for card in get_cards()]
+
+def test_csv_round_trip(tmp_path):
+    file_name = write_cards(tmp_path, ["csv"])
+
+    with open(file_name + ".csv", newline = "", encoding = "utf-8") as csv_file:
+        rows = list(csv.reader(csv_file))
+
+    assert rows[0] == tcg_player_searcher.cards_header
+    assert rows[1:] == get_text_rows()
+
+def test_jsonl_round_trip(tmp_path):
+    file_name = write_cards(tmp_path, ["jsonl"])
+
+    with open(file_name + ".jsonl", encoding = "utf-8") as jsonl_file:
+        records = [json.loads(line) for line in jsonl_file]
+
+    assert [list(record) for record in records] == [tcg_player_searcher.cards_header] * 3
+    assert [list(record.values()) for record in records] == [list(card) for card in get_cards()]
+
+def test_sqlite_round_trip(tmp_path):
+    file_name = write_cards(tmp_path, ["sqlite"])
+
+    connection = sqlite3.connect(file_name + ".db")
+    columns = [row[1] for row in connection.execute("pragma table_info(cards)")]
+    rows = [list(row) for row in connection.execute("select * from cards order by rowid")]
+    connection.close()
+
+    assert columns == ["name", "treatment", "name_without_treatment", "set", "rarity", "quantity", "condition_language", "price", "image_url", "product_url"]
+    assert [[None if value is None else str(value) for value in row] for row in rows] == [[None if value is None else str(value) for value in card] for card in get_cards()]
+
+def test_sqlite_replaces_the_last_runs_cards(tmp_path):
+    write_cards(tmp_path, ["sqlite"])
+    file_name = write_cards(tmp_path, ["sqlite"])
+
+    connection = sqlite3.connect(file_name + ".db")
+    assert connection.execute("select count(*) from cards").fetchone()[0] == 3
+    connection.close()
+
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_arrow_round_trip_is_typed(tmp_path, output_format):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    file_name = write_cards(tmp_path, [output_format])
+
+    if output_format == "parquet":
+        table = pyarrow.parquet.read_table(file_name + ".parquet")
+    else:
+        with pyarrow.ipc.open_file(file_name + ".arrow") as reader:
+            table = reader.read_all()
+
+    assert table.column_names == ["name", "treatment", "name_without_treatment", "set", "rarity", "quantity", "condition_language", "price_cents", "product_id", "image_url", "product_url"]
+    assert [str(field.type) for field in table.schema if str(field.type) != "string"] == ["int64", "int64", "int64"]
+    assert [field.name for field in table.schema if str(field.type) == "int64"] == ["quantity", "price_cents", "product_id"]
+    assert table.column("quantity").to_pylist() == [2, 12, 1]
+    assert table.column("price_cents").to_pylist() == [4599, 150, None]
+    assert table.column("product_id").to_pylist() == [541230, 491595, 33437]
+    assert table.column("name_without_treatment").to_pylist() == ["Barrowgoyf", "Sol Ring", "Mox Opal"]
+
+def test_constant_memory_excel_worksheets_in_order(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+
+    sinks, wanted_cards_sink = tcg_player_searcher.setup_card_sinks(["excel"], [], str(tmp_path / "empty"), store_front_url)
+    assert sinks[1].workbook.constant_memory
+    tcg_player_searcher.write_cards_to_sinks(iter([]), sinks, store_front_url)
+
+    file_name = write_cards(tmp_path, ["excel"], [["1", "Barrowgoyf"], ["4", "Sol Ring"], ["1", "Black Lotus"]])
+    workbook = openpyxl.load_workbook(file_name + ".xlsx", read_only = True)
+
+    assert workbook.sheetnames == ["Store Inventory", "Wanted Cards", "Found Cards"]
+
+    inventory_rows = [list(row) for row in workbook["Store Inventory"].iter_rows(values_only = True)]
+    assert inventory_rows[0] == tcg_player_searcher.cards_header
+    assert [row[0] for row in inventory_rows[1:]] == [card.name for card in get_cards()]
+
+    wanted_card_rows = [list(row) for row in workbook["Wanted Cards"].iter_rows(values_only = True)]
+    assert wanted_card_rows[0] == tcg_player_searcher.wanted_card_matches_header
+    assert [row[1] for row in wanted_card_rows[1:]] == ["Barrowgoyf", "Sol Ring", "Black Lotus"]
+
+    found_card_rows = [list(row) for row in workbook["Found Cards"].iter_rows(values_only = True)]
+    assert found_card_rows[0] == tcg_player_searcher.cards_header + ["Match"]
+    assert sorted(row[2] for row in found_card_rows[1:]) == ["Barrowgoyf", "Sol Ring"]
+    workbook.close()
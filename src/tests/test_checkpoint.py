@@ -0,0 +1,113 @@
+import sqlite3
+import pytest
+import scrape_checkpoint
+import tcg_player_searcher
+
+def test_checkpoint_waits_on_a_busy_database(tmp_path, monkeypatch):
+    timeouts = []
+    connect = sqlite3.connect
+    monkeypatch.setattr(scrape_checkpoint.sqlite3, "connect", lambda *args, **kwargs: timeouts.append(kwargs.get("timeout")) or connect(*args, **kwargs))
+
+    scrape_checkpoint.ScrapeCheckpoint(str(tmp_path / "checkpoint.db")).close()
+
+    assert timeouts == [60]
+
+def test_failed_store_closes_its_checkpoint(tmp_path, monkeypatch):
+    checkpoints = []
+
+    class ClosingCheckpoint(scrape_checkpoint.ScrapeCheckpoint):
+        def close(self):
+            checkpoints.append(self)
+            super().close()
+
+    def setup_card_sinks(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(tcg_player_searcher.scrape_checkpoint, "ScrapeCheckpoint", ClosingCheckpoint)
+    monkeypatch.setattr(tcg_player_searcher, "checkpoint_database_location", str(tmp_path / "checkpoint.db"))
+    monkeypatch.setattr(tcg_player_searcher, "setup_card_sinks", setup_card_sinks)
+
+    with pytest.raises(OSError):
+        tcg_player_searcher.scrape_store("https://nolandbeyond.tcgplayerpro.com/", [])
+
+    assert len(checkpoints) == 1
+
+def get_skus(cards):
+    return sorted((card.product_id, card.condition_language, card.quantity, card.price_cents) for card in cards)
+
+def scrape_with_checkpoint(store_front_url, checkpoint_location, resume = False):
+    checkpoint = scrape_checkpoint.ScrapeCheckpoint(checkpoint_location)
+    resumed = checkpoint.start_run(store_front_url, resume)
+
+    try:
+        return resumed, list(tcg_player_searcher.iter_store_cards(store_front_url, 1, checkpoint))
+    finally:
+        checkpoint.close()
+
+def test_resume_only_scrapes_the_unfinished_queries(http_fixture_store, tmp_path, monkeypatch):
+    store, server, store_front_url = http_fixture_store
+    checkpoint_location = str(tmp_path / "checkpoint.db")
+    # A query per set, so there's more than one to finish
+    monkeypatch.setattr(tcg_player_searcher, "pack_small_sets", False)
+    all_cards = list(tcg_player_searcher.iter_store_cards(store_front_url))
+
+    scraped_queries = []
+    scrape_query = tcg_player_searcher.scrape_query
+
+    def failing_scrape_query(driver, store_front_url, set_name, previous_fingerprint = None):
+        scraped_queries.append(set_name)
+        if len(scraped_queries) == 2:
+            raise tcg_player_searcher.WebDriverException("Chrome crashed")
+
+        return scrape_query(driver, store_front_url, set_name, previous_fingerprint)
+
+    monkeypatch.setattr(tcg_player_searcher, "scrape_query", failing_scrape_query)
+    resumed, first_cards = scrape_with_checkpoint(store_front_url, checkpoint_location)
+
+    assert not resumed
+    assert len(first_cards) < len(all_cards)
+    failed_query = scraped_queries[1]
+
+    scraped_queries.clear()
+    resumed, resumed_cards = scrape_with_checkpoint(store_front_url, checkpoint_location, True)
+
+    assert resumed
+    assert scraped_queries == [failed_query]
+    assert get_skus(resumed_cards) == get_skus(all_cards)
+
+    # Everything's done, so there's nothing left to resume and the next run starts over
+    resumed, cards = scrape_with_checkpoint(store_front_url, checkpoint_location, True)
+    assert not resumed
+
+def test_incremental_scrape_skips_unchanged_queries(http_fixture_store, tmp_path, monkeypatch):
+    store, server, store_front_url = http_fixture_store
+    checkpoint_location = str(tmp_path / "checkpoint.db")
+    monkeypatch.setattr(tcg_player_searcher, "incremental", True)
+    monkeypatch.setattr(tcg_player_searcher, "pack_small_sets", False)
+
+    resumed, first_cards = scrape_with_checkpoint(store_front_url, checkpoint_location)
+    first_page_requests = server.request_counts["pages"][0]
+
+    server.request_counts.clear()
+    tcg_player_searcher.set_counts_cache.clear()
+    resumed, unchanged_cards = scrape_with_checkpoint(store_front_url, checkpoint_location)
+    checkpoint = scrape_checkpoint.ScrapeCheckpoint(checkpoint_location)
+    query_count = len(checkpoint.get_query_plan(2))
+    checkpoint.close()
+
+    # Just the set lookup and page 1 of each query, every query's cards come from the last run
+    assert get_skus(unchanged_cards) == get_skus(first_cards)
+    assert server.request_counts["pages"][0] == 1 + query_count < first_page_requests
+
+    sold_out_product = store.products.pop(0)
+    store.set_counts[sold_out_product["set"]] -= 1
+    store.search_results.clear()
+    server.request_counts.clear()
+    tcg_player_searcher.set_counts_cache.clear()
+    resumed, changed_cards = scrape_with_checkpoint(store_front_url, checkpoint_location)
+
+    # Only the set the card sold out of is scraped past page 1
+    changed_set_pages = -(-store.set_counts[sold_out_product["set"]] // tcg_player_searcher.page_size)
+    assert server.request_counts["pages"][0] == query_count + changed_set_pages
+    assert get_skus(changed_cards) == get_skus(card for card in first_cards if card.product_id != sold_out_product["id"])
+    assert len(changed_cards) == len(first_cards) - len(sold_out_product["skus"])
@@ -0,0 +1,77 @@
+import threading
+import pytest
+import tcg_player_searcher
+
+class FakeDriver:
+    """Driver that only keeps track of whether it was quit."""
+
+    def __init__(self):
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+class BrokenCheckpoint:
+    """Checkpoint that fails the moment a worker asks it anything."""
+
+    def is_query_completed(self, query):
+        raise RuntimeError("checkpoint database is locked")
+
+def run_with_timeout(target, timeout = 10):
+    result = {}
+
+    def run():
+        try:
+            result["value"] = target()
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target = run, daemon = True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "timed out"
+
+    return result
+
+def test_checkpoint_failure_in_worker_does_not_hang_the_pool(monkeypatch):
+    drivers = []
+    monkeypatch.setattr(tcg_player_searcher, "driver_pool", None)
+    monkeypatch.setattr(tcg_player_searcher, "setup_driver", lambda: drivers.append(FakeDriver()) or drivers[-1])
+
+    result = run_with_timeout(lambda: tcg_player_searcher.scrape_sets_with_driver_pool("https://store.tcgplayerpro.com/", ["Set A", "Set B", "Set C"], 2, None, BrokenCheckpoint()))
+
+    assert result["value"] == []
+    assert len(drivers) == 2 and all(driver.quit_called for driver in drivers)
+
+def test_driver_released_when_finding_the_sets_fails(monkeypatch):
+    driver = FakeDriver()
+    monkeypatch.setattr(tcg_player_searcher, "driver_pool", None)
+    monkeypatch.setattr(tcg_player_searcher, "setup_driver", lambda: driver)
+
+    def fail_set_counts(driver, store_front_url):
+        raise RuntimeError("facet panel never loaded")
+
+    monkeypatch.setattr(tcg_player_searcher, "get_cached_set_counts", fail_set_counts)
+
+    with pytest.raises(RuntimeError):
+        list(tcg_player_searcher.iter_store_cards("https://store.tcgplayerpro.com/"))
+
+    assert driver.quit_called
+
+def test_drivers_released_when_starting_the_pool_fails(monkeypatch):
+    first_driver = FakeDriver()
+    drivers = []
+
+    def setup_driver():
+        if drivers:
+            raise RuntimeError("chromedriver crashed")
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    monkeypatch.setattr(tcg_player_searcher, "driver_pool", None)
+    monkeypatch.setattr(tcg_player_searcher, "setup_driver", setup_driver)
+
+    with pytest.raises(RuntimeError):
+        list(tcg_player_searcher.iter_sets_with_driver_pool("https://store.tcgplayerpro.com/", ["Set A", "Set B", "Set C"], 3, first_driver))
+
+    assert first_driver.quit_called and drivers[0].quit_called
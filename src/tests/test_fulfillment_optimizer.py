@@ -0,0 +1,34 @@
+import csv
+import card_record
+import fulfillment_optimizer
+import tcg_player_searcher
+
+def build_card(name, quantity, price_cents, product_id):
+    return card_record.CardRecord(name, "Dominaria United", "Mythic", quantity, "Near Mint", price_cents, "https://store.tcgplayerpro.com/catalog/magic/dominaria-united/" + str(product_id))
+
+def test_exact_offers_are_bought_before_cheaper_fuzzy_ones():
+    exact_card = build_card("Sheoldred, the Apocalypse", 1, 9000, 1)
+    fuzzy_card = build_card("Sheoldred, the Apocalyps", 4, 100, 2)
+    offers = fulfillment_optimizer.get_offers({"Store A": [([exact_card], "exact")], "Store B": [([fuzzy_card], "fuzzy")]})
+
+    assert [offer[3] for offer in offers[0]] == ["exact", "fuzzy"]
+
+    plan = fulfillment_optimizer.plan_cheapest_fulfillment([["2", "Sheoldred, the Apocalypse"]], offers)
+
+    assert plan["purchases"] == [[0, "Store A", exact_card, 1, "exact"], [0, "Store B", fuzzy_card, 1, "fuzzy"]]
+    assert plan["missing"] == []
+
+def test_plan_flags_fuzzy_matches(tmp_path):
+    fuzzy_card = build_card("Sheoldred, the Apocalyps", 1, 100, 2)
+    wanted_cards = [["1", "Sheoldred, the Apocalypse"], ["1", "Ragavan, Nimble Pilferer"]]
+    plan = fulfillment_optimizer.plan_cheapest_fulfillment(wanted_cards, fulfillment_optimizer.get_offers({"Store B": [([fuzzy_card], "fuzzy"), ([], "")]}))
+    file_location = str(tmp_path / "plan.csv")
+
+    tcg_player_searcher.write_fulfillment_plan(plan, wanted_cards, file_location)
+
+    with open(file_location, newline = "", encoding = "utf-8") as plan_file:
+        rows = list(csv.reader(plan_file))
+
+    assert rows[0][-1] == "Match"
+    assert rows[1][0] == "Store B" and rows[1][-1] == "fuzzy"
+    assert rows[2][3] == "Not available" and rows[2][-1] == ""
@@ -0,0 +1,25 @@
+import tcg_player_searcher
+
+def test_http_engine_scrapes_every_sku(http_fixture_store):
+    store, server, store_front_url = http_fixture_store
+
+    cards = list(tcg_player_searcher.iter_store_cards(store_front_url))
+
+    expected_skus = sorted((product["id"], product["name"], product["set"], quantity, price_cents) for product in store.products for condition, price_cents, quantity in product["skus"])
+    assert sorted((card.product_id, card.name, card.set, card.quantity, card.price_cents) for card in cards) == expected_skus
+
+def test_http_engine_only_fetches_pages(http_fixture_store):
+    store, server, store_front_url = http_fixture_store
+
+    cards = list(tcg_player_searcher.iter_store_cards(store_front_url, 2))
+
+    # No browser, so none of the images, fonts or scripts the pages point to get loaded
+    assert cards
+    assert list(server.request_counts) == ["pages"]
+
+def test_http_engine_shares_one_session(http_fixture_store):
+    first_driver = tcg_player_searcher.start_driver()
+    second_driver = tcg_player_searcher.start_driver()
+
+    assert isinstance(first_driver, tcg_player_searcher.HttpPageClient)
+    assert first_driver.session is second_driver.session
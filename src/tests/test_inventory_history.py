@@ -0,0 +1,59 @@
+import pytest
+import card_record
+import inventory_history
+
+def take_snapshot(history, store_front_url, quantity):
+    snapshot_id = history.start_snapshot(store_front_url)
+    history.add_cards([card_record.CardRecord("Sol Ring", "Commander Masters", "Uncommon", quantity, "Near Mint", 150, store_front_url + "catalog/magic/commander-masters/1")])
+    history.finish_snapshot(snapshot_id)
+
+    return snapshot_id
+
+@pytest.fixture
+def database_location(tmp_path):
+    database_location = str(tmp_path / "history.db")
+    history = inventory_history.InventoryHistory(database_location)
+    take_snapshot(history, "https://nolandbeyond.tcgplayerpro.com/", 2)
+    take_snapshot(history, "https://nolandbeyond.tcgplayerpro.com/", 1)
+    take_snapshot(history, "https://otherstore.tcgplayerpro.com/", 4)
+    history.close()
+
+    return database_location
+
+def test_diff_between_snapshots_of_a_store(database_location, capsys):
+    inventory_history.main(["-d", database_location, "--diff", "1,2"])
+
+    assert "Quantity" in capsys.readouterr().out
+
+@pytest.mark.parametrize("snapshot_ids, message", [("1,99", "There's no snapshot 99"), ("1,3", "aren't both snapshots of the same store")])
+def test_bad_diff_exits_with_the_message(database_location, capsys, snapshot_ids, message):
+    with pytest.raises(SystemExit) as exit_info:
+        inventory_history.main(["-d", database_location, "--diff", snapshot_ids])
+
+    assert exit_info.value.code != 0
+    assert message in capsys.readouterr().out
+
+def test_diff_needs_two_snapshot_ids(database_location):
+    with pytest.raises(SystemExit) as exit_info:
+        inventory_history.main(["-d", database_location, "--diff", "1,two"])
+
+    assert exit_info.value.code == 2
+
+def test_failed_scrape_does_not_save_a_snapshot(database_location):
+    import card_sinks
+    import tcg_player_searcher
+
+    store_front_url = "https://nolandbeyond.tcgplayerpro.com/"
+
+    def failing_cards():
+        yield card_record.CardRecord("Sol Ring", "Commander Masters", "Uncommon", 1, "Near Mint", 150, store_front_url + "catalog/magic/commander-masters/1")
+        raise RuntimeError("Store went down")
+
+    with pytest.raises(RuntimeError):
+        tcg_player_searcher.write_cards_to_sinks(failing_cards(), [card_sinks.HistoryCardSink(database_location, store_front_url)], store_front_url)
+
+    history = inventory_history.InventoryHistory(database_location)
+    snapshot_ids = [row[0] for row in history.query("select snapshot_id from snapshots order by snapshot_id")]
+    history.close()
+
+    assert snapshot_ids == [1, 2, 3]
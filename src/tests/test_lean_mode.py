@@ -0,0 +1,77 @@
+import fnmatch
+import re
+import pytest
+import benchmark
+import tcg_player_searcher
+
+class FakeChrome:
+    """Chrome driver stand-in that records the options it was started with and the DevTools commands sent to it."""
+
+    def __init__(self, options):
+        self.options = options
+        self.cdp_commands = []
+
+    def execute(self, driver_command, params = None):
+        return {"value": None}
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        self.cdp_commands.append((cmd, cmd_args))
+
+def start_fake_chrome(monkeypatch, lean):
+    monkeypatch.setattr(tcg_player_searcher, "Chrome", FakeChrome)
+    monkeypatch.setattr(tcg_player_searcher, "lean", lean)
+
+    return tcg_player_searcher.setup_selenium_driver()
+
+def test_lean_mode_blocks_the_urls_through_devtools(monkeypatch):
+    driver = start_fake_chrome(monkeypatch, True)
+
+    assert driver.cdp_commands == [("Network.enable", {}), ("Network.setBlockedURLs", {"urls": tcg_player_searcher.get_lean_blocked_urls()})]
+    assert "--blink-settings=imagesEnabled=false" in driver.options.arguments
+
+def test_normal_mode_blocks_nothing(monkeypatch):
+    driver = start_fake_chrome(monkeypatch, False)
+
+    assert driver.cdp_commands == []
+    assert "--blink-settings=imagesEnabled=false" not in driver.options.arguments
+
+def test_lean_blocked_urls():
+    blocked_urls = tcg_player_searcher.get_lean_blocked_urls()
+
+    for pattern in ["*.png", "*.png?*", "*.jpg", "*.jpg?*", "*.webp", "*.svg", "*.woff2", "*.woff2?*", "*.ttf", "*.mp4",
+            "*tcgplayer-cdn.tcgplayer.com/product/*", "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*facebook.net*"]:
+        assert pattern in blocked_urls
+
+    assert len(blocked_urls) == len(set(blocked_urls))
+
+@pytest.mark.parametrize("url, blocked", [
+    ("https://tcgplayer-cdn.tcgplayer.com/product/517521_200w.jpg", True),
+    ("https://tcgplayer-cdn.tcgplayer.com/product/517521_200w.jpg?v=2", True),
+    ("https://nolandbeyond.tcgplayerpro.com/fonts/storefront.woff2", True),
+    ("https://www.google-analytics.com/analytics.js", True),
+    ("https://nolandbeyond.tcgplayerpro.com/search/products?productLineName=Magic:+The+Gathering&page=2", False),
+    ("https://nolandbeyond.tcgplayerpro.com/catalog/magic/commander-masters/sol-ring/491595", False),
+    ("https://nolandbeyond.tcgplayerpro.com/js/app.js", False)])
+def test_lean_mode_leaves_the_pages_alone(url, blocked):
+    # DevTools patterns are * wildcards, close enough to fnmatch for these
+    assert any(fnmatch.fnmatchcase(url, pattern) for pattern in tcg_player_searcher.get_lean_blocked_urls()) == blocked
+
+def test_lean_mode_blocks_the_fixture_store_assets():
+    page_source = benchmark.render_list_page(benchmark.FixtureStore(40), "page=1")
+    asset_urls = set(re.findall(r"/(?:images|fonts)/[^\"')]*", page_source))
+
+    assert asset_urls
+    for asset_url in asset_urls:
+        assert any(fnmatch.fnmatchcase("http://127.0.0.1:8000" + asset_url, pattern) for pattern in tcg_player_searcher.get_lean_blocked_urls())
+
+def test_devtools_failure_does_not_stop_the_driver(capsys):
+    class NoDevToolsDriver:
+        def execute_cdp_cmd(self, cmd, cmd_args):
+            raise Exception("no DevTools")
+
+    tcg_player_searcher.block_unneeded_requests(NoDevToolsDriver())
+
+    assert "Could not block requests for lean mode" in capsys.readouterr().out
@@ -0,0 +1,72 @@
+import os
+import urllib.parse
+import lxml.html
+from selenium.common.exceptions import NoSuchElementException
+import tcg_player_searcher
+
+fixtures_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+page_url = "https://nolandbeyond.tcgplayerpro.com/search/products?q=&productLineName=Magic:+The+Gathering&pageSize=48&view=list&page=1"
+
+# What the list page fixture should parse to, one row per SKU with the cards_header fields
+expected_rows = [
+    ["Sheoldred, the Apocalypse (Extended Art)", "Extended Art", "Sheoldred, the Apocalypse ", "Dominaria United", "Mythic", 2, "Near Mint", "$1,234.56",
+        "https://tcgplayer-cdn.tcgplayer.com/product/282745_200w.jpg", "https://nolandbeyond.tcgplayerpro.com/catalog/magic/dominaria-united/282745"],
+    ["Sheoldred, the Apocalypse (Extended Art)", "Extended Art", "Sheoldred, the Apocalypse ", "Dominaria United", "Mythic", 1, "Lightly Played Foil - Japanese", "$80.00",
+        "https://tcgplayer-cdn.tcgplayer.com/product/282745_200w.jpg", "https://nolandbeyond.tcgplayerpro.com/catalog/magic/dominaria-united/282745"],
+    ["Barrowgoyf (Borderless) (Ripple Foil)", "Borderless,Ripple Foil", "Barrowgoyf  ", "Modern Horizons 3", "Rare", 12, "Near Mint Foil", "$12.34",
+        "https://tcgplayer-cdn.tcgplayer.com/product/543210_200w.jpg", "https://nolandbeyond.tcgplayerpro.com/catalog/magic/modern-horizons-3/543210"],
+    # No rarity on the page
+    ["Fire // Ice", "", "Fire // Ice", "Secret Lair Drop Series", "", 3, "Moderately Played", "$0.25",
+        "https://tcgplayer-cdn.tcgplayer.com/product/99999_200w.jpg", "https://nolandbeyond.tcgplayerpro.com/catalog/magic/secret-lair-drop-series/99999"],
+]
+
+class FixtureElement:
+    """Stands in for a Selenium WebElement on top of an lxml element, so the webdriver parsing engine can run on a saved page without Chrome. Only
+    handles the "tag.class" and ".class" selectors the list page parser uses."""
+
+    def __init__(self, element):
+        self.element = element
+
+    def find_elements(self, by, selector):
+        tag, class_name = selector.split(".", 1)
+        return [FixtureElement(match) for match in self.element.xpath(".//" + (tag or "*") + "[" + tcg_player_searcher.css_class_xpath(class_name) + "]")]
+
+    def find_element(self, by, selector):
+        matches = self.find_elements(by, selector)
+        if not matches:
+            raise NoSuchElementException(selector)
+
+        return matches[0]
+
+    @property
+    def text(self):
+        return " ".join(self.element.text_content().split())
+
+    def get_attribute(self, name):
+        # Like Selenium, href comes back absolute
+        if name == "href":
+            return urllib.parse.urljoin(page_url, self.element.get("href"))
+
+        return self.element.get(name)
+
+def load_fixture(file_name):
+    with open(os.path.join(fixtures_directory, file_name), encoding = "utf-8") as fixture_file:
+        return fixture_file.read()
+
+def test_lxml_parsing_engine_matches_expected_rows():
+    cards = tcg_player_searcher.parse_store_page_source_list_view(load_fixture("list_page.html"), page_url)
+
+    assert [card.to_row() for card in cards] == expected_rows
+
+def test_webdriver_parsing_engine_matches_lxml_parsing_engine():
+    page_source = load_fixture("list_page.html")
+    driver = FixtureElement(lxml.html.fromstring(page_source))
+
+    webdriver_rows = [card.to_row() for card in tcg_player_searcher.scrape_store_page_contents_list_view_elements(driver)]
+    lxml_rows = [card.to_row() for card in tcg_player_searcher.parse_store_page_source_list_view(page_source, page_url)]
+
+    assert webdriver_rows == lxml_rows == expected_rows
+
+def test_empty_page_has_no_cards():
+    assert tcg_player_searcher.parse_store_page_source_list_view("", page_url) == []
+    assert tcg_player_searcher.parse_store_page_source_list_view("<html><body><div class='search-results'></div></body></html>", page_url) == []
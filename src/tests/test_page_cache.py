@@ -0,0 +1,58 @@
+import page_cache
+import tcg_player_searcher
+
+def get_skus(cards):
+    return sorted((card.product_id, card.name, card.set, card.condition_language, card.quantity, card.price_cents) for card in cards)
+
+def test_replay_parses_the_cached_pages_without_the_store(http_fixture_store, tmp_path, monkeypatch):
+    store, server, store_front_url = http_fixture_store
+    cache = page_cache.PageCache(str(tmp_path / "page_cache"))
+    monkeypatch.setattr(tcg_player_searcher, "page_cache", cache)
+
+    scraped_cards = list(tcg_player_searcher.iter_store_cards(store_front_url))
+    page_requests = server.request_counts["pages"][0]
+
+    monkeypatch.setattr(tcg_player_searcher, "scrape_engine", "replay")
+    tcg_player_searcher.set_counts_cache.clear()
+    replayed_cards = list(tcg_player_searcher.iter_store_cards(store_front_url))
+    cache.close()
+
+    assert get_skus(replayed_cards) == get_skus(scraped_cards)
+    assert server.request_counts["pages"][0] == page_requests
+
+def test_replay_of_a_page_that_was_never_cached_is_empty(tmp_path, capsys):
+    cache = page_cache.PageCache(str(tmp_path / "page_cache"))
+    driver = tcg_player_searcher.ReplayPageClient(cache)
+
+    driver.get("https://nolandbeyond.tcgplayerpro.com/search/products?page=1")
+    cache.close()
+
+    assert driver.page_source == ""
+    assert "Not in the page cache" in capsys.readouterr().out
+
+def test_pages_keep_their_latest_version(tmp_path):
+    cache = page_cache.PageCache(str(tmp_path / "page_cache"))
+    url = "https://nolandbeyond.tcgplayerpro.com/search/products?page=1"
+
+    cache.put(url, "<html>first</html>")
+    cache.put(url, "<html>first</html>")
+    # Same content again just bumps its time
+    stats = cache.get_stats()
+    assert (stats["urls"], stats["versions"], stats["contents"]) == (1, 1, 1)
+
+    cache.put(url, "<html>second</html>")
+    assert cache.get(url) == "<html>second</html>"
+    assert cache.get_stats()["versions"] == 2
+    cache.close()
+
+def test_evict_drops_the_least_recently_fetched_pages(tmp_path):
+    cache = page_cache.PageCache(str(tmp_path / "page_cache"), max_bytes = 1)
+
+    cache.put("https://nolandbeyond.tcgplayerpro.com/search/products?page=1", "<html>page 1</html>")
+    cache.put("https://nolandbeyond.tcgplayerpro.com/search/products?page=2", "<html>page 2</html>")
+    cache.max_bytes = cache.get_stats()["bytes"] - 1
+
+    assert cache.evict() == 1
+    assert cache.get("https://nolandbeyond.tcgplayerpro.com/search/products?page=1") is None
+    assert cache.get("https://nolandbeyond.tcgplayerpro.com/search/products?page=2") == "<html>page 2</html>"
+    cache.close()
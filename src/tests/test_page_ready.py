@@ -0,0 +1,24 @@
+import tcg_player_searcher
+
+class RenderedPageDriver:
+    """Stands in for a Selenium driver whose list page has finished rendering without pagination, with result_count results on it."""
+
+    current_url = "https://nolandbeyond.tcgplayerpro.com/search/products?page=1"
+
+    def __init__(self, result_count):
+        self.result_count = result_count
+
+    def execute_script(self, script):
+        return [True, False, False, self.result_count]
+
+def test_short_page_is_ready_without_pagination(monkeypatch):
+    monkeypatch.setattr(tcg_player_searcher, "page_size", 100)
+
+    # 60 results is a short page at a page size of 100, so it's the only page
+    assert tcg_player_searcher.wait_for_page_ready(RenderedPageDriver(60), timeout = 1)
+
+def test_full_page_waits_for_pagination(monkeypatch):
+    monkeypatch.setattr(tcg_player_searcher, "page_size", 24)
+
+    # 24 results fills a page, so the pagination still has to show up
+    assert not tcg_player_searcher.wait_for_page_ready(RenderedPageDriver(24), timeout = 0.5)
@@ -0,0 +1,33 @@
+import tcg_player_searcher
+
+def test_previous_plan_keeps_groups_when_a_count_changes():
+    set_counts = [["Set A", 5000], ["Set B", 3000], ["Set C", 2000], ["Set D", 1500], ["Set E", 40], ["Set F", 1]]
+    previous_plan = tcg_player_searcher.plan_set_queries(set_counts, 10000)
+
+    # Set E growing would reshuffle the bins if planned from scratch
+    changed_set_counts = [["Set A", 5000], ["Set B", 3000], ["Set C", 2000], ["Set D", 1500], ["Set E", 3400], ["Set F", 1]]
+    assert tcg_player_searcher.plan_set_queries(changed_set_counts, 10000) != previous_plan
+
+    plan = tcg_player_searcher.plan_set_queries(changed_set_counts, 10000, previous_plan)
+    unchanged_queries = [query for query in previous_plan if "Set E" not in query["setName"]]
+
+    assert all(query in plan for query in unchanged_queries)
+    assert sorted(set_name for query in plan for set_name in query["setName"]) == ["Set A", "Set B", "Set C", "Set D", "Set E", "Set F"]
+
+def test_new_sets_get_their_own_group():
+    previous_plan = tcg_player_searcher.plan_set_queries([["Set A", 10], ["Set B", 20]], 10000)
+    plan = tcg_player_searcher.plan_set_queries([["Set A", 10], ["Set B", 20], ["Set C", 5]], 10000, previous_plan)
+
+    assert plan == previous_plan + [{"setName": ["Set C"]}]
+
+def test_group_that_no_longer_fits_is_packed_again():
+    previous_plan = [{"setName": ["Set A", "Set B"]}]
+    plan = tcg_player_searcher.plan_set_queries([["Set A", 6000], ["Set B", 6000]], 10000, previous_plan)
+
+    assert sorted(query["setName"] for query in plan) == [["Set A"], ["Set B"]]
+
+def test_sets_gone_from_the_store_are_dropped_from_their_group():
+    previous_plan = [{"setName": ["Set A", "Set B", "Set C"]}]
+    plan = tcg_player_searcher.plan_set_queries([["Set A", 10], ["Set C", 10]], 10000, previous_plan)
+
+    assert plan == [{"setName": ["Set A", "Set C"]}]
@@ -0,0 +1,37 @@
+import requests
+import request_controller
+import tcg_player_searcher
+
+class ThrottledDriver:
+    """Driver whose first page load gets a 429 back and the rest load fine."""
+
+    def __init__(self):
+        self.loads = 0
+
+    def get(self, url):
+        self.loads += 1
+
+        if self.loads == 1:
+            response = requests.Response()
+            response.status_code = 429
+            raise requests.HTTPError("429 Too Many Requests", response = response)
+
+def test_throttling_only_slows_down_the_store_that_pushed_back(monkeypatch):
+    monkeypatch.setattr(tcg_player_searcher, "adaptive_rate", True)
+    monkeypatch.setattr(tcg_player_searcher, "requests_per_second", 100)
+    monkeypatch.setattr(tcg_player_searcher, "request_rate_limiter", tcg_player_searcher.TokenBucketRateLimiter(100, 10))
+    monkeypatch.setattr(tcg_player_searcher, "store_rate_limiters", {})
+    monkeypatch.setattr(tcg_player_searcher, "request_controller", request_controller.RequestController(adaptive = True))
+    monkeypatch.setattr(tcg_player_searcher, "retry_backoff_seconds", 0)
+
+    tcg_player_searcher.load_page(ThrottledDriver(), "https://throttled.tcgplayerpro.com/search/products?page=1")
+
+    assert tcg_player_searcher.store_rate_limiters["throttled.tcgplayerpro.com"].requests_per_second == 50
+    assert tcg_player_searcher.get_store_rate_limiter("fine.tcgplayerpro.com").requests_per_second == 100
+    assert tcg_player_searcher.request_rate_limiter.requests_per_second == 100
+
+def test_no_store_limiter_without_adaptive_rate(monkeypatch):
+    monkeypatch.setattr(tcg_player_searcher, "adaptive_rate", False)
+    monkeypatch.setattr(tcg_player_searcher, "store_rate_limiters", {})
+
+    assert tcg_player_searcher.get_store_rate_limiter("fine.tcgplayerpro.com") is None
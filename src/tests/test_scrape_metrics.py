@@ -0,0 +1,80 @@
+import json
+import scrape_metrics
+import tcg_player_searcher
+
+def test_stage_timings_add_up(monkeypatch):
+    monkeypatch.setattr(scrape_metrics, "slow_outlier_count", 2)
+    metrics = scrape_metrics.ScrapeMetrics()
+
+    metrics.record("parse", 0.5)
+    metrics.record("set", 1.0, "Bloomburrow", 10, "nolandbeyond.tcgplayerpro.com")
+    metrics.record("set", 3.0, "Modern Horizons 3", 30, "nolandbeyond.tcgplayerpro.com")
+    metrics.record("set", 2.0, "Duskmourn", 20, "otherstore.tcgplayerpro.com")
+    with metrics.timer("page", "https://nolandbeyond.tcgplayerpro.com/search/products?page=1", "nolandbeyond.tcgplayerpro.com") as timing:
+        timing["cards"] = 48
+    metrics.increment("retries.empty_page")
+    metrics.increment("retries.empty_page", 2)
+
+    assert metrics.stages["set"] == {"count": 3, "seconds": 6.0, "max_seconds": 3.0, "cards": 60}
+    assert metrics.stages["parse"] == {"count": 1, "seconds": 0.5, "max_seconds": 0.5, "cards": 0}
+    assert metrics.stages["page"]["cards"] == 48
+    assert metrics.counters == {"retries.empty_page": 3}
+    # Only labeled timings are events
+    assert [event["label"] for event in metrics.events] == ["Bloomburrow", "Modern Horizons 3", "Duskmourn", "https://nolandbeyond.tcgplayerpro.com/search/products?page=1"]
+    assert metrics.get_slow_outliers("set") == [(3.0, "Modern Horizons 3"), (2.0, "Duskmourn")]
+
+    metrics.clear_events("nolandbeyond.tcgplayerpro.com")
+    assert [event["label"] for event in metrics.events] == ["Duskmourn"]
+    assert metrics.stages["set"]["count"] == 3
+
+def test_metrics_files(tmp_path):
+    metrics = scrape_metrics.ScrapeMetrics()
+    metrics.record("set", 1.5, "Bloomburrow", 10)
+    metrics.increment("webdriver_commands.findElement", 4)
+    metrics.increment("failed_sets")
+
+    metrics.write_jsonl(str(tmp_path / "metrics.jsonl"))
+    with open(str(tmp_path / "metrics.jsonl"), encoding = "utf-8") as metrics_file:
+        lines = [json.loads(line) for line in metrics_file]
+
+    assert {"type": "stage", "stage": "set", "count": 1, "seconds": 1.5, "max_seconds": 1.5, "cards": 10} in lines
+    assert {"type": "counter", "counter": "webdriver_commands.findElement", "value": 4} in lines
+    assert [line["label"] for line in lines if line["type"] == "event"] == ["Bloomburrow"]
+
+    metrics.write_prometheus(str(tmp_path / "metrics.prom"))
+    with open(str(tmp_path / "metrics.prom"), encoding = "utf-8") as metrics_file:
+        prometheus_lines = metrics_file.read().splitlines()
+
+    assert 'tcg_scraper_stage_seconds_total{stage="set"} 1.5' in prometheus_lines
+    assert 'tcg_scraper_stage_cards_total{stage="set"} 10' in prometheus_lines
+    assert 'tcg_scraper_webdriver_commands_total{name="findElement"} 4' in prometheus_lines
+    assert "tcg_scraper_failed_sets_total 1" in prometheus_lines
+
+def test_scripted_scrape_metrics_and_query_reports(http_fixture_store, monkeypatch, capsys):
+    store, server, store_front_url = http_fixture_store
+    metrics = scrape_metrics.ScrapeMetrics()
+    monkeypatch.setattr(tcg_player_searcher, "metrics", metrics)
+    monkeypatch.setattr(tcg_player_searcher, "query_reports", [])
+    monkeypatch.setattr(tcg_player_searcher, "pack_small_sets", False)
+
+    cards = list(tcg_player_searcher.iter_store_cards(store_front_url))
+
+    # One query per set, every page fetched once
+    store_key = tcg_player_searcher.get_store_key(store_front_url)
+    total_pages = sum(-(-count // tcg_player_searcher.page_size) for count in store.set_counts.values())
+    assert metrics.stages["get_sets"]["count"] == 1
+    assert metrics.stages["set"]["count"] == len(store.set_counts)
+    assert metrics.stages["set"]["cards"] == len(cards)
+    assert metrics.stages["page"]["count"] == total_pages
+    assert metrics.counters["http_requests"] == server.request_counts["pages"][0] == 1 + total_pages
+    assert sorted(event["label"] for event in metrics.events if event["stage"] == "set") == sorted(store.set_counts)
+    assert set(event["store"] for event in metrics.events) == {store_key}
+
+    reports = tcg_player_searcher.pop_query_reports(store_front_url)
+    assert sorted((report["query"], report["expected"], report["scraped"]) for report in reports) == sorted((set_name, count, count) for set_name, count in store.set_counts.items())
+    assert tcg_player_searcher.query_reports == []
+
+    # A query that came up short gets called out
+    capsys.readouterr()
+    tcg_player_searcher.record_query_report({"setName": ["Bloomburrow"]}, 3, cards[:1], store_front_url)
+    assert "Query Bloomburrow expected 3 products, scraped 1" in capsys.readouterr().out
@@ -0,0 +1,39 @@
+import pytest
+import benchmark
+import tcg_player_searcher
+
+class CountingPageClient(tcg_player_searcher.HttpPageClient):
+    """HttpPageClient that counts how many times each page's HTML is read."""
+
+    def __init__(self, session):
+        self.page_source_reads = {}
+        super().__init__(session)
+
+    @property
+    def page_source(self):
+        self.page_source_reads[self.current_url] = self.page_source_reads.get(self.current_url, 0) + 1
+        return self._page_source
+
+    @page_source.setter
+    def page_source(self, page_source):
+        self._page_source = page_source
+
+@pytest.fixture
+def fixture_store(monkeypatch):
+    monkeypatch.setattr(tcg_player_searcher, "request_rate_limiter", tcg_player_searcher.TokenBucketRateLimiter(0))
+    monkeypatch.setattr(tcg_player_searcher, "parsing_engine", "lxml")
+    store = benchmark.FixtureStore(1000)
+    server, store_front_url = benchmark.start_fixture_server(store)
+    yield store, store_front_url
+    server.shutdown()
+    server.server_close()
+
+def test_first_page_is_read_once_for_the_total_and_the_cards(fixture_store):
+    store, store_front_url = fixture_store
+    driver = CountingPageClient(tcg_player_searcher.setup_http_session())
+
+    cards, fingerprint = tcg_player_searcher.scrape_query(driver, store_front_url, {})
+
+    assert len(set(card.product_id for card in cards)) == len(store.products)
+    assert list(driver.page_source_reads.values()) == [1] * len(driver.page_source_reads)
+    assert len(driver.page_source_reads) == -(-len(store.products) // tcg_player_searcher.page_size) > 1
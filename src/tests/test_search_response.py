@@ -0,0 +1,78 @@
+import json
+import os
+import page_cache
+import tcg_player_searcher
+
+fixtures_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+store_front_url = "https://nolandbeyond.tcgplayerpro.com/"
+
+def load_search_response():
+    with open(os.path.join(fixtures_directory, "search_response.json"), encoding = "utf-8") as fixture_file:
+        return json.load(fixture_file)
+
+class PerformanceLogDriver:
+    """Stands in for a Selenium driver with the performance log on: get_log hands back the captured entries once, execute_cdp_cmd the response bodies."""
+
+    def __init__(self, responses):
+        self.entries = []
+        self.bodies = {}
+
+        for request_id, (url, mime_type, body) in enumerate(responses):
+            self.entries.append({"message": json.dumps({"message": {"method": "Network.responseReceived", "params": {"requestId": str(request_id), "response": {"url": url, "mimeType": mime_type}}}})})
+            self.entries.append({"message": json.dumps({"message": {"method": "Network.loadingFinished", "params": {"requestId": str(request_id)}}})})
+            self.bodies[str(request_id)] = body
+
+    def get_log(self, log_type):
+        entries, self.entries = self.entries, []
+        return entries
+
+    def execute_cdp_cmd(self, command, params):
+        return {"body": self.bodies[params["requestId"]]}
+
+def test_cards_from_recorded_search_response():
+    cards = tcg_player_searcher.build_cards_from_search_response(load_search_response(), store_front_url)
+
+    # Out of stock SKUs are left out, like the list page does
+    assert [card.to_row() for card in cards] == [
+        ["Sheoldred, the Apocalypse (Extended Art)", "Extended Art", "Sheoldred, the Apocalypse ", "Dominaria United", "Mythic", 2, "Near Mint - English", "$1,234.56",
+            "https://tcgplayer-cdn.tcgplayer.com/product/282745_200w.jpg", "https://nolandbeyond.tcgplayerpro.com/catalog/magic/dominaria-united/282745"],
+        ["Sheoldred, the Apocalypse (Extended Art)", "Extended Art", "Sheoldred, the Apocalypse ", "Dominaria United", "Mythic", 1, "Lightly Played Foil - Japanese", "$80.00",
+            "https://tcgplayer-cdn.tcgplayer.com/product/282745_200w.jpg", "https://nolandbeyond.tcgplayerpro.com/catalog/magic/dominaria-united/282745"],
+        ["Fire // Ice", "", "Fire // Ice", "Secret Lair Drop Series", "", 3, "Moderately Played - English", "$0.25",
+            "https://tcgplayer-cdn.tcgplayer.com/product/99999_200w.jpg", "https://nolandbeyond.tcgplayerpro.com/catalog/product/99999"],
+    ]
+    assert tcg_player_searcher.get_search_response_total_results(load_search_response()) == 1234
+
+def test_search_response_url_pattern_only_matches_the_search_endpoint():
+    matches = ["https://mp-search-api.tcgplayer.com/v1/search/request?q=&isList=false", "https://nolandbeyond.tcgplayerpro.com/api/catalog/search?page=2",
+        "https://nolandbeyond.tcgplayerpro.com/api/search/products"]
+    non_matches = ["https://nolandbeyond.tcgplayerpro.com/api/search/suggestions?q=sheol", "https://analytics.example.com/collect?page=/search/products",
+        "https://nolandbeyond.tcgplayerpro.com/api/search-events", "https://nolandbeyond.tcgplayerpro.com/api/saved-searches"]
+
+    assert all(tcg_player_searcher.search_response_url_pattern.search(url) for url in matches)
+    assert not any(tcg_player_searcher.search_response_url_pattern.search(url) for url in non_matches)
+
+def test_unrelated_json_is_not_taken_for_the_search_response():
+    driver = PerformanceLogDriver([
+        ["https://analytics.example.com/collect?page=/search/products", "application/json", json.dumps({"ok": True})],
+        ["https://nolandbeyond.tcgplayerpro.com/api/search/suggestions?q=sheol", "application/json", json.dumps({"results": ["Sheoldred"]})],
+        ["https://nolandbeyond.tcgplayerpro.com/api/search", "application/json", json.dumps({"status": "ok"})],
+        ["https://mp-search-api.tcgplayer.com/v1/search/request", "application/json", json.dumps(load_search_response())],
+    ])
+
+    assert tcg_player_searcher.wait_for_search_response(driver, timeout = 1) == load_search_response()
+
+def test_json_engine_saves_the_rendered_page_for_replay(monkeypatch, tmp_path):
+    class RenderedDriver:
+        page_source = "<html><body>rendered</body></html>"
+        current_url = store_front_url + "search/products?page=2"
+        requested_url = current_url
+
+    cache = page_cache.PageCache(str(tmp_path))
+    monkeypatch.setattr(tcg_player_searcher, "page_cache", cache)
+    monkeypatch.setattr(tcg_player_searcher, "wait_for_page_ready", lambda driver: None)
+
+    tcg_player_searcher.save_rendered_page(RenderedDriver())
+
+    assert cache.get(RenderedDriver.requested_url) == RenderedDriver.page_source
+    cache.close()
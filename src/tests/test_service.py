@@ -0,0 +1,87 @@
+import time
+import pytest
+import page_cache
+import tcg_player_searcher
+import tcg_player_service
+
+def test_pool_starts_replay_drivers(monkeypatch, tmp_path):
+    cache = page_cache.PageCache(str(tmp_path))
+    monkeypatch.setattr(tcg_player_searcher, "scrape_engine", "replay")
+    monkeypatch.setattr(tcg_player_searcher, "page_cache", cache)
+
+    pool = tcg_player_service.DriverPool(recycle_after_pages = 500, max_idle_drivers = 4)
+    driver = pool.acquire()
+
+    assert isinstance(driver, tcg_player_searcher.ReplayPageClient)
+    assert driver.cache is cache
+
+    pool.release(driver)
+    pool.close()
+    cache.close()
+
+@pytest.mark.parametrize("argv", [["--scrape-engine", "chrome"], ["--parsing-engine", "bs4"], ["--scrape-engine", "http", "--parsing-engine", "json"]])
+def test_main_rejects_bad_engines(monkeypatch, argv):
+    monkeypatch.setattr(tcg_player_searcher, "scrape_engine", tcg_player_searcher.scrape_engine)
+    monkeypatch.setattr(tcg_player_searcher, "parsing_engine", tcg_player_searcher.parsing_engine)
+    monkeypatch.setattr(tcg_player_service, "DriverPool", None)
+
+    with pytest.raises(SystemExit) as exit_info:
+        tcg_player_service.main(argv)
+
+    assert exit_info.value.code == 2
+
+def test_run_job_only_drops_its_own_events_and_query_reports(monkeypatch):
+    class EmptySink:
+        found_cards = []
+        wanted_card_matches = []
+
+    def scrape_store(store_front_url, *args, **kwargs):
+        tcg_player_service.scrape_metrics.metrics.record("page", 1.0, store_front_url + "search?page=1", store = tcg_player_searcher.get_store_key(store_front_url))
+        tcg_player_searcher.record_query_report({"setName": "Alpha"}, 2, [], store_front_url)
+        return 0, EmptySink()
+
+    metrics = tcg_player_service.scrape_metrics.ScrapeMetrics()
+    monkeypatch.setattr(tcg_player_service.scrape_metrics, "metrics", metrics)
+    monkeypatch.setattr(tcg_player_searcher, "query_reports", [])
+    monkeypatch.setattr(tcg_player_searcher, "scrape_store", scrape_store)
+    monkeypatch.setattr(tcg_player_searcher, "load_desired_cards_from_file", lambda want_file: [])
+    monkeypatch.setattr(tcg_player_searcher, "set_store_rate_limit", lambda store_url, requests_per_second: None)
+
+    # Another job, still running
+    metrics.record("page", 1.0, "https://otherstore.tcgplayerpro.com/search?page=1", store = "otherstore.tcgplayerpro.com")
+    tcg_player_searcher.record_query_report({"setName": "Beta"}, 1, [], "https://otherstore.tcgplayerpro.com/")
+
+    result = tcg_player_service.run_job({"id": 1, "store_url": "https://store.tcgplayerpro.com/", "want_file": "", "output": "out", "output_formats": ["excel"], "requests_per_second": 0})
+
+    assert result["queries_run"] == 1 and result["query_mismatches"] == 1
+    assert [event["store"] for event in metrics.events] == ["otherstore.tcgplayerpro.com"]
+    assert [report["store"] for report in tcg_player_searcher.query_reports] == ["otherstore.tcgplayerpro.com"]
+
+def test_failed_driver_start_does_not_count_as_in_use(monkeypatch):
+    def start_driver():
+        raise RuntimeError("chromedriver not found")
+
+    monkeypatch.setattr(tcg_player_searcher, "start_driver", start_driver)
+    pool = tcg_player_service.DriverPool(recycle_after_pages = 500, max_idle_drivers = 4)
+
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+    assert pool.get_status()["in_use"] == 0
+
+def test_only_the_newest_finished_jobs_are_kept(monkeypatch):
+    monkeypatch.setattr(tcg_player_service, "run_job", lambda job: {"cards_scraped": 0})
+    scheduler = tcg_player_service.JobScheduler(1, finished_jobs_kept = 2)
+
+    for index in range(4):
+        scheduler.submit(tcg_player_service.parse_job_request({"store_url": "https://store" + str(index) + ".tcgplayerpro.com/"}))
+
+    for attempt in range(500):
+        if len([job for job in scheduler.get_jobs() if job["status"] == "finished"]) == 2 and len(scheduler.get_jobs()) == 2:
+            break
+        time.sleep(0.01)
+
+    scheduler.stop()
+
+    assert [job["id"] for job in scheduler.get_jobs()] == [3, 4]
+    assert scheduler.get_job(1) is None
@@ -0,0 +1,73 @@
+import types
+import pytest
+import benchmark
+import store_directory
+
+@pytest.fixture
+def mock_store_api():
+    server, api_base_url = benchmark.start_mock_store_api(3, 0)
+    yield server, api_base_url
+    server.shutdown()
+    server.server_close()
+
+def test_resolves_found_stores_and_leaves_out_the_rest(mock_store_api, tmp_path):
+    server, api_base_url = mock_store_api
+    directory = store_directory.StoreDirectory(api_base_url, "test", str(tmp_path / "stores.db"))
+
+    resolved_stores = directory.resolve_store_names(["Store 1", "Store 2", "Store 3", "Store 1", "Nowhere Games"])
+    directory.close()
+
+    assert resolved_stores == {"Store " + number: ["store-key-" + number, "https://store" + number + ".tcgplayerpro.com/"] for number in ["1", "2", "3"]}
+    # One name lookup per distinct name, then the store info for all of them in one request
+    assert server.request_count == 5
+
+def test_store_info_is_fetched_in_batches(mock_store_api):
+    server, api_base_url = mock_store_api
+    directory = store_directory.StoreDirectory(api_base_url, "test", "")
+
+    store_infos = directory.get_store_infos(["store-key-1", "store-key-2", "store-key-3"], batch_size = 2)
+    directory.close()
+
+    assert sorted(store_infos) == ["store-key-1", "store-key-2", "store-key-3"]
+    assert server.request_count == 2
+
+def test_cached_stores_skip_the_api(mock_store_api, tmp_path):
+    server, api_base_url = mock_store_api
+    cache_location = str(tmp_path / "stores.db")
+
+    directory = store_directory.StoreDirectory(api_base_url, "test", cache_location)
+    first_resolved_stores = directory.resolve_store_names(["Store 1", "Store 2"])
+    directory.close()
+    request_count = server.request_count
+
+    directory = store_directory.StoreDirectory(api_base_url, "test", cache_location)
+    assert directory.resolve_store_names(["Store 1", "Store 2"]) == first_resolved_stores
+    directory.close()
+
+    assert server.request_count == request_count
+
+def test_expired_cache_goes_back_to_the_api(mock_store_api, tmp_path, monkeypatch):
+    server, api_base_url = mock_store_api
+    directory = store_directory.StoreDirectory(api_base_url, "test", str(tmp_path / "stores.db"), cache_seconds = 60)
+    now = store_directory.time.time()
+
+    monkeypatch.setattr(store_directory, "time", types.SimpleNamespace(time = lambda: now))
+    directory.resolve_store_names(["Store 1"])
+    assert server.request_count == 2
+
+    # Still good just before it expires
+    monkeypatch.setattr(store_directory, "time", types.SimpleNamespace(time = lambda: now + 59))
+    directory.resolve_store_names(["Store 1"])
+    assert server.request_count == 2
+
+    monkeypatch.setattr(store_directory, "time", types.SimpleNamespace(time = lambda: now + 61))
+    assert directory.resolve_store_names(["Store 1"]) == {"Store 1": ["store-key-1", "https://store1.tcgplayerpro.com/"]}
+    assert server.request_count == 4
+    directory.close()
+
+def test_unreachable_api_resolves_nothing(tmp_path):
+    directory = store_directory.StoreDirectory("http://127.0.0.1:9", "test", str(tmp_path / "stores.db"), timeout = 1, max_retries = 0)
+
+    assert directory.resolve_store_names(["Store 1"]) == {}
+    assert directory.get_store_key("Store 1") == ""
+    directory.close()